@@ -1,7 +1,9 @@
 # api.py
 from app import create_app
+from app.extensions import check_schema
 
 app = create_app()
+check_schema(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
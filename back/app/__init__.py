@@ -2,9 +2,15 @@
 from flask import Flask
 from flask_cors import CORS
 from app.config import Config
-from app.extensions import db, jwt, swagger
+from app.extensions import configure_database, db, jwt, swagger
 
-def create_app():
+def create_app(async_mode=None, outbox_worker=None):
+    """
+    Cria o app. Com `async_mode` (padrão: Config.ASYNC_MODE), as rotas de
+    upload, pré-visualização e assinatura usam suas variantes assíncronas.
+    Com `outbox_worker` (padrão: Config.STRIPE_OUTBOX_WORKER), este processo
+    drena a outbox do Stripe em segundo plano.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -14,6 +20,7 @@ def create_app():
     CORS(app)
 
     # Inicializa as extensões
+    configure_database(app)
     db.init_app(app)
     jwt.init_app(app)
     swagger.init_app(app)
@@ -23,14 +30,36 @@ def create_app():
     from app.routes.preview import preview_bp
     from app.routes.auth import auth_bp
     from app.routes.subscription import subscription_bp
+    from app.routes.webhooks import webhooks_bp
+    from app.routes.metrics import metrics_bp
 
     app.register_blueprint(upload_bp)
     app.register_blueprint(preview_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(subscription_bp)
+    app.register_blueprint(webhooks_bp)
 
-    # Cria as tabelas do banco de dados
-    with app.app_context():
-        db.create_all()
+    # Latência por endpoint e por etapa (Server-Timing e /metrics)
+    if Config.METRICS_ENABLED:
+        from app.utils.metrics import init_metrics
+        init_metrics(app)
+        app.register_blueprint(metrics_bp)
+
+    # Renderizações recusadas pelo controle de admissão de memória: 503 + Retry-After
+    from app.utils.admission import init_admission
+    init_admission(app)
+
+    # Modo assíncrono: views async no loop de I/O do processo
+    if Config.ASYNC_MODE if async_mode is None else async_mode:
+        from app.utils.aio import init_async_mode
+        init_async_mode(app)
+
+    # O schema do banco é gerenciado por migrações (flask --app manage db upgrade),
+    # executadas uma vez no deploy e não a cada inicialização de worker
+
+    # Worker que cria os clientes no Stripe a partir da outbox (a drenagem em
+    # segundo plano só roda nos processos em que for habilitada)
+    from app.utils.outbox import init_outbox_worker
+    init_outbox_worker(app, start=outbox_worker)
 
     return app
\ No newline at end of file
@@ -1,5 +1,10 @@
 # app/config.py
 import os
+import tempfile
+from dotenv import load_dotenv
+
+# Carrega as variáveis de ambiente do arquivo .env (caso ainda não estejam carregadas)
+load_dotenv()
 
 class Config:
     # Configurações AWS
@@ -7,6 +12,23 @@ class Config:
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
     AWS_REGION = os.environ.get('AWS_REGION')
+    # Endpoint alternativo (ex.: S3 local para testes); vazio usa a AWS
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+    # Pool de conexões do cliente compartilhado e parâmetros de transferência
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 32))
+    S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', 3))
+    S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 16 * 1024 * 1024))
+    S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+    S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 8))
+    # Upload direto ao bucket (POST/PUT pré-assinado)
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 50 * 1024 * 1024))
+    UPLOAD_PRESIGN_EXPIRES = int(os.environ.get('UPLOAD_PRESIGN_EXPIRES', 300))
+    # Prazo extra (após a expiração do link) para confirmar um upload direto
+    UPLOAD_CONFIRM_GRACE = int(os.environ.get('UPLOAD_CONFIRM_GRACE', 600))
+    # Cópias derivadas geradas no upload (cópia de trabalho e miniatura)
+    DERIVATIVE_PREVIEW_MAX_SIDE = int(os.environ.get('DERIVATIVE_PREVIEW_MAX_SIDE', 1600))
+    DERIVATIVE_THUMB_MAX_SIDE = int(os.environ.get('DERIVATIVE_THUMB_MAX_SIDE', 320))
+    DERIVATIVE_QUALITY = int(os.environ.get('DERIVATIVE_QUALITY', 85))
 
     # Configurações da API
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your_jwt_secret_key')
@@ -15,4 +37,137 @@ class Config:
 
     # Configurações Stripe
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
-    STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY')
\ No newline at end of file
+    STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY')
+
+    # Cache de pré-visualizações (memória + disco)
+    PREVIEW_CACHE_MEMORY_BYTES = int(os.environ.get('PREVIEW_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+    PREVIEW_CACHE_DIR = os.environ.get(
+        'PREVIEW_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ixtampa-preview-cache')
+    )
+    PREVIEW_CACHE_DISK_BYTES = int(os.environ.get('PREVIEW_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+    # Registro de templates decodificados (bytes decodificados das versões
+    # redimensionadas mantidas em memória)
+    TEMPLATE_CACHE_MAX_BYTES = int(os.environ.get('TEMPLATE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+
+    # Fila de jobs de pré-visualização (backend "process" ou "thread")
+    PREVIEW_JOB_BACKEND = os.environ.get('PREVIEW_JOB_BACKEND', 'process')
+    PREVIEW_JOB_WORKERS = int(os.environ.get('PREVIEW_JOB_WORKERS', os.cpu_count() or 2))
+    PREVIEW_JOB_MAX_PENDING = int(os.environ.get('PREVIEW_JOB_MAX_PENDING', 32))
+    PREVIEW_JOB_RESULT_TTL = int(os.environ.get('PREVIEW_JOB_RESULT_TTL', 600))
+    PREVIEW_JOB_START_METHOD = os.environ.get('PREVIEW_JOB_START_METHOD', 'spawn')
+
+    # Threads usadas para renderizar as variantes de um lote em paralelo
+    PREVIEW_RENDER_THREADS = int(os.environ.get('PREVIEW_RENDER_THREADS', os.cpu_count() or 2))
+    PREVIEW_BATCH_MAX_VARIANTS = int(os.environ.get('PREVIEW_BATCH_MAX_VARIANTS', 20))
+    PREVIEW_MAX_LAYERS = int(os.environ.get('PREVIEW_MAX_LAYERS', 16))
+
+    # Decodificação: limite de pixels das imagens recebidas e maior lado da
+    # imagem base nas renderizações (imagens maiores são decodificadas já reduzidas)
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 100_000_000))
+    PREVIEW_MAX_SIDE = int(os.environ.get('PREVIEW_MAX_SIDE', 4096))
+    # Controle de admissão: memória de pixels que as renderizações em andamento
+    # podem ocupar por processo e espera máxima por espaço antes de responder 503
+    RENDER_MEMORY_BUDGET_BYTES = int(os.environ.get('RENDER_MEMORY_BUDGET_BYTES', 1024 * 1024 * 1024))
+    RENDER_ADMISSION_TIMEOUT = float(os.environ.get('RENDER_ADMISSION_TIMEOUT', 10))
+
+    # Download das imagens base (pool HTTP, timeouts, limite de tamanho e cache local)
+    FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 10))
+    FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 3.05))
+    FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 10))
+    FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 25 * 1024 * 1024))
+    FETCH_CACHE_MEMORY_BYTES = int(os.environ.get('FETCH_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+    FETCH_CACHE_DIR = os.environ.get(
+        'FETCH_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ixtampa-fetch-cache')
+    )
+    FETCH_CACHE_DISK_BYTES = int(os.environ.get('FETCH_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+
+    # Modo progressivo: rascunho em baixa resolução (maior lado e qualidade JPEG)
+    PREVIEW_DRAFT_MAX_SIDE = int(os.environ.get('PREVIEW_DRAFT_MAX_SIDE', 480))
+    PREVIEW_DRAFT_QUALITY = int(os.environ.get('PREVIEW_DRAFT_QUALITY', 70))
+
+    # Sessões de edição (/preview/sessions): imagens decodificadas mantidas em
+    # memória por processo (número máximo, memória total, expiração por
+    # inatividade e maior lado da imagem base)
+    PREVIEW_SESSION_MAX = int(os.environ.get('PREVIEW_SESSION_MAX', 64))
+    PREVIEW_SESSION_MAX_BYTES = int(os.environ.get('PREVIEW_SESSION_MAX_BYTES', 512 * 1024 * 1024))
+    PREVIEW_SESSION_TTL = int(os.environ.get('PREVIEW_SESSION_TTL', 900))
+    PREVIEW_SESSION_MAX_SIDE = int(os.environ.get('PREVIEW_SESSION_MAX_SIDE', 1600))
+    # Derivados sob demanda (/preview/render): larguras permitidas (a pedida é
+    # arredondada para cima até uma delas) e ordem de preferência dos formatos
+    # na negociação pelo Accept (JPEG é sempre o último recurso)
+    RENDITION_WIDTHS = tuple(sorted(
+        int(width) for width in os.environ.get(
+            'RENDITION_WIDTHS', '160,320,480,640,960,1280,1600,1920,2560'
+        ).split(',')
+    ))
+    RENDITION_FORMATS = tuple(os.environ.get('RENDITION_FORMATS', 'avif,webp').split(','))
+    # Cache HTTP (segundos) dos derivados de pré-visualizações que só existem
+    # no cache local: podem ser removidas e a URL passar a responder 404.
+    # Derivados de pré-visualizações enviadas ao bucket são imutáveis
+    RENDITION_VOLATILE_MAX_AGE = int(os.environ.get('RENDITION_VOLATILE_MAX_AGE', 600))
+    # Hash de senhas: método com custo explícito (ex.: 'pbkdf2:sha256:600000' ou
+    # 'scrypt:32768:8:1'), threads dedicadas e limite de hashes aguardando na fila
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+
+    # Endpoint alternativo da API do Stripe (ex.: simulador local); vazio usa o padrão
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE') or None
+    # Outbox de operações no Stripe (criação de clientes após o registro). A
+    # drenagem em segundo plano é opcional por processo: habilite em um só
+    STRIPE_OUTBOX_WORKER = os.environ.get('STRIPE_OUTBOX_WORKER', 'false').lower() in ('1', 'true', 'yes')
+    STRIPE_OUTBOX_BATCH_SIZE = int(os.environ.get('STRIPE_OUTBOX_BATCH_SIZE', 20))
+    STRIPE_OUTBOX_CONCURRENCY = int(os.environ.get('STRIPE_OUTBOX_CONCURRENCY', 4))
+    STRIPE_OUTBOX_POLL_INTERVAL = float(os.environ.get('STRIPE_OUTBOX_POLL_INTERVAL', 2.0))
+    STRIPE_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('STRIPE_OUTBOX_MAX_ATTEMPTS', 8))
+    STRIPE_OUTBOX_BACKOFF = float(os.environ.get('STRIPE_OUTBOX_BACKOFF', 2.0))
+    # Prazo de um registro reivindicado; depois dele, outro processo pode retomá-lo
+    STRIPE_OUTBOX_CLAIM_TIMEOUT = float(os.environ.get('STRIPE_OUTBOX_CLAIM_TIMEOUT', 300))
+    # Segredo de assinatura dos webhooks e status de assinatura que dão acesso
+    STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_WEBHOOK_TOLERANCE = int(os.environ.get('STRIPE_WEBHOOK_TOLERANCE', 300))
+    SUBSCRIPTION_ACTIVE_STATUSES = tuple(
+        os.environ.get('SUBSCRIPTION_ACTIVE_STATUSES', 'active,trialing').split(',')
+    )
+    # Catálogo de planos em memória (intervalo de recarga, em segundos)
+    PLAN_CATALOG_TTL = int(os.environ.get('PLAN_CATALOG_TTL', 300))
+    # Cliente do Stripe (timeouts, novas tentativas, pool de conexões e disjuntor)
+    STRIPE_CONNECT_TIMEOUT = float(os.environ.get('STRIPE_CONNECT_TIMEOUT', 3.05))
+    STRIPE_READ_TIMEOUT = float(os.environ.get('STRIPE_READ_TIMEOUT', 10))
+    STRIPE_MAX_RETRIES = int(os.environ.get('STRIPE_MAX_RETRIES', 2))
+    STRIPE_POOL_SIZE = int(os.environ.get('STRIPE_POOL_SIZE', 10))
+    STRIPE_BREAKER_THRESHOLD = int(os.environ.get('STRIPE_BREAKER_THRESHOLD', 5))
+    STRIPE_BREAKER_RESET = float(os.environ.get('STRIPE_BREAKER_RESET', 30))
+    # Cache por processo dos usuários autenticados (máximo de registros e validade em segundos)
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+
+    # Banco de dados: pool de conexões (bancos de servidor), réplica de leitura
+    # opcional e PRAGMAs do SQLite
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL') or None
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+    # Modo assíncrono: views async de /upload, /preview e /subscription executadas
+    # no loop de I/O do processo (clientes HTTP/S3/Stripe não bloqueantes)
+    ASYNC_MODE = os.environ.get('ASYNC_MODE', 'false').lower() in ('1', 'true', 'yes')
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS', 200))
+    ASYNC_HTTP_MAX_KEEPALIVE = int(os.environ.get('ASYNC_HTTP_MAX_KEEPALIVE', 50))
+    ASYNC_BLOCKING_THREADS = int(os.environ.get('ASYNC_BLOCKING_THREADS', 32))
+    # Threads do servidor ASGI (asgi.py) para as rotas síncronas; as views
+    # async são aguardadas no loop do servidor, sem thread por requisição
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 200))
+
+    # Métricas: histogramas por endpoint e por etapa, expostos em /metrics
+    # (formato Prometheus) e cabeçalho Server-Timing nas respostas.
+    # Com METRICS_TOKEN, /metrics exige "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
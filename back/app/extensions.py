@@ -1,8 +1,124 @@
 # app/extensions.py
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_jwt_extended import JWTManager
 from flasgger import Swagger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from app.config import Config
+
+REPLICA_BIND = 'replica'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+class RoutingSession(Session):
+    """
+    Sessão que envia as leituras feitas dentro de `read_replica()` para a
+    réplica (bind 'replica'), quando configurada. Escritas (flush e
+    INSERT/UPDATE/DELETE explícitos) continuam indo para o banco principal.
+    """
 
-db = SQLAlchemy()
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get() and not self._flushing \
+                and not getattr(clause, 'is_dml', False):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def read_replica():
+    """
+    Executa as consultas do bloco na réplica de leitura (se houver). Use
+    apenas para leituras que toleram o atraso de replicação.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
-swagger = Swagger()
\ No newline at end of file
+swagger = Swagger()
+
+
+def engine_options(url):
+    """
+    Opções de engine para a URL informada: pool de conexões para bancos de
+    servidor; o SQLite usa o pool padrão e é ajustado pelos PRAGMAs na conexão.
+    """
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': Config.DB_POOL_PRE_PING,
+    }
+
+
+def configure_database(app):
+    """
+    Aplica o perfil de banco de dados ao app (antes de `db.init_app`):
+    opções de engine do banco principal e, se DATABASE_REPLICA_URL estiver
+    definido, o bind 'replica' usado por `read_replica()`.
+    """
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    if Config.DATABASE_REPLICA_URL:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = dict(engine_options(Config.DATABASE_REPLICA_URL), url=Config.DATABASE_REPLICA_URL)
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_migrations(app):
+    """
+    Registra o Flask-Migrate (comandos `flask db ...`). Não é chamado pelo
+    create_app: o schema é migrado uma vez no deploy (ver manage.py), e os
+    workers não pagam o custo de importar o Alembic.
+    """
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+
+
+def check_schema(app):
+    """
+    Verifica se o banco principal tem as tabelas de todos os modelos e, se
+    não tiver, falha com a instrução para aplicar as migrações. Chamado na
+    inicialização dos servidores (api.py e asgi.py): o create_app não cria o
+    schema, e sem isso o erro só apareceria na primeira requisição.
+    """
+    from sqlalchemy import inspect
+
+    with app.app_context():
+        missing = sorted(set(db.metadata.tables) - set(inspect(db.engine).get_table_names()))
+        url = db.engine.url.render_as_string(hide_password=True)
+    if missing:
+        raise RuntimeError(
+            f"O banco {url} não tem as tabelas: {', '.join(missing)}. "
+            "Aplique as migrações antes de iniciar o servidor (na pasta back/): flask --app manage db upgrade"
+        )
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL permite leituras concorrentes com uma escrita; busy_timeout espera
+    # pelo lock em vez de falhar com "database is locked"
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}')
+    cursor.execute(f'PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT)}')
+    cursor.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+    cursor.close()
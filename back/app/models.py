@@ -1,12 +1,78 @@
 # app/models.py
+import uuid
+from datetime import datetime
+
 from app.extensions import db
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # Comporta hashes scrypt
     stripe_customer_id = db.Column(db.String(120), nullable=True)  # Para integração com Stripe
 
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+
+class StripeOutbox(db.Model):
+    """
+    Operação pendente no Stripe, gravada na mesma transação que a originou e
+    executada depois por um worker em segundo plano (app.utils.outbox).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    operation = db.Column(db.String(40), nullable=False, default='create_customer')
+    # Enviada ao Stripe para que tentativas repetidas não criem clientes duplicados
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False, default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<StripeOutbox {self.operation} user={self.user_id} {self.status}>'
+
+
+class Subscription(db.Model):
+    """
+    Espelho local de uma assinatura do Stripe, mantido pelos webhooks
+    (app.routes.webhooks) para responder verificações de acesso sem chamar a API.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    stripe_subscription_id = db.Column(db.String(255), unique=True, nullable=False)
+    stripe_customer_id = db.Column(db.String(120), nullable=False, index=True)
+    status = db.Column(db.String(40), nullable=False)
+    price_id = db.Column(db.String(255), nullable=True)
+    current_period_end = db.Column(db.DateTime, nullable=True)
+    cancel_at_period_end = db.Column(db.Boolean, nullable=False, default=False)
+    # Momento (event.created) da última alteração aplicada; eventos mais antigos são ignorados
+    stripe_updated_at = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_subscription_user_status', 'user_id', 'status'),)
+
+    def to_dict(self):
+        return {
+            'id': self.stripe_subscription_id,
+            'status': self.status,
+            'plan': self.price_id,
+            'current_period_end': self.current_period_end.isoformat() + 'Z' if self.current_period_end else None,
+            'cancel_at_period_end': self.cancel_at_period_end,
+        }
+
+    def __repr__(self):
+        return f'<Subscription {self.stripe_subscription_id} {self.status}>'
+
+
+class ProcessedStripeEvent(db.Model):
+    """
+    Eventos de webhook já aplicados; garante que reenvios do Stripe não sejam processados duas vezes.
+    """
+    id = db.Column(db.String(255), primary_key=True)  # id do evento (evt_...)
+    type = db.Column(db.String(120), nullable=False)
+    created = db.Column(db.Integer, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -1,10 +1,10 @@
 # app/routes/auth.py
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.models import User
-from app.extensions import db
+from app.models import StripeOutbox, User
+from app.extensions import db, read_replica
+from app.utils.outbox import get_outbox_worker
+from app.utils.passwords import PasswordHasherBusy, get_password_hasher
 from flask_jwt_extended import create_access_token
-import stripe
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -31,6 +31,8 @@ def register():
         description: Usuário registrado com sucesso.
       400:
         description: Dados inválidos ou usuário já existe.
+      503:
+        description: Muitas requisições de autenticação em andamento.
     """
     data = request.get_json()
     username = data.get('username')
@@ -43,19 +45,23 @@ def register():
     if User.query.filter((User.username == username) | (User.email == email)).first():
         return jsonify({'error': 'Usuário já existe.'}), 400
 
-    password_hash = generate_password_hash(password)
-    new_user = User(username=username, email=email, password_hash=password_hash)
-    
-    # Cria um cliente no Stripe para o novo usuário
     try:
-        stripe_customer = stripe.Customer.create(email=email, name=username)
-        new_user.stripe_customer_id = stripe_customer['id']
-    except Exception as e:
-        return jsonify({'error': f'Erro ao criar cliente no Stripe: {str(e)}'}), 500
-
+        password_hash = get_password_hasher().hash(password)
+    except PasswordHasherBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    new_user = User(username=username, email=email, password_hash=password_hash)
     db.session.add(new_user)
+    db.session.flush()
+
+    # O cliente no Stripe é criado depois, pelo worker da outbox; o registro
+    # entra na mesma transação do usuário
+    db.session.add(StripeOutbox(user_id=new_user.id, operation='create_customer'))
     db.session.commit()
-    
+
+    worker = get_outbox_worker()
+    if worker is not None:
+        worker.notify()
+
     return jsonify({'message': 'Usuário registrado com sucesso.'}), 200
 
 @auth_bp.route('/login', methods=['POST'])
@@ -84,6 +90,8 @@ def login():
               type: string
       401:
         description: Credenciais inválidas.
+      503:
+        description: Muitas requisições de autenticação em andamento.
     """
     data = request.get_json()
     username = data.get('username')
@@ -92,9 +100,20 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username e password são necessários.'}), 400
 
-    user = User.query.filter_by(username=username).first()
-    if not user or not check_password_hash(user.password_hash, password):
-        return jsonify({'error': 'Credenciais inválidas.'}), 401
+    # Consulta somente leitura: pode ser atendida pela réplica
+    with read_replica():
+        user = User.query.filter_by(username=username).first()
+    hasher = get_password_hasher()
+    try:
+        if not user or not hasher.verify(user.password_hash, password):
+            return jsonify({'error': 'Credenciais inválidas.'}), 401
+
+        # Hash com parâmetros antigos: regrava com o método/custo atual
+        if hasher.needs_rehash(user.password_hash):
+            user.password_hash = hasher.hash(password)
+            db.session.commit()
+    except PasswordHasherBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
 
-    access_token = create_access_token(identity=user.id)
+    access_token = create_access_token(identity=str(user.id))
     return jsonify({'access_token': access_token}), 200
\ No newline at end of file
@@ -0,0 +1,33 @@
+# app/routes/metrics.py
+import hmac
+
+from flask import Blueprint, request, jsonify, Response
+
+from app.config import Config
+from app.utils.metrics import get_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas do processo no formato de texto do Prometheus.
+    ---
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: false
+        description: "Bearer <METRICS_TOKEN>, obrigatório quando METRICS_TOKEN está configurado."
+    responses:
+      200:
+        description: Histogramas de latência por endpoint e por etapa, requisições em andamento e contadores de caches, pools e filas.
+      401:
+        description: Token ausente ou inválido.
+    """
+    if Config.METRICS_TOKEN:
+        expected = f"Bearer {Config.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return jsonify({'error': 'Token de métricas ausente ou inválido.'}), 401
+    return Response(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,9 +1,62 @@
 # app/routes/preview.py
-from flask import Blueprint, request, jsonify
-from app.utils.image_processing import process_image  # Importe a função de processamento
+import math
+
+from flask import Blueprint, request, jsonify, url_for, current_app, Response
+from app.utils.aio import async_view, offload, read_request_body
+from app.utils.image_processing import (  # Importe as funções de processamento
+    process_image, process_image_async, process_image_batch, process_image_progressive,
+    process_image_progressive_async, process_layers, result_entry
+)
+from app.utils.encoding import OUTPUT_FORMATS
+from app.utils.fetcher import get_image_fetcher
+from app.utils.jobs import QueueFullError, get_preview_queue
+from app.utils.preview_cache import get_preview_cache
+from app.utils.renditions import (
+    get_rendition, is_stored, negotiate_format, rendition_key, snap_width, source_width
+)
+from app.utils.sessions import SessionError, SessionStateError, get_session_store, open_session
+from app.utils.templates import get_template_registry
 
 preview_bp = Blueprint('preview', __name__)
 
+# Extensão do arquivo servido por /preview/files -> formato de saída
+EXTENSION_FORMATS = {spec['extension']: fmt for fmt, spec in OUTPUT_FORMATS.items()}
+
+def is_cache_key(value):
+    """
+    Verifica se `value` tem o formato de uma chave do cache (SHA-256 em hexadecimal).
+    """
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+def parse_output_options(data):
+    """
+    Lê `output_format` e `output_quality` da requisição.
+    Retorna (formato, qualidade, erro).
+    """
+    output_format = data.get('output_format', 'png')
+    output_quality = data.get('output_quality')
+    if output_format not in OUTPUT_FORMATS:
+        return None, None, f"output_format deve ser um de: {', '.join(OUTPUT_FORMATS)}."
+    if output_quality is not None and (not isinstance(output_quality, int) or not 1 <= output_quality <= 100):
+        return None, None, 'output_quality deve ser um inteiro entre 1 e 100.'
+    return output_format, output_quality, None
+
+def preview_options(data):
+    """
+    Valida o corpo de /preview e monta as opções de renderização.
+    Retorna (opções, erro).
+    """
+    if not data or 'image_url' not in data or 'clothing_template' not in data:
+        return None, 'Dados insuficientes. Informe image_url e clothing_template.'
+    output_format, output_quality, error = parse_output_options(data)
+    if error:
+        return None, error
+    return {
+        'high_quality': data.get('quality') == 'high',
+        'output_format': output_format,
+        'output_quality': output_quality,
+    }, None
+
 @preview_bp.route('/preview', methods=['POST'])
 def generate_preview():
     """
@@ -19,28 +72,788 @@ def generate_preview():
               type: string
             clothing_template:
               type: string
+            async:
+              type: boolean
+              description: Se true, enfileira a renderização e retorna um job_id imediatamente.
+            progressive:
+              type: boolean
+              description: Se true, retorna logo um rascunho em baixa resolução e gera a versão final em segundo plano.
+            quality:
+              type: string
+              description: 'Use "high" para renderizar a partir do original em resolução total (padrão usa a cópia de trabalho).'
+            output_format:
+              type: string
+              description: Formato da pré-visualização (png, webp, jpeg ou avif, se o Pillow tiver suporte). Padrão png.
+            output_quality:
+              type: integer
+              description: Qualidade de WebP/JPEG (1-100).
         required: true
     responses:
       200:
-        description: URL da pré-visualização.
+        description: URL da pré-visualização. No modo progressivo, `final` indica se é a versão definitiva; quando false, a versão final fica disponível em `status_url`.
         schema:
           type: object
           properties:
             preview_url:
               type: string
+            final:
+              type: boolean
+            job_id:
+              type: string
+            status_url:
+              type: string
+      202:
+        description: Job enfileirado (modo assíncrono).
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status_url:
+              type: string
       400:
         description: Dados insuficientes.
+      503:
+        description: Fila de pré-visualizações cheia.
     """
     data = request.json
-    if not data or 'image_url' not in data or 'clothing_template' not in data:
-        return jsonify({'error': 'Dados insuficientes. Informe image_url e clothing_template.'}), 400
+    options, error = preview_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if data.get('async'):
+        # Modo job: a renderização roda no pool de workers e o cliente consulta o status
+        try:
+            job_id = get_preview_queue().submit(
+                process_image, data['image_url'], data['clothing_template'], **options
+            )
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        status_url = url_for('preview.preview_job_status', job_id=job_id)
+        return jsonify({'job_id': job_id, 'status_url': status_url}), 202
+
+    if data.get('progressive'):
+        # Fase 1: rascunho imediato; fase 2: versão final no pool de workers
+        result, final = process_image_progressive(data['image_url'], data['clothing_template'], **options)
+        if result.startswith("Erro"):
+            return jsonify({'error': result}), 500
+        if final:
+            return jsonify({'preview_url': result, 'final': True}), 200
+        try:
+            job_id = get_preview_queue().submit(
+                process_image, data['image_url'], data['clothing_template'], **options
+            )
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        status_url = url_for('preview.preview_job_status', job_id=job_id)
+        return jsonify({'preview_url': result, 'final': False, 'job_id': job_id, 'status_url': status_url}), 200
 
     # Chama a função que processa a imagem
-    processed_path = process_image(data['image_url'], data['clothing_template'])
+    processed_path = process_image(data['image_url'], data['clothing_template'], **options)
 
     # Se quiser, você pode checar se a função retornou algum erro em forma de string
     if processed_path.startswith("Erro"):
         return jsonify({'error': processed_path}), 500
 
     # Retorna o caminho (ou URL) do arquivo processado
-    return jsonify({'preview_url': processed_path}), 200
\ No newline at end of file
+    return jsonify({'preview_url': processed_path}), 200
+
+@async_view(generate_preview)
+async def generate_preview_async():
+    # Modo assíncrono: o download e o envio ao S3 são aguardados no loop de
+    # I/O e a composição roda no pool de renderização
+    await read_request_body()
+    data = request.json
+    options, error = preview_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    queue = get_preview_queue()
+    if data.get('async'):
+        # A submissão pode iniciar os processos do pool: fica fora do loop
+        try:
+            job_id = await offload(queue.submit, process_image, data['image_url'], data['clothing_template'], **options)
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        status_url = url_for('preview.preview_job_status', job_id=job_id)
+        return jsonify({'job_id': job_id, 'status_url': status_url}), 202
+
+    if data.get('progressive'):
+        result, final = await process_image_progressive_async(
+            data['image_url'], data['clothing_template'], **options
+        )
+        if result.startswith("Erro"):
+            return jsonify({'error': result}), 500
+        if final:
+            return jsonify({'preview_url': result, 'final': True}), 200
+        try:
+            job_id = await offload(queue.submit, process_image, data['image_url'], data['clothing_template'], **options)
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        status_url = url_for('preview.preview_job_status', job_id=job_id)
+        return jsonify({'preview_url': result, 'final': False, 'job_id': job_id, 'status_url': status_url}), 200
+
+    processed_path = await process_image_async(data['image_url'], data['clothing_template'], **options)
+    if processed_path.startswith("Erro"):
+        return jsonify({'error': processed_path}), 500
+    return jsonify({'preview_url': processed_path}), 200
+
+@preview_bp.route('/preview/batch', methods=['POST'])
+def generate_preview_batch():
+    """
+    Endpoint para gerar várias pré-visualizações a partir da mesma imagem base.
+    A imagem é baixada e decodificada uma única vez para todas as variantes.
+    ---
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            image_url:
+              type: string
+            variants:
+              type: array
+              items:
+                type: object
+                properties:
+                  clothing_template:
+                    type: string
+                  scale:
+                    type: number
+                    description: Escala do template em relação à largura da imagem base (default 0.25).
+            quality:
+              type: string
+              description: 'Use "high" para renderizar a partir do original em resolução total.'
+            output_format:
+              type: string
+              description: Formato da pré-visualização (png, webp, jpeg ou avif, se o Pillow tiver suporte). Padrão png.
+            output_quality:
+              type: integer
+              description: Qualidade de WebP/JPEG (1-100).
+        required: true
+    responses:
+      200:
+        description: URL (ou erro) de cada variante, na mesma ordem da requisição.
+        schema:
+          type: object
+          properties:
+            previews:
+              type: array
+              items:
+                type: object
+                properties:
+                  clothing_template:
+                    type: string
+                  scale:
+                    type: number
+                  preview_url:
+                    type: string
+                  error:
+                    type: string
+      400:
+        description: Dados insuficientes ou inválidos.
+      500:
+        description: Nenhuma variante pôde ser gerada.
+    """
+    data = request.json
+    if not data or 'image_url' not in data or not isinstance(data.get('variants'), list) or not data['variants']:
+        return jsonify({'error': 'Dados insuficientes. Informe image_url e variants.'}), 400
+
+    max_variants = current_app.config['PREVIEW_BATCH_MAX_VARIANTS']
+    if len(data['variants']) > max_variants:
+        return jsonify({'error': f'Máximo de {max_variants} variantes por requisição.'}), 400
+
+    variants = []
+    for variant in data['variants']:
+        if not isinstance(variant, dict) or 'clothing_template' not in variant:
+            return jsonify({'error': 'Cada variante precisa de clothing_template.'}), 400
+        scale = variant.get('scale', 0.25)
+        if not isinstance(scale, (int, float)) or not 0 < scale <= 1:
+            return jsonify({'error': 'scale deve ser um número entre 0 e 1.'}), 400
+        variants.append((variant['clothing_template'], scale))
+
+    output_format, output_quality, error = parse_output_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    results = process_image_batch(
+        data['image_url'], variants, high_quality=data.get('quality') == 'high',
+        output_format=output_format, output_quality=output_quality
+    )
+
+    previews = []
+    for (template, scale), result in zip(variants, results):
+        preview = {'clothing_template': template, 'scale': scale}
+        if result.startswith("Erro"):
+            preview['error'] = result
+        else:
+            preview['preview_url'] = result
+        previews.append(preview)
+
+    if all('error' in preview for preview in previews):
+        return jsonify({'error': previews[0]['error'], 'previews': previews}), 500
+    return jsonify({'previews': previews}), 200
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def layer_error(layer):
+    """
+    Valida os campos de uma camada de /preview/composite.
+    Retorna a mensagem de erro ou None.
+    """
+    from app.utils.compositing import BLEND_MODES
+
+    max_side = current_app.config['PREVIEW_MAX_SIDE']
+    if not isinstance(layer, dict) or not isinstance(layer.get('source'), str):
+        return 'Cada camada precisa de um source.'
+    if layer.get('blend', 'normal') not in BLEND_MODES:
+        return f"blend deve ser um de: {', '.join(BLEND_MODES)}."
+    if not all(is_int(layer.get(name, 0)) for name in ('x', 'y')):
+        return 'x e y devem ser inteiros.'
+    if 'width' in layer and not (is_int(layer['width']) and 1 <= layer['width'] <= max_side):
+        return f'width deve ser um inteiro de 1 a {max_side}.'
+    if 'scale' in layer and not (is_number(layer['scale']) and layer['scale'] > 0):
+        return 'scale deve ser um número positivo.'
+    if not (is_number(layer.get('opacity', 1)) and 0 <= layer.get('opacity', 1) <= 1):
+        return 'opacity deve ser um número entre 0 e 1.'
+    if not isinstance(layer.get('clip', False), bool):
+        return 'clip deve ser booleano.'
+    if 'mask' in layer and not isinstance(layer['mask'], str):
+        return 'mask deve ser o caminho de uma máscara.'
+    return None
+
+@preview_bp.route('/preview/composite', methods=['POST'])
+def generate_composite_preview():
+    """
+    Endpoint para gerar uma pré-visualização a partir de uma pilha de camadas
+    (peça, arte do usuário, sombras/brilhos e máscaras) renderizada em uma passada.
+    ---
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            image_url:
+              type: string
+              description: Arte do usuário, referenciada nas camadas como source "base".
+            canvas:
+              type: array
+              items:
+                type: integer
+              description: Tamanho da tela [largura, altura]. Padrão é o tamanho da primeira camada.
+            layers:
+              type: array
+              items:
+                type: object
+                properties:
+                  source:
+                    type: string
+                  x:
+                    type: integer
+                  y:
+                    type: integer
+                  width:
+                    type: integer
+                  scale:
+                    type: number
+                  blend:
+                    type: string
+                    description: normal, multiply, screen, overlay, darken ou lighten.
+                  opacity:
+                    type: number
+                  clip:
+                    type: boolean
+                  mask:
+                    type: string
+            output_format:
+              type: string
+            output_quality:
+              type: integer
+        required: true
+    responses:
+      200:
+        description: URL da pré-visualização.
+        schema:
+          type: object
+          properties:
+            preview_url:
+              type: string
+      400:
+        description: Dados insuficientes ou inválidos (inclusive tela ou camada com lado acima de PREVIEW_MAX_SIDE).
+    """
+    data = request.json
+    if not data or 'image_url' not in data or not isinstance(data.get('layers'), list) or not data['layers']:
+        return jsonify({'error': 'Dados insuficientes. Informe image_url e layers.'}), 400
+
+    # Importado sob demanda: o motor de composição carrega o NumPy
+    from app.utils.compositing import CompositingError
+
+    max_layers = current_app.config['PREVIEW_MAX_LAYERS']
+    if len(data['layers']) > max_layers:
+        return jsonify({'error': f'Máximo de {max_layers} camadas por requisição.'}), 400
+    for layer in data['layers']:
+        error = layer_error(layer)
+        if error:
+            return jsonify({'error': error}), 400
+
+    max_side = current_app.config['PREVIEW_MAX_SIDE']
+    canvas = data.get('canvas')
+    if canvas is not None and (not isinstance(canvas, list) or len(canvas) != 2 or
+                               not all(is_int(v) and 1 <= v <= max_side for v in canvas)):
+        return jsonify({'error': f'canvas deve ser [largura, altura], com lados de 1 a {max_side} pixels.'}), 400
+
+    output_format, output_quality, error = parse_output_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        result = process_layers(
+            data['image_url'], data['layers'], canvas_size=tuple(canvas) if canvas else None,
+            high_quality=data.get('quality') == 'high',
+            output_format=output_format, output_quality=output_quality
+        )
+    except CompositingError as e:
+        return jsonify({'error': str(e)}), 400
+    if result.startswith("Erro"):
+        return jsonify({'error': result}), 500
+    return jsonify({'preview_url': result}), 200
+
+def session_state(data):
+    """
+    Lê `x`, `y`, `scale` e `rotation` de uma sessão de edição (todos opcionais).
+    Retorna (estado, erro).
+    """
+    state = {}
+    for name in ('x', 'y'):
+        value = data.get(name)
+        if value is not None and not is_int(value):
+            return None, f'{name} deve ser um inteiro (pixels).'
+        state[name] = value
+    scale = data.get('scale')
+    if scale is not None and (not is_number(scale) or not 0 < scale <= 1):
+        return None, 'scale deve ser um número entre 0 e 1.'
+    rotation = data.get('rotation')
+    if rotation is not None and (not is_number(rotation) or not math.isfinite(rotation)):
+        return None, 'rotation deve ser um número (graus, sentido horário).'
+    state['scale'], state['rotation'] = scale, rotation
+    return state, None
+
+def session_response(session, regions=None):
+    """
+    Estado da sessão; com `regions`, inclui as regiões alteradas codificadas.
+    """
+    response = {
+        'session_id': session.id,
+        'version': session.version,
+        'width': session.size[0],
+        'height': session.size[1],
+        'x': session.state['x'],
+        'y': session.state['y'],
+        'scale': session.state['scale'],
+        'rotation': session.state['rotation'],
+        'preview_url': url_for('preview.editing_session_preview', session_id=session.id, v=session.version),
+    }
+    if regions is not None:
+        response['patches'] = [
+            {'region': list(region), 'image': session.patch_data_url(region)} for region in regions
+        ]
+    return response
+
+@preview_bp.route('/preview/sessions', methods=['POST'])
+def create_editing_session():
+    """
+    Abre uma sessão de edição: a imagem base e o template são baixados e
+    decodificados uma única vez e mantidos no servidor, e os ajustes de
+    posição, escala e rotação (PATCH) recompõem apenas a região alterada.
+    ---
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            image_url:
+              type: string
+            clothing_template:
+              type: string
+            x:
+              type: integer
+              description: Canto superior esquerdo do logo, em pixels, entre -largura e largura da imagem (y, -altura e altura). Padrão, canto inferior direito da imagem.
+            y:
+              type: integer
+            scale:
+              type: number
+              description: Largura do logo em relação à largura da imagem base (default 0.25).
+            rotation:
+              type: number
+              description: Rotação do logo em graus, sentido horário, em torno do seu centro.
+            quality:
+              type: string
+              description: 'Use "high" para editar a partir do original (limitado a PREVIEW_SESSION_MAX_SIDE).'
+            output_format:
+              type: string
+              description: Formato das imagens da sessão (png, webp, jpeg ou avif, se o Pillow tiver suporte). Padrão png.
+            output_quality:
+              type: integer
+        required: true
+    responses:
+      201:
+        description: Sessão criada. `preview_url` serve a imagem inteira na versão atual.
+        schema:
+          type: object
+          properties:
+            session_id:
+              type: string
+            version:
+              type: integer
+            width:
+              type: integer
+            height:
+              type: integer
+            preview_url:
+              type: string
+      400:
+        description: Dados insuficientes ou inválidos.
+      500:
+        description: Erro ao baixar a imagem ou abrir o template.
+    """
+    data = request.json
+    options, error = preview_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+    state, error = session_state(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        session = open_session(data['image_url'], data['clothing_template'], **options, **state)
+    except SessionStateError as e:
+        return jsonify({'error': str(e)}), 400
+    except SessionError as e:
+        return jsonify({'error': str(e)}), 500
+    with session.lock:
+        response = session_response(session)
+    return jsonify(response), 201
+
+@preview_bp.route('/preview/sessions/<session_id>', methods=['PATCH'])
+def update_editing_session(session_id):
+    """
+    Ajusta a posição, a escala e/ou a rotação do logo de uma sessão de edição.
+    Somente a região coberta pelo logo antes e depois do ajuste é recomposta.
+    ---
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            x:
+              type: integer
+            y:
+              type: integer
+            scale:
+              type: number
+            rotation:
+              type: number
+        required: true
+    responses:
+      200:
+        description: Novo estado da sessão. Cada item de `patches` traz uma área alterada (`region`, [esquerda, topo, direita, base]) e a imagem dessa área (`image`, data URL), a ser desenhada sobre o quadro anterior; `preview_url` serve a imagem inteira.
+        schema:
+          type: object
+          properties:
+            version:
+              type: integer
+            patches:
+              type: array
+              items:
+                type: object
+                properties:
+                  region:
+                    type: array
+                    items:
+                      type: integer
+                  image:
+                    type: string
+            preview_url:
+              type: string
+      400:
+        description: Parâmetros inválidos.
+      404:
+        description: Sessão não encontrada ou expirada.
+    """
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Informe x, y, scale e/ou rotation.'}), 400
+    state, error = session_state(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    session = get_session_store().get(session_id)
+    if session is None:
+        return jsonify({'error': 'Sessão não encontrada ou expirada.'}), 404
+    with session.lock:
+        try:
+            regions = session.apply(**state)
+        except SessionStateError as e:
+            return jsonify({'error': str(e)}), 400
+        response = session_response(session, regions)
+    return jsonify(response), 200
+
+@preview_bp.route('/preview/sessions/<session_id>', methods=['DELETE'])
+def delete_editing_session(session_id):
+    """
+    Encerra uma sessão de edição e libera as imagens mantidas no servidor.
+    ---
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+    responses:
+      204:
+        description: Sessão encerrada.
+      404:
+        description: Sessão não encontrada ou expirada.
+    """
+    if not get_session_store().delete(session_id):
+        return jsonify({'error': 'Sessão não encontrada ou expirada.'}), 404
+    return '', 204
+
+@preview_bp.route('/preview/sessions/<session_id>/preview', methods=['GET'])
+def editing_session_preview(session_id):
+    """
+    Imagem inteira da sessão de edição na versão atual (codificada sob demanda).
+    ---
+    parameters:
+      - in: path
+        name: session_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Imagem da sessão.
+      304:
+        description: A versão atual é a mesma já recebida (If-None-Match).
+      404:
+        description: Sessão não encontrada ou expirada.
+    """
+    session = get_session_store().get(session_id)
+    if session is None:
+        return jsonify({'error': 'Sessão não encontrada ou expirada.'}), 404
+    with session.lock:
+        etag = f"{session.id}-{session.version}"
+        if etag in request.if_none_match:
+            data = None
+        else:
+            data = session.frame()
+
+    if data is None:
+        response = Response(status=304)
+    else:
+        response = Response(data, mimetype=OUTPUT_FORMATS[session.output_format]['content_type'])
+    # A imagem muda a cada ajuste: o cliente revalida pela versão (ETag)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@preview_bp.route('/preview/files/<cache_key>.<extension>', methods=['GET'])
+def preview_file(cache_key, extension):
+    """
+    Endpoint que serve uma pré-visualização gerada sem upload, direto do cache.
+    ---
+    parameters:
+      - in: path
+        name: cache_key
+        type: string
+        required: true
+      - in: path
+        name: extension
+        type: string
+        required: true
+    responses:
+      200:
+        description: Imagem da pré-visualização.
+      404:
+        description: Pré-visualização não encontrada (ou removida do cache), inclusive se a extensão não for a do formato em que foi gerada.
+    """
+    # Só resultados gravados com essa extensão: derivados e outros itens do
+    # cache não são servidos, e o tipo servido é sempre o do conteúdo
+    output_format = EXTENSION_FORMATS.get(extension)
+    data = None
+    if output_format and is_cache_key(cache_key):
+        data = get_preview_cache().get(result_entry(cache_key, output_format))
+    if data is None:
+        return jsonify({'error': 'Pré-visualização não encontrada.'}), 404
+
+    # O conteúdo é endereçado pela chave: pode ficar em cache indefinidamente
+    response = Response(data, mimetype=OUTPUT_FORMATS[output_format]['content_type'])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@preview_bp.route('/preview/render/<cache_key>.<extension>', methods=['GET'])
+def preview_rendition(cache_key, extension):
+    """
+    Derivado de uma pré-visualização na largura e no formato pedidos, para
+    exibição (ex.: em `srcset`), com cache HTTP e negociação de formato.
+    ---
+    parameters:
+      - in: path
+        name: cache_key
+        type: string
+        required: true
+        description: Chave da pré-visualização (o nome do arquivo em `preview_url`, sem extensão nem prefixo).
+      - in: path
+        name: extension
+        type: string
+        required: true
+        description: Extensão do arquivo em `preview_url` (formato em que a pré-visualização foi gerada).
+      - in: query
+        name: w
+        type: integer
+        required: false
+        description: Largura desejada, arredondada para cima até uma das larguras configuradas. A imagem nunca é ampliada; sem `w`, mantém a largura original.
+      - in: query
+        name: format
+        type: string
+        required: false
+        description: Formato (avif, webp, jpeg ou png). Sem ele, é escolhido pelo cabeçalho Accept (AVIF, WebP ou JPEG).
+      - in: query
+        name: q
+        type: integer
+        required: false
+        description: Qualidade de AVIF/WebP/JPEG (1-100).
+    responses:
+      200:
+        description: Imagem derivada, com ETag forte. Cache público imutável se a pré-visualização foi enviada ao bucket; caso contrário, por RENDITION_VOLATILE_MAX_AGE segundos.
+      304:
+        description: O derivado é o mesmo já recebido (If-None-Match).
+      400:
+        description: Parâmetros inválidos.
+      404:
+        description: Pré-visualização não encontrada (nem no cache nem no bucket).
+      503:
+        description: Servidor ocupado renderizando outras imagens.
+    """
+    width = request.args.get('w', type=int)
+    quality = request.args.get('q', type=int)
+    output_format = request.args.get('format')
+    source_format = EXTENSION_FORMATS.get(extension)
+    if not source_format or not is_cache_key(cache_key):
+        return jsonify({'error': 'Pré-visualização não encontrada.'}), 404
+    if ('w' in request.args and (width is None or width < 1)) or \
+            ('q' in request.args and (quality is None or not 1 <= quality <= 100)):
+        return jsonify({'error': 'w deve ser um inteiro positivo e q um inteiro entre 1 e 100.'}), 400
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        return jsonify({'error': f"format deve ser um de: {', '.join(OUTPUT_FORMATS)}."}), 400
+
+    # Também confirma que a pré-visualização existe antes de responder 304
+    original_width = source_width(cache_key, source_format)
+    if original_width is None:
+        return jsonify({'error': 'Pré-visualização não encontrada.'}), 404
+
+    negotiated = output_format is None
+    if negotiated:
+        output_format = negotiate_format(request.accept_mimetypes)
+    if width is not None:
+        width = snap_width(width)
+        if width >= original_width:
+            # Nunca amplia: mesmo derivado (e ETag) da largura original
+            width = None
+
+    # O ETag depende só dos parâmetros: a revalidação não precisa renderizar
+    etag = rendition_key(result_entry(cache_key, source_format), width, output_format, quality)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        etag, data = get_rendition(cache_key, source_format, width, output_format, quality)
+        if data is None:
+            return jsonify({'error': 'Pré-visualização não encontrada.'}), 404
+        response = Response(data, mimetype=OUTPUT_FORMATS[output_format]['content_type'])
+    response.set_etag(etag)
+    if is_stored(cache_key):
+        # Refeito a partir do objeto no bucket se sair do cache: imutável
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Só existe enquanto a pré-visualização estiver no cache local
+        response.headers['Cache-Control'] = f"public, max-age={current_app.config['RENDITION_VOLATILE_MAX_AGE']}"
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
+@preview_bp.route('/preview/jobs/<job_id>', methods=['GET'])
+def preview_job_status(job_id):
+    """
+    Endpoint para consultar o status de um job de pré-visualização.
+    ---
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Status do job (queued, running, done ou error) e, quando concluído, a URL da pré-visualização.
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status:
+              type: string
+            preview_url:
+              type: string
+            error:
+              type: string
+      404:
+        description: Job não encontrado ou expirado.
+    """
+    status = get_preview_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job não encontrado.'}), 404
+
+    response = {'job_id': job_id, 'status': status['status']}
+    if status['status'] == 'done':
+        response['preview_url'] = status['result']
+    elif status['status'] == 'error':
+        response['error'] = status['error']
+    return jsonify(response), 200
+
+@preview_bp.route('/preview/cache', methods=['GET'])
+def preview_cache_stats():
+    """
+    Endpoint com os contadores do cache de pré-visualizações.
+    ---
+    responses:
+      200:
+        description: Acertos, falhas e ocupação do cache (memória e disco), do registro de templates e do cache de originais baixados.
+        schema:
+          type: object
+          properties:
+            hits:
+              type: integer
+            disk_hits:
+              type: integer
+            misses:
+              type: integer
+            evictions:
+              type: integer
+            templates:
+              type: object
+            fetch:
+              type: object
+    """
+    stats = get_preview_cache().stats()
+    stats['templates'] = get_template_registry().stats()
+    stats['fetch'] = get_image_fetcher().stats()
+    return jsonify(stats), 200
\ No newline at end of file
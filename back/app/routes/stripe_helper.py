@@ -1,13 +1,5 @@
-# app/utils/stripe_helper.py
-import stripe
+# app/routes/stripe_helper.py
+# Mantido por compatibilidade; a implementação fica em app.utils.stripe_helper
+from app.utils.stripe_helper import create_stripe_subscription
 
-def create_stripe_subscription(customer_id, price_id):
-    try:
-        subscription = stripe.Subscription.create(
-            customer=customer_id,
-            items=[{'price': price_id}],
-            expand=['latest_invoice.payment_intent']
-        )
-        return subscription
-    except Exception as e:
-        raise e
\ No newline at end of file
+__all__ = ['create_stripe_subscription']
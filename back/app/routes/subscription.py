@@ -1,14 +1,27 @@
 # app/routes/subscription.py
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User
+from flask import Blueprint, Response, g, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
 from app.extensions import db
-import stripe
+from app.utils.aio import async_view, offload, read_request_body
+from app.utils.catalog import get_plan_catalog
+from app.utils.outbox import get_outbox_worker
+from app.utils.stripe_gateway import StripeUnavailable, get_stripe_gateway
+from app.utils.subscriptions import apply_subscription, get_active_subscription
+from app.utils.users import async_jwt_required, current_user_required
 
 subscription_bp = Blueprint('subscription', __name__)
 
+
+def _client_secret(data):
+    # client_secret do pagamento da primeira fatura, usado pelo front para confirmar o pagamento
+    invoice = data.get('latest_invoice')
+    payment_intent = invoice.get('payment_intent') if isinstance(invoice, dict) else None
+    return payment_intent.get('client_secret') if isinstance(payment_intent, dict) else None
+
+
 @subscription_bp.route('/subscription', methods=['POST'])
 @jwt_required()
+@current_user_required
 def manage_subscription():
     """
     Endpoint para gerenciamento de assinaturas.
@@ -19,6 +32,11 @@ def manage_subscription():
         type: string
         required: true
         description: Token JWT (Bearer token)
+      - in: header
+        name: Idempotency-Key
+        type: string
+        required: false
+        description: Chave para repetir a requisição sem criar uma segunda assinatura.
       - in: body
         name: body
         schema:
@@ -38,27 +56,191 @@ def manage_subscription():
               type: string
             subscription:
               type: object
+              properties:
+                id:
+                  type: string
+                status:
+                  type: string
+                plan:
+                  type: string
+                current_period_end:
+                  type: string
+                cancel_at_period_end:
+                  type: boolean
+                client_secret:
+                  type: string
       400:
         description: Dados inválidos.
+      404:
+        description: Usuário não encontrado.
       500:
         description: Erro ao processar a assinatura.
+      503:
+        description: Cliente no Stripe ainda não foi criado ou Stripe indisponível.
     """
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({'error': 'Usuário não encontrado.'}), 404
+    user = g.current_user
 
     data = request.get_json()
     plan = data.get('plan')
     if not plan:
         return jsonify({'error': 'Plano é necessário.'}), 400
 
+    # Rejeita planos desconhecidos sem chamar o Stripe (se o catálogo estiver
+    # indisponível, a validação fica a cargo do próprio Stripe)
+    catalog = get_plan_catalog()
+    if catalog.get(plan) is None and catalog.loaded:
+        return jsonify({'error': 'Plano inválido.'}), 400
+
+    customer_id = _ensure_customer(user)
+    if not customer_id:
+        return jsonify({'error': 'Cliente no Stripe ainda não foi criado. Tente novamente em instantes.'}), 503, {'Retry-After': '5'}
+
+    # Uma chave enviada pelo cliente torna seguro repetir a requisição inteira
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        idempotency_key = f'subscription-{user.id}-{idempotency_key}'
     try:
-        subscription = stripe.Subscription.create(
-            customer=user.stripe_customer_id,
-            items=[{'price': plan}],
-            expand=['latest_invoice.payment_intent']
-        )
-        return jsonify({'message': 'Assinatura criada com sucesso.', 'subscription': subscription}), 200
+        data = get_stripe_gateway().create_subscription(customer_id, plan, idempotency_key=idempotency_key)
+    except StripeUnavailable as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after))}
     except Exception as e:
-        return jsonify({'error': f'Erro ao criar assinatura: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erro ao criar assinatura: {str(e)}'}), 500
+
+    result = _store_subscription(data, plan)
+    return jsonify({'message': 'Assinatura criada com sucesso.', 'subscription': result}), 200
+
+def _store_subscription(data, plan):
+    # Atualiza o espelho local já com a resposta; os webhooks mantêm o estado depois
+    local = apply_subscription(data, data['created'])
+    db.session.commit()
+    result = local.to_dict() if local is not None else {'id': data['id'], 'status': data.get('status'), 'plan': plan}
+    result['client_secret'] = _client_secret(data)
+    return result
+
+def _ensure_customer(user):
+    # O cliente é criado de forma assíncrona após o registro; se ainda não
+    # existir, processa o registro pendente deste usuário agora
+    if user.stripe_customer_id:
+        return user.stripe_customer_id
+    worker = get_outbox_worker()
+    return worker.ensure_customer(user.id) if worker is not None else None
+
+@async_view(manage_subscription)
+@async_jwt_required()
+@current_user_required
+async def manage_subscription_async():
+    # Modo assíncrono: a chamada ao Stripe é aguardada no loop de I/O; as
+    # consultas ao banco e ao catálogo rodam fora dele
+    user = g.current_user
+    await read_request_body()
+    data = request.get_json()
+    plan = data.get('plan')
+    if not plan:
+        return jsonify({'error': 'Plano é necessário.'}), 400
+
+    catalog = get_plan_catalog()
+    if await offload(catalog.get, plan) is None and catalog.loaded:
+        return jsonify({'error': 'Plano inválido.'}), 400
+
+    customer_id = await offload(_ensure_customer, user)
+    if not customer_id:
+        return jsonify({'error': 'Cliente no Stripe ainda não foi criado. Tente novamente em instantes.'}), 503, {'Retry-After': '5'}
+
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        idempotency_key = f'subscription-{user.id}-{idempotency_key}'
+    try:
+        data = await get_stripe_gateway().create_subscription_async(customer_id, plan, idempotency_key=idempotency_key)
+    except StripeUnavailable as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after))}
+    except Exception as e:
+        return jsonify({'error': f'Erro ao criar assinatura: {str(e)}'}), 500
+
+    result = await offload(_store_subscription, data, plan)
+    return jsonify({'message': 'Assinatura criada com sucesso.', 'subscription': result}), 200
+
+
+@subscription_bp.route('/subscription', methods=['GET'])
+@jwt_required()
+@current_user_required
+def get_subscription():
+    """
+    Consulta a assinatura ativa do usuário (a partir do banco local, sem chamar o Stripe).
+    ---
+    parameters:
+      - in: header
+        name: Authorization
+        type: string
+        required: true
+        description: Token JWT (Bearer token)
+    responses:
+      200:
+        description: Situação da assinatura.
+        schema:
+          type: object
+          properties:
+            subscribed:
+              type: boolean
+            subscription:
+              type: object
+      404:
+        description: Usuário não encontrado.
+    """
+    subscription = get_active_subscription(g.current_user.id)
+    return jsonify({
+        'subscribed': subscription is not None,
+        'subscription': subscription.to_dict() if subscription is not None else None,
+    }), 200
+
+
+@subscription_bp.route('/plans', methods=['GET'])
+def list_plans():
+    """
+    Lista os planos disponíveis (catálogo do Stripe mantido em memória).
+    ---
+    parameters:
+      - in: header
+        name: If-None-Match
+        type: string
+        required: false
+        description: ETag da versão já conhecida pelo cliente.
+    responses:
+      200:
+        description: Lista de planos.
+        schema:
+          type: object
+          properties:
+            plans:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  product:
+                    type: string
+                  name:
+                    type: string
+                  description:
+                    type: string
+                  unit_amount:
+                    type: integer
+                  currency:
+                    type: string
+                  interval:
+                    type: string
+                  interval_count:
+                    type: integer
+      304:
+        description: O catálogo não mudou desde o ETag informado.
+      503:
+        description: Catálogo ainda não disponível.
+    """
+    body, etag = get_plan_catalog().snapshot()
+    if body is None:
+        return jsonify({'error': 'Catálogo de planos indisponível no momento.'}), 503, {'Retry-After': '30'}
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response.make_conditional(request)
@@ -1,19 +1,19 @@
 # app/routes/upload.py
-from flask import Blueprint, request, jsonify, current_app
-import boto3
+from flask import Blueprint, request, jsonify, current_app, url_for
+import asyncio
+import io
 import uuid
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.utils import secure_filename
+from app.utils.aio import async_view, offload, read_request_body
+from app.utils.derivatives import store_derivatives, store_derivatives_async, store_derivatives_from_bucket
+from app.utils.fetcher import get_image_fetcher
+from app.utils.jobs import QueueFullError, get_preview_queue
+from app.utils.metrics import stage
+from app.utils.s3 import get_s3_client, get_transfer_config, public_url, put_object_async
 
 upload_bp = Blueprint('upload', __name__)
 
-def get_s3_client():
-    config = current_app.config
-    return boto3.client(
-        's3',
-        region_name=config['AWS_REGION'],
-        aws_access_key_id=config['AWS_ACCESS_KEY_ID'],
-        aws_secret_access_key=config['AWS_SECRET_ACCESS_KEY']
-    )
-
 @upload_bp.route('/upload', methods=['POST'])
 def upload_image():
     """
@@ -29,12 +29,16 @@ def upload_image():
         description: Arquivo de imagem a ser enviado.
     responses:
       200:
-        description: URL da imagem carregada.
+        description: URL da imagem carregada e das cópias derivadas (resolução de pré-visualização e miniatura).
         schema:
           type: object
           properties:
             url:
               type: string
+            preview_url:
+              type: string
+            thumbnail_url:
+              type: string
       400:
         description: Nenhum arquivo enviado.
     """
@@ -45,16 +49,252 @@ def upload_image():
     filename = f"{uuid.uuid4()}_{file.filename}"
     s3_client = get_s3_client()
     try:
-        s3_client.upload_fileobj(
-            file,
-            current_app.config['S3_BUCKET'],
-            filename,
-            ExtraArgs={
-                'ACL': 'public-read',
-                'ContentType': file.content_type
-            }
-        )
-        file_url = f"https://{current_app.config['S3_BUCKET']}.s3.{current_app.config['AWS_REGION']}.amazonaws.com/{filename}"
-        return jsonify({'url': file_url}), 200
+        content = file.read()
+        with stage('upload'):
+            s3_client.upload_fileobj(
+                io.BytesIO(content),
+                current_app.config['S3_BUCKET'],
+                filename,
+                ExtraArgs={
+                    'ACL': 'public-read',
+                    'ContentType': file.content_type
+                },
+                Config=get_transfer_config()
+            )
+        file_url = public_url(filename)
+        # As pré-visualizações seguintes usam os bytes já conhecidos, sem novo download
+        get_image_fetcher().prime(file_url, content)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    response = {'url': file_url}
+    response.update(_derivative_urls(filename, content))
+    return jsonify(response), 200
+
+@async_view(upload_image)
+async def upload_image_async():
+    # Modo assíncrono: o original e as cópias derivadas são enviados pelo
+    # cliente HTTP do loop de I/O; as derivadas são geradas no pool de
+    # renderização enquanto o original é enviado
+    await read_request_body()
+    if 'file' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+    file = request.files['file']
+    filename = f"{uuid.uuid4()}_{file.filename}"
+    content = await offload(file.read)
+    derivatives = asyncio.ensure_future(_derivative_urls_async(filename, content))
+    try:
+        file_url = await put_object_async(filename, content, file.content_type)
+        await offload(get_image_fetcher().prime, file_url, content)
+    except Exception as e:
+        derivatives.cancel()
+        return jsonify({'error': str(e)}), 500
+
+    response = {'url': file_url}
+    response.update(await derivatives)
+    return jsonify(response), 200
+
+async def _derivative_urls_async(key, content):
+    try:
+        urls = await store_derivatives_async(key, content)
+    except Exception as e:
+        current_app.logger.warning("Falha ao gerar derivados de %s: %s", key, e)
+        return {}
+    return {'preview_url': urls['preview'], 'thumbnail_url': urls['thumbnail']}
+
+def _derivative_urls(key, content):
+    """
+    Gera a cópia de trabalho e a miniatura do upload. Uma falha aqui não
+    invalida o upload: as pré-visualizações voltam a usar o original.
+    """
+    try:
+        urls = store_derivatives(key, content)
+    except Exception as e:
+        current_app.logger.warning("Falha ao gerar derivados de %s: %s", key, e)
+        return {}
+    return {'preview_url': urls['preview'], 'thumbnail_url': urls['thumbnail']}
+
+def _upload_token_serializer():
+    # Token que prova que a chave foi emitida por /upload/presign
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='upload-confirm')
+
+@upload_bp.route('/upload/presign', methods=['POST'])
+def presign_upload():
+    """
+    Endpoint que gera parâmetros pré-assinados para o navegador enviar a imagem
+    direto ao bucket, sem passar pelo servidor da aplicação.
+    ---
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            filename:
+              type: string
+            content_type:
+              type: string
+              description: Tipo MIME da imagem (image/*).
+            size:
+              type: integer
+              description: Tamanho do arquivo em bytes.
+            method:
+              type: string
+              description: POST (padrão, com limite de tamanho imposto pelo S3) ou PUT.
+        required: true
+    responses:
+      200:
+        description: Parâmetros do upload direto.
+        schema:
+          type: object
+          properties:
+            method:
+              type: string
+            url:
+              type: string
+            fields:
+              type: object
+            headers:
+              type: object
+            key:
+              type: string
+            token:
+              type: string
+              description: Token assinado a ser enviado em /upload/confirm junto com a chave.
+            expires_in:
+              type: integer
+      400:
+        description: Dados inválidos.
+    """
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    content_type = data.get('content_type') or ''
+    size = data.get('size')
+    method = (data.get('method') or 'POST').upper()
+    max_bytes = current_app.config['UPLOAD_MAX_BYTES']
+    expires_in = current_app.config['UPLOAD_PRESIGN_EXPIRES']
+
+    if not filename or not content_type:
+        return jsonify({'error': 'filename e content_type são necessários.'}), 400
+    if not content_type.startswith('image/'):
+        return jsonify({'error': 'Apenas imagens são aceitas.'}), 400
+    if size is not None and (not isinstance(size, int) or size <= 0 or size > max_bytes):
+        return jsonify({'error': f'O arquivo deve ter entre 1 e {max_bytes} bytes.'}), 400
+    if method not in ('POST', 'PUT'):
+        return jsonify({'error': 'method deve ser POST ou PUT.'}), 400
+
+    key = f"{uuid.uuid4()}_{filename}"
+    bucket = current_app.config['S3_BUCKET']
+    s3_client = get_s3_client()
+    try:
+        if method == 'POST':
+            presigned = s3_client.generate_presigned_post(
+                bucket,
+                key,
+                Fields={'acl': 'public-read', 'Content-Type': content_type},
+                Conditions=[
+                    {'acl': 'public-read'},
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, max_bytes]
+                ],
+                ExpiresIn=expires_in
+            )
+            url, fields, headers = presigned['url'], presigned['fields'], {}
+        else:
+            url = s3_client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': bucket, 'Key': key, 'ContentType': content_type, 'ACL': 'public-read'},
+                ExpiresIn=expires_in
+            )
+            fields = {}
+            # Cabeçalhos que o navegador precisa enviar junto com o PUT
+            headers = {'Content-Type': content_type, 'x-amz-acl': 'public-read'}
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'method': method,
+        'url': url,
+        'fields': fields,
+        'headers': headers,
+        'key': key,
+        'token': _upload_token_serializer().dumps(key),
+        'expires_in': expires_in
+    }), 200
+
+@upload_bp.route('/upload/confirm', methods=['POST'])
+def confirm_upload():
+    """
+    Endpoint que confirma um upload direto ao bucket e retorna a URL pública.
+    ---
+    parameters:
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            key:
+              type: string
+              description: Chave retornada por /upload/presign.
+            token:
+              type: string
+              description: Token retornado por /upload/presign para essa chave.
+        required: true
+    responses:
+      200:
+        description: URL da imagem carregada. As cópias derivadas são geradas em segundo plano (`status_url` indica quando terminam; até lá, as pré-visualizações usam o original). Sem `job_id` se a fila estiver cheia.
+        schema:
+          type: object
+          properties:
+            url:
+              type: string
+            job_id:
+              type: string
+            status_url:
+              type: string
+      400:
+        description: Objeto inválido (tipo ou tamanho não permitido).
+      403:
+        description: Token ausente, inválido, expirado ou de outra chave.
+      404:
+        description: Objeto não encontrado no bucket.
+    """
+    data = request.get_json() or {}
+    key = data.get('key')
+    if not key or '/' in key:
+        return jsonify({'error': 'key é necessária.'}), 400
+
+    # Só chaves emitidas por /upload/presign (e ainda no prazo) são aceitas:
+    # assim o objeto só pode ter sido criado por este fluxo
+    max_age = current_app.config['UPLOAD_PRESIGN_EXPIRES'] + current_app.config['UPLOAD_CONFIRM_GRACE']
+    try:
+        token_key = _upload_token_serializer().loads(data.get('token') or '', max_age=max_age)
+    except BadSignature:
+        token_key = None
+    if token_key != key:
+        return jsonify({'error': 'Token de upload ausente ou inválido.'}), 403
+
+    bucket = current_app.config['S3_BUCKET']
+    s3_client = get_s3_client()
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        return jsonify({'error': 'Arquivo não encontrado.'}), 404
+
+    # O PUT pré-assinado não limita o tamanho: o objeto é validado aqui
+    if head['ContentLength'] > current_app.config['UPLOAD_MAX_BYTES'] or \
+            not head.get('ContentType', '').startswith('image/'):
+        s3_client.delete_object(Bucket=bucket, Key=key)
+        return jsonify({'error': 'Arquivo inválido.'}), 400
+
+    # As cópias derivadas exigem baixar e decodificar o original: ficam para a
+    # fila de jobs e a URL é retornada sem esperar por elas
+    response = {'url': public_url(key)}
+    try:
+        job_id = get_preview_queue().submit(store_derivatives_from_bucket, key)
+    except QueueFullError:
+        current_app.logger.warning("Fila cheia: cópias derivadas de %s não geradas", key)
+    else:
+        response.update(job_id=job_id, status_url=url_for('preview.preview_job_status', job_id=job_id))
+    return jsonify(response), 200
\ No newline at end of file
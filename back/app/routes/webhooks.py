@@ -0,0 +1,96 @@
+# app/routes/webhooks.py
+import json
+
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.config import Config
+from app.extensions import db
+from app.models import ProcessedStripeEvent
+from app.utils.catalog import get_plan_catalog
+from app.utils.subscriptions import apply_subscription
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+
+def _handle_subscription(event):
+    data = event['data']['object']
+    if apply_subscription(data, event['created']) is None:
+        current_app.logger.info("Evento %s ignorado: assinatura %s já tem estado mais recente.",
+                                event['id'], data.get('id'))
+
+
+def _handle_catalog(event):
+    # Preço ou produto alterado: recarrega o catálogo em segundo plano
+    get_plan_catalog().invalidate()
+
+
+# Tratadores por prefixo do tipo de evento; os demais eventos são apenas registrados
+EVENT_HANDLERS = {
+    'customer.subscription.': _handle_subscription,
+    'price.': _handle_catalog,
+    'product.': _handle_catalog,
+}
+
+
+@webhooks_bp.route('/webhooks/stripe', methods=['POST'])
+def stripe_webhook():
+    """
+    Recebe os webhooks do Stripe e atualiza o espelho local das assinaturas.
+    ---
+    parameters:
+      - in: header
+        name: Stripe-Signature
+        type: string
+        required: true
+        description: Assinatura HMAC do payload enviada pelo Stripe.
+      - in: body
+        name: body
+        schema:
+          type: object
+        required: true
+    responses:
+      200:
+        description: Evento processado (ou já processado anteriormente).
+      400:
+        description: Payload ou assinatura inválidos.
+      409:
+        description: Conflito com uma entrega simultânea; o Stripe reenviará o evento.
+      500:
+        description: Webhook não configurado.
+    """
+    if not Config.STRIPE_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhook do Stripe não configurado.'}), 500
+
+    # Importado sob demanda: o SDK do Stripe é pesado e só é usado aqui e no gateway
+    import stripe
+
+    payload = request.get_data()
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload.decode('utf-8'),
+            request.headers.get('Stripe-Signature'),
+            Config.STRIPE_WEBHOOK_SECRET,
+            Config.STRIPE_WEBHOOK_TOLERANCE,
+        )
+        event = json.loads(payload)
+    except (stripe.SignatureVerificationError, UnicodeDecodeError, ValueError):
+        return jsonify({'error': 'Assinatura ou payload inválido.'}), 400
+
+    if db.session.get(ProcessedStripeEvent, event['id']) is not None:
+        return jsonify({'status': 'duplicate'}), 200
+
+    # O registro do evento e seus efeitos são gravados na mesma transação
+    db.session.add(ProcessedStripeEvent(id=event['id'], type=event['type'], created=event['created']))
+    try:
+        for prefix, handler in EVENT_HANDLERS.items():
+            if event['type'].startswith(prefix):
+                handler(event)
+        db.session.commit()
+    except IntegrityError:
+        # Entrega simultânea (do mesmo evento ou da mesma assinatura nova): o
+        # Stripe reenvia o evento, e o reenvio é aplicado ou detectado como duplicado
+        db.session.rollback()
+        return jsonify({'error': 'Evento em processamento concorrente.'}), 409
+
+    return jsonify({'status': 'processed'}), 200
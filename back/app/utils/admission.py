@@ -0,0 +1,139 @@
+# app/utils/admission.py
+import threading
+import time
+from contextlib import contextmanager
+
+from app.config import Config
+from app.utils.metrics import record_stage, register_collector
+
+
+class RenderOverloaded(Exception):
+    """
+    O orçamento de memória de renderização do processo está esgotado e o
+    trabalho não pôde esperar mais; a requisição deve ser repetida depois.
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderTooLarge(RenderOverloaded):
+    """
+    A memória estimada do trabalho é maior que o orçamento inteiro: ele nunca
+    seria admitido, então é recusado de imediato (sem Retry-After).
+    """
+
+    def __init__(self, message):
+        super().__init__(message, retry_after=None)
+
+
+class MemoryBudget:
+    """
+    Controle de admissão por memória estimada.
+
+    Cada renderização reserva a memória que seus pixels vão ocupar (ver
+    `decode_cost`) antes de decodificar a imagem e a devolve ao terminar. Se
+    a reserva não cabe no orçamento, o trabalho espera até `timeout` segundos
+    pela liberação de outras reservas e, depois disso, é recusado com
+    RenderOverloaded, em vez de levar o processo a estourar a memória.
+
+    Uma reserva maior que o orçamento inteiro é recusada na hora com
+    RenderTooLarge: é justamente o trabalho que estouraria a memória.
+    """
+
+    def __init__(self, budget_bytes, timeout=10, retry_after=2):
+        self.budget = budget_bytes
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """
+        Reserva `nbytes` durante o bloco (esperando, se preciso).
+        """
+        start = time.monotonic()
+        with self._condition:
+            if nbytes > self.budget:
+                self.rejected += 1
+                raise RenderTooLarge(
+                    f"A renderização precisaria de cerca de {nbytes / 2 ** 20:.0f} MB, acima do limite de "
+                    f"{self.budget / 2 ** 20:.0f} MB. Use uma imagem ou tela menor."
+                )
+            deadline = start + self.timeout
+            while self.in_use + nbytes > self.budget:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise RenderOverloaded(
+                        "Servidor ocupado renderizando outras imagens. Tente novamente em instantes.",
+                        self.retry_after,
+                    )
+                self.waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += nbytes
+            self.admitted += 1
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            record_stage('admission', waited)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= nbytes
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'budget_bytes': self.budget,
+                'in_use_bytes': self.in_use,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+_render_budget = None
+_render_budget_lock = threading.Lock()
+
+
+def get_render_budget():
+    """
+    Retorna o orçamento de memória de renderização do processo, criado na primeira chamada.
+    """
+    global _render_budget
+    if _render_budget is None:
+        with _render_budget_lock:
+            if _render_budget is None:
+                _render_budget = MemoryBudget(
+                    budget_bytes=Config.RENDER_MEMORY_BUDGET_BYTES,
+                    timeout=Config.RENDER_ADMISSION_TIMEOUT,
+                )
+                register_collector('render_memory', _render_budget.stats, counters=('admitted', 'rejected'))
+    return _render_budget
+
+
+def init_admission(app):
+    """
+    Respostas das renderizações recusadas pelo controle de admissão, em
+    qualquer rota: 503 com Retry-After quando o orçamento está ocupado e 413
+    quando o trabalho não caberia nem sozinho.
+    """
+    from flask import jsonify
+
+    @app.errorhandler(RenderOverloaded)
+    def _render_overloaded(e):
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(int(e.retry_after))}
+
+    @app.errorhandler(RenderTooLarge)
+    def _render_too_large(e):
+        return jsonify({'error': str(e)}), 413
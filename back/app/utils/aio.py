@@ -0,0 +1,345 @@
+# app/utils/aio.py
+import asyncio
+import contextvars
+import functools
+import inspect
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request_started
+
+from app.config import Config
+
+
+class IOLoop:
+    """
+    Loop asyncio do processo: o loop do servidor ASGI (`loop`), ou um loop
+    próprio executado em uma thread quando o app roda sob WSGI.
+
+    No modo assíncrono (ASYNC_MODE), todas as views async rodam neste loop em
+    vez de um loop novo por requisição: as esperas de rede (S3, hosts de
+    imagens, Stripe) de todas as requisições em andamento são multiplexadas
+    em uma única thread, e o cliente HTTP assíncrono (com seu pool de
+    conexões) é compartilhado entre elas. Trabalho de CPU (Pillow) e chamadas
+    bloqueantes (banco, cache em disco) não podem rodar no loop: use `offload`.
+    """
+
+    def __init__(self, max_connections=200, max_keepalive=50, connect_timeout=3.05, read_timeout=10,
+                 blocking_threads=32, loop=None):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.timeout = (connect_timeout, read_timeout)
+        self.loop = loop or asyncio.new_event_loop()
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=blocking_threads, thread_name_prefix="async-blocking")
+        )
+        self._client = None
+        self._thread = None
+        if loop is None:
+            self._thread = threading.Thread(target=self.loop.run_forever, name="async-io", daemon=True)
+            self._thread.start()
+
+    @property
+    def client(self):
+        """
+        Cliente httpx.AsyncClient compartilhado. Só pode ser usado dentro do loop.
+
+        Segue redirecionamentos como a sessão do requests no modo síncrono; os
+        timeouts são os mesmos (FETCH_CONNECT_TIMEOUT/FETCH_READ_TIMEOUT) e o
+        limite de tamanho é aplicado por quem lê a resposta (fetch_async).
+        """
+        if self._client is None:
+            # httpx é importado sob demanda: só o modo assíncrono precisa dele
+            import httpx
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                ),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                follow_redirects=True,
+            )
+        return self._client
+
+    def submit(self, coro):
+        """
+        Agenda a corrotina no loop a partir de outra thread e retorna um
+        concurrent.futures.Future. A tarefa herda uma cópia do contexto
+        (contextvars) de quem chama, então request, g e current_app do Flask
+        continuam disponíveis dentro dela.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        Executa a corrotina no loop e bloqueia a thread atual até o resultado.
+        Não pode ser chamado de dentro do próprio loop.
+        """
+        return self.submit(coro).result()
+
+    async def aclose(self):
+        """
+        Fecha o cliente HTTP compartilhado. Chamado dentro do loop, no
+        encerramento do servidor ASGI.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def offload(fn, *args, executor=None, **kwargs):
+    """
+    Executa `fn(*args, **kwargs)` fora do loop, no `executor` informado (ex.:
+    o pool de renderização para trabalho do Pillow) ou no pool de chamadas
+    bloqueantes do loop, preservando o contexto do Flask.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(context.run, fn, *args, **kwargs)
+    )
+
+
+async def read_request_body():
+    """
+    Lê o corpo da requisição atual fora do loop (formulários multipart são
+    processados aqui), para que request.files/request.json não bloqueiem o
+    loop esperando pelo cliente.
+    """
+    from flask import request
+    await offload(request.get_data, parse_form_data=True)
+
+
+_async_views = {}
+
+
+def async_view(sync_view):
+    """
+    Registra a função decorada como variante assíncrona de `sync_view`. A
+    variante substitui a view síncrona quando o modo assíncrono é ativado e
+    herda sua documentação (usada pelo Swagger).
+    """
+    def decorator(fn):
+        fn.__doc__ = sync_view.__doc__
+        _async_views[sync_view] = fn
+        return fn
+    return decorator
+
+
+def init_async_mode(app):
+    """
+    Ativa o modo assíncrono no app: as views async passam a rodar no loop de
+    I/O do processo e as views com variante assíncrona são substituídas por
+    ela. Deve ser chamado depois de registrar os blueprints.
+    """
+    def async_to_sync(func):
+        return lambda *args, **kwargs: get_io_loop().run(func(*args, **kwargs))
+
+    app.async_to_sync = async_to_sync
+    for endpoint, view in list(app.view_functions.items()):
+        if view in _async_views:
+            app.view_functions[endpoint] = _async_views[view]
+    app.config['ASYNC_MODE'] = True
+
+
+_io_loop = None
+_io_loop_lock = threading.Lock()
+
+
+def _new_io_loop(loop=None):
+    return IOLoop(
+        max_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS,
+        max_keepalive=Config.ASYNC_HTTP_MAX_KEEPALIVE,
+        connect_timeout=Config.FETCH_CONNECT_TIMEOUT,
+        read_timeout=Config.FETCH_READ_TIMEOUT,
+        blocking_threads=Config.ASYNC_BLOCKING_THREADS,
+        loop=loop,
+    )
+
+
+def get_io_loop():
+    """
+    Retorna o loop de I/O do processo, criado (e iniciado) na primeira chamada.
+    """
+    global _io_loop
+    if _io_loop is None:
+        with _io_loop_lock:
+            if _io_loop is None:
+                _io_loop = _new_io_loop()
+    return _io_loop
+
+
+def attach_io_loop():
+    """
+    Usa o loop em execução (o do servidor ASGI) como loop de I/O do processo,
+    para que o cliente HTTP compartilhado e as views async rodem nele. Deve
+    ser chamado de dentro do loop.
+    """
+    global _io_loop
+    loop = asyncio.get_running_loop()
+    if _io_loop is None or _io_loop.loop is not loop:
+        with _io_loop_lock:
+            if _io_loop is None or _io_loop.loop is not loop:
+                _io_loop = _new_io_loop(loop)
+    return _io_loop
+
+
+class AsgiApp:
+    """
+    Aplicação ASGI sobre o app Flask no modo assíncrono.
+
+    Views async (as variantes registradas com `async_view`) são aguardadas
+    diretamente no loop do servidor, com o mesmo ciclo do Flask (before/after
+    request, tratadores de erro e teardown): uma requisição esperando a rede
+    não ocupa thread nenhuma. As demais rotas são síncronas e rodam como
+    WSGI em um pool de até `threads` threads.
+    """
+
+    def __init__(self, app, threads=200):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Tipo de conexão ASGI não suportado: {scope['type']}")
+        attach_io_loop()
+        environ = _build_environ(scope, await _read_body(receive))
+        view = self._async_view(environ)
+        if view is None:
+            status, headers, body = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_wsgi, self.app, environ
+            )
+        else:
+            status, headers, body = await self._dispatch(environ, view)
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _async_view(self, environ):
+        """
+        Retorna a view async da rota requisitada, ou None para rotas
+        síncronas (e erros de roteamento, tratados pelo caminho WSGI).
+        """
+        if environ['REQUEST_METHOD'] == 'OPTIONS':
+            return None
+        try:
+            rule, _ = self.app.url_map.bind_to_environ(environ).match(return_rule=True)
+        except Exception:
+            return None
+        view = self.app.view_functions.get(rule.endpoint)
+        return view if inspect.iscoroutinefunction(view) else None
+
+    async def _dispatch(self, environ, view):
+        # Mesmo ciclo de Flask.wsgi_app/full_dispatch_request, com a view aguardada no loop
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(app)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**ctx.request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            app_iter, status, headers = response.get_wsgi_response(environ)
+            return status, headers, _consume(app_iter)
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                attach_io_loop()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await attach_io_loop().aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def _build_environ(scope, body):
+    """
+    Monta o environ WSGI da requisição ASGI (com o corpo já lido).
+    """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_wsgi(app, environ):
+    started = []
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+        return chunks.append
+
+    chunks.append(_consume(app(environ, start_response)))
+    return started[0], started[1], b''.join(chunks)
+
+
+def _consume(app_iter):
+    try:
+        return b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
@@ -0,0 +1,162 @@
+# app/utils/catalog.py
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from app.config import Config
+from app.utils.metrics import register_collector
+from app.utils.stripe_gateway import get_stripe_gateway
+
+logger = logging.getLogger(__name__)
+
+
+def _plan(price):
+    product = price.get('product')
+    product = product if isinstance(product, dict) else {'id': product}
+    recurring = price.get('recurring') or {}
+    return {
+        'id': price['id'],
+        'product': product.get('id'),
+        'name': product.get('name') or price.get('nickname'),
+        'description': product.get('description'),
+        'unit_amount': price.get('unit_amount'),
+        'currency': price.get('currency'),
+        'interval': recurring.get('interval'),
+        'interval_count': recurring.get('interval_count'),
+    }
+
+
+class PlanCatalog:
+    """
+    Catálogo de planos (preços ativos do Stripe com seus produtos) mantido em memória.
+
+    O catálogo é carregado na primeira consulta e recarregado por uma thread em
+    segundo plano a cada `ttl` segundos, ou antes disso quando `invalidate()`
+    é chamado (ex.: por webhooks de price.* / product.*). As consultas nunca
+    chamam o Stripe depois da primeira carga: se uma recarga falhar, a versão
+    anterior continua sendo servida. O JSON e o ETag são calculados uma vez por
+    versão.
+    """
+
+    def __init__(self, ttl=300, retry_interval=30):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._plans = {}
+        self._body = None
+        self._etag = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_attempt = None
+        self._wake = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def _fetch(self):
+        plans = []
+        for price in get_stripe_gateway().list_active_prices():
+            product = price.get('product')
+            if isinstance(product, dict) and product.get('active') is False:
+                continue
+            plans.append(_plan(price))
+        return sorted(plans, key=lambda plan: (plan['product'] or '', plan['unit_amount'] or 0, plan['id']))
+
+    def refresh(self):
+        """
+        Recarrega o catálogo do Stripe. Retorna True em caso de sucesso.
+        """
+        with self._refresh_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        self._last_attempt = time.time()
+        try:
+            plans = self._fetch()
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Falha ao carregar o catálogo de planos do Stripe: %s", e)
+            return False
+        body = json.dumps({'plans': plans}, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            self._plans = {plan['id']: plan for plan in plans}
+            self._body = body
+            self._etag = hashlib.sha256(body).hexdigest()[:32]
+            self._loaded_at = time.time()
+            self.refreshes += 1
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.ttl)
+            self._wake.clear()
+            self.refresh()
+
+    def _ensure_loaded(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="plan-catalog-refresh", daemon=True)
+                    self._thread.start()
+        if self._body is None:
+            # Primeira carga síncrona; após uma falha, espera `retry_interval`
+            # antes de tentar de novo dentro de uma requisição
+            with self._refresh_lock:
+                due = self._last_attempt is None or time.time() - self._last_attempt > self.retry_interval
+                if self._body is None and due:
+                    self._refresh_locked()
+
+    def invalidate(self):
+        """
+        Agenda uma recarga imediata em segundo plano.
+        """
+        self._wake.set()
+
+    def snapshot(self):
+        """
+        Retorna (corpo JSON, ETag) da versão atual, ou (None, None) se o
+        catálogo ainda não pôde ser carregado.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._body, self._etag
+
+    def get(self, price_id):
+        """
+        Retorna o plano com o id informado, ou None se não existir.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._plans.get(price_id)
+
+    @property
+    def loaded(self):
+        return self._body is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'plans': len(self._plans),
+                'loaded_at': self._loaded_at,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+            }
+
+
+_plan_catalog = None
+_plan_catalog_lock = threading.Lock()
+
+
+def get_plan_catalog():
+    """
+    Retorna o catálogo de planos do processo, criado na primeira chamada.
+    """
+    global _plan_catalog
+    if _plan_catalog is None:
+        with _plan_catalog_lock:
+            if _plan_catalog is None:
+                _plan_catalog = PlanCatalog(ttl=Config.PLAN_CATALOG_TTL)
+                register_collector('plan_catalog', _plan_catalog.stats, counters=('refreshes', 'failures'))
+    return _plan_catalog
@@ -0,0 +1,264 @@
+# app/utils/compositing.py
+import numpy as np
+from PIL import Image
+
+from app.config import Config
+from app.utils.templates import get_template_registry
+
+BLEND_MODES = ('normal', 'multiply', 'screen', 'overlay', 'darken', 'lighten')
+
+
+class CompositingError(Exception):
+    """
+    Pilha de camadas inválida (modo de mesclagem, fonte ou parâmetro desconhecido).
+    """
+
+
+# Os buffers usam layout planar (4, H, W): cada canal é contíguo em memória,
+# o que deixa as operações vetorizadas (e o broadcast do alfa) bem mais rápidas.
+_EPSILON = 1e-6
+
+
+def to_premultiplied(image):
+    """
+    Converte uma imagem do Pillow em um buffer float32 planar (4, H, W) com
+    cores pré-multiplicadas pelo alfa, no intervalo [0, 1].
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    array = np.asarray(image).transpose(2, 0, 1).astype(np.float32, order="C")
+    array *= 1.0 / 255.0
+    array[:3] *= array[3]
+    return array
+
+
+def _unpremultiply(rgb, alpha):
+    # Onde alfa = 0 as cores pré-multiplicadas já são 0, então o epsilon é seguro
+    scale = np.maximum(alpha, _EPSILON)
+    np.reciprocal(scale, out=scale)
+    return rgb * scale
+
+
+def from_premultiplied(array):
+    """
+    Converte um buffer pré-multiplicado (4, H, W) de volta para uma imagem RGBA.
+    O buffer é reaproveitado (alterado no lugar).
+    """
+    array[:3] = _unpremultiply(array[:3], array[3])
+    array *= 255.0
+    array += 0.5
+    np.clip(array, 0, 255, out=array)
+    return Image.fromarray(array.transpose(1, 2, 0).astype(np.uint8, order="C"), "RGBA")
+
+
+def _blend_function(mode, cs, cb):
+    # Funções de mesclagem separáveis (W3C Compositing and Blending), em cores não pré-multiplicadas
+    if mode == 'multiply':
+        return cs * cb
+    if mode == 'screen':
+        return cs + cb - cs * cb
+    if mode == 'overlay':
+        return np.where(cb <= 0.5, 2.0 * cs * cb, 1.0 - 2.0 * (1.0 - cs) * (1.0 - cb))
+    if mode == 'darken':
+        return np.minimum(cs, cb)
+    if mode == 'lighten':
+        return np.maximum(cs, cb)
+    raise CompositingError(f"Modo de mesclagem desconhecido: {mode}")
+
+
+def blend_into(dst, src, mode='normal'):
+    """
+    Mescla `src` sobre `dst` (buffers pré-multiplicados (4, H, W) do mesmo
+    tamanho), alterando `dst` no lugar.
+    """
+    sa = src[3]
+    inv_sa = 1.0 - sa
+    if mode == 'normal':
+        # Porter-Duff "source over" com alfa pré-multiplicado
+        dst *= inv_sa
+        dst += src
+        return dst
+
+    da = dst[3]
+    cs = _unpremultiply(src[:3], sa)
+    cb = _unpremultiply(dst[:3], da)
+    mixed = _blend_function(mode, cs, cb)
+    mixed *= sa * da
+    # co = (1 - da) * cs' + (1 - sa) * cb' + sa * da * B(cs, cb)
+    mixed += src[:3] * (1.0 - da)
+    dst[:3] *= inv_sa
+    dst[:3] += mixed
+    dst[3] *= inv_sa
+    dst[3] += sa
+    return dst
+
+
+def layer_size(layer, size, canvas_width):
+    """
+    Tamanho final de uma camada cuja fonte tem o tamanho `size` (após
+    `width`/`scale`). Levanta CompositingError se algum lado ficar fora de
+    1 a PREVIEW_MAX_SIDE pixels.
+    """
+    if 'width' in layer or 'scale' in layer:
+        width = int(layer['width']) if 'width' in layer else int(canvas_width * layer['scale'])
+        size = (width, max(1, int(width * size[1] / size[0])) if width > 0 else 0)
+    if not all(1 <= side <= Config.PREVIEW_MAX_SIDE for side in size):
+        raise CompositingError(
+            f"Camada de {size[0]}x{size[1]} pixels: cada lado deve ter de 1 a {Config.PREVIEW_MAX_SIDE} pixels."
+        )
+    return size
+
+
+def composite_cost(layers, sizes, canvas_size=None):
+    """
+    Estimativa, em bytes, do pico de memória de `composite_layers`, a partir
+    do tamanho de cada fonte antes do redimensionamento (`sizes`:
+    {source: (largura, altura)}). Conta todas as camadas redimensionadas em
+    RGBA, a tela em float32 com o resultado RGBA e, para a maior camada, o
+    buffer float32, os temporários da mesclagem e a máscara. Levanta
+    CompositingError nos mesmos casos que `composite_layers`.
+    """
+    if canvas_size is None:
+        if 'scale' in layers[0]:
+            raise CompositingError("Informe o tamanho da tela para usar 'scale' na primeira camada.")
+        canvas_size = layer_size(layers[0], sizes[layers[0]['source']], None)
+    layer_pixels = [
+        width * height
+        for width, height in (layer_size(layer, sizes[layer['source']], canvas_size[0]) for layer in layers)
+    ]
+    return sum(layer_pixels) * 4 + canvas_size[0] * canvas_size[1] * (16 + 4 * 2) + max(layer_pixels) * 64
+
+
+def _layer_image(layer, sources, canvas_width):
+    source = layer.get('source')
+    if source in sources:
+        image = sources[source]
+        size = layer_size(layer, image.size, canvas_width)
+        if size != image.size:
+            image = image.convert("RGBA").resize(size, Image.LANCZOS)
+        return image
+
+    if not isinstance(source, str):
+        raise CompositingError("Cada camada precisa de um 'source'.")
+    registry = get_template_registry()
+    image = registry.get(source)
+    size = layer_size(layer, image.size, canvas_width)
+    if 'width' in layer or 'scale' in layer:
+        return registry.resized(source, size[0])
+    return image
+
+
+def _is_backdrop(layer, image, canvas_size):
+    # Primeira camada opaca e simples cobrindo a tela: pode ser usada como fundo sem conversão
+    return (
+        layer.get('blend', 'normal') == 'normal' and float(layer.get('opacity', 1.0)) == 1.0
+        and not layer.get('mask') and not layer.get('clip')
+        and int(layer.get('x', 0)) == 0 and int(layer.get('y', 0)) == 0
+        and image.size == tuple(canvas_size)
+    )
+
+
+def composite_layers(layers, sources=None, canvas_size=None):
+    """
+    Renderiza uma pilha declarativa de camadas em uma única passada.
+
+    Cada camada é um dicionário com:
+      - source: nome de uma imagem em `sources` (ex.: 'base') ou caminho de um template;
+      - x, y: posição do canto superior esquerdo (default 0, 0);
+      - width ou scale: largura em pixels ou fração da largura da tela (opcional);
+      - blend: 'normal', 'multiply', 'screen', 'overlay', 'darken' ou 'lighten';
+      - opacity: opacidade de 0 a 1 (default 1);
+      - clip: se True, a camada é recortada pelo alfa da camada não recortada abaixo;
+      - mask: caminho de uma máscara em tons de cinza, esticada ao tamanho da camada.
+
+    O tamanho da tela é `canvas_size` ou o tamanho da primeira camada. Somente
+    a região coberta pelas camadas superiores é convertida para float e
+    mesclada; quando a primeira camada cobre a tela, o restante dela é copiado
+    sem conversão.
+
+    Retorna uma imagem RGBA.
+    """
+    sources = sources or {}
+    if not layers:
+        raise CompositingError("A pilha de camadas está vazia.")
+
+    for layer in layers:
+        if layer.get('blend', 'normal') not in BLEND_MODES:
+            raise CompositingError(f"Modo de mesclagem desconhecido: {layer.get('blend')}")
+
+    if canvas_size is None:
+        if 'scale' in layers[0]:
+            raise CompositingError("Informe o tamanho da tela para usar 'scale' na primeira camada.")
+        canvas_size = _layer_image(layers[0], sources, None).size
+    canvas_width, canvas_height = canvas_size
+    images = [_layer_image(layer, sources, canvas_width) for layer in layers]
+
+    # Fundo: a primeira camada (se cobrir a tela) ou uma tela transparente
+    backdrop = _is_backdrop(layers[0], images[0], canvas_size)
+    if backdrop:
+        result = images[0].convert("RGBA")
+        result = result.copy() if result is images[0] else result
+        stack = list(zip(layers[1:], images[1:]))
+    else:
+        result = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
+        stack = list(zip(layers, images))
+
+    # Região de trabalho: união das camadas (recortada à tela)
+    boxes = []
+    for layer, image in stack:
+        x, y = int(layer.get('x', 0)), int(layer.get('y', 0))
+        box = (max(x, 0), max(y, 0), min(x + image.width, canvas_width), min(y + image.height, canvas_height))
+        if box[2] > box[0] and box[3] > box[1]:
+            boxes.append(box)
+    if not boxes:
+        return result
+    ox, oy = min(b[0] for b in boxes), min(b[1] for b in boxes)
+    region_box = (ox, oy, max(b[2] for b in boxes), max(b[3] for b in boxes))
+    canvas = to_premultiplied(result.crop(region_box)) if backdrop else \
+        np.zeros((4, region_box[3] - oy, region_box[2] - ox), dtype=np.float32)
+
+    # O fundo é a base do primeiro grupo de recorte
+    clip_box, clip_alpha = (region_box, canvas[3].copy()) if backdrop else (None, None)
+
+    for layer, image in stack:
+        x, y = int(layer.get('x', 0)), int(layer.get('y', 0))
+
+        # Interseção da camada com a tela
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + image.width, canvas_width), min(y + image.height, canvas_height)
+        if right <= left or bottom <= top:
+            if not layer.get('clip'):
+                clip_box, clip_alpha = None, None
+            continue
+        crop = (left - x, top - y, right - x, bottom - y)
+        region = image.crop(crop) if crop != (0, 0, image.width, image.height) else image
+        src = to_premultiplied(region)
+
+        factor = float(layer.get('opacity', 1.0))
+        if layer.get('mask'):
+            mask = get_template_registry().get(layer['mask']).convert("L")
+            mask = mask.resize(image.size, Image.BILINEAR).crop(crop)
+            mask_array = np.asarray(mask, dtype=np.float32)
+            mask_array *= factor / 255.0
+            src *= mask_array
+        elif factor != 1.0:
+            src *= factor
+
+        if layer.get('clip'):
+            # Máscara de recorte: multiplica pelo alfa da camada base do grupo
+            clipped = np.zeros(src.shape[1:], dtype=np.float32)
+            if clip_box is not None:
+                cl, ct, cr, cb = clip_box
+                il, it = max(left, cl), max(top, ct)
+                ir, ib = min(right, cr), min(bottom, cb)
+                if ir > il and ib > it:
+                    clipped[it - top:ib - top, il - left:ir - left] = \
+                        clip_alpha[it - ct:ib - ct, il - cl:ir - cl]
+            src *= clipped
+        else:
+            clip_box, clip_alpha = (left, top, right, bottom), src[3].copy()
+
+        blend_into(canvas[:, top - oy:bottom - oy, left - ox:right - ox], src, layer.get('blend', 'normal'))
+
+    result.paste(from_premultiplied(canvas), region_box[:2])
+    return result
@@ -0,0 +1,113 @@
+# app/utils/decoding.py
+import io
+
+from PIL import Image
+
+from app.config import Config
+from app.utils.metrics import stage
+
+# Depois da decodificação reduzida, reduce() (média por blocos) aproxima a
+# imagem de até o dobro do tamanho final e o filtro de qualidade faz o resto
+REDUCING_GAP = 2.0
+
+
+class ImageTooLarge(Exception):
+    """
+    A imagem tem mais pixels que o limite configurado (IMAGE_MAX_PIXELS).
+    """
+
+
+def open_image(data):
+    """
+    Abre a imagem lendo apenas o cabeçalho (os pixels ainda não são
+    decodificados) e recusa imagens acima de IMAGE_MAX_PIXELS.
+    """
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if width * height > Config.IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(
+            f"Imagem de {width}x{height} pixels excede o limite de "
+            f"{Config.IMAGE_MAX_PIXELS / 1_000_000:g} megapixels."
+        )
+    return image
+
+
+def fit_size(size, max_side=None):
+    """
+    Tamanho final de uma imagem `size` com o maior lado limitado a `max_side`.
+    """
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return size
+    ratio = max_side / max(width, height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def fit_width(size, width):
+    """
+    Tamanho final de uma imagem `size` com largura `width` (proporção mantida).
+    """
+    return width, max(1, round(size[1] * width / size[0]))
+
+
+def _draft_scale(size, target):
+    # Mesma escolha do draft do Pillow: maior fator (8, 4, 2) que não fica abaixo do tamanho pedido
+    scale = min(size[0] // target[0], size[1] // target[1])
+    for factor in (8, 4, 2):
+        if scale >= factor:
+            return factor
+    return 1
+
+
+def shrink_on_load(image, max_side, mode=None, size=None):
+    """
+    Configura a decodificação reduzida (JPEG: escala de 1/2, 1/4 ou 1/8 feita
+    pela própria DCT) para o menor tamanho que ainda cobre o tamanho final
+    (`size`, ou o tamanho limitado a `max_side`). Sem efeito em outros
+    formatos. Deve ser chamado antes de carregar os pixels; retorna o tamanho
+    final.
+    """
+    target = size or fit_size(image.size, max_side)
+    if target != image.size:
+        image.draft(mode, target)
+    return target
+
+
+def decode_cost(image, max_side=None, copies=1, size=None):
+    """
+    Estimativa, em bytes, do pico de memória para decodificar `image` (aberta
+    por `open_image`) com o maior lado limitado a `max_side` (ou no tamanho
+    `size`) e manter `copies` imagens RGBA do tamanho final (base, cópias e
+    buffers de codificação). Usada no controle de admissão.
+    """
+    width, height = image.size
+    target = size or fit_size(image.size, max_side)
+    if image.format == 'JPEG' and target != image.size:
+        scale = _draft_scale(image.size, target)
+        width, height = -(-width // scale), -(-height // scale)
+    return width * height * len(image.getbands()) + target[0] * target[1] * 4 * copies
+
+
+def load_image(image, max_side=None, mode="RGBA", resample=Image.LANCZOS, size=None):
+    """
+    Decodifica `image` (aberta por `open_image`) no modo `mode`, com o maior
+    lado limitado a `max_side` (ou no tamanho exato `size`): decodificação
+    reduzida quando o formato permite, reduce() e o filtro `resample` até o
+    tamanho final. A conversão de modo é feita só no tamanho final.
+    """
+    with stage('decode'):
+        target = shrink_on_load(image, max_side, size=size)
+        if target != image.size:
+            image = image.resize(target, resample, reducing_gap=REDUCING_GAP)
+        if image.mode == mode:
+            # convert() no mesmo modo faria uma cópia inteira sem necessidade
+            image.load()
+            return image
+        return image.convert(mode)
+
+
+def decode(data, max_side=None, mode="RGBA", resample=Image.LANCZOS):
+    """
+    Atalho para `load_image(open_image(data), ...)`.
+    """
+    return load_image(open_image(data), max_side, mode, resample)
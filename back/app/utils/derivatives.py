@@ -0,0 +1,137 @@
+# app/utils/derivatives.py
+import asyncio
+import io
+
+from PIL import Image, ImageOps
+
+from app.config import Config
+from app.utils.admission import get_render_budget
+from app.utils.decoding import decode_cost, open_image, shrink_on_load
+from app.utils.fetcher import get_image_fetcher
+from app.utils.metrics import stage
+from app.utils.s3 import get_s3_client, public_url
+
+# Sufixos das cópias derivadas, gravadas ao lado do original no bucket
+DERIVATIVE_SUFFIXES = {
+    'preview': '.preview.webp',
+    'thumbnail': '.thumb.webp',
+}
+
+
+def derivative_key(key, kind):
+    """
+    Retorna a chave da cópia derivada `kind` ('preview' ou 'thumbnail') do objeto `key`.
+    """
+    return f"{key}{DERIVATIVE_SUFFIXES[kind]}"
+
+
+def working_copy_url(image_url):
+    """
+    Retorna a URL da cópia de trabalho (resolução de pré-visualização) de uma
+    imagem do nosso bucket. URLs externas (ou que já são derivadas) são
+    retornadas sem alteração.
+    """
+    prefix = public_url("")
+    if not Config.S3_BUCKET or not image_url.startswith(prefix):
+        return image_url
+    if image_url.endswith(tuple(DERIVATIVE_SUFFIXES.values())):
+        return image_url
+    return derivative_key(image_url, 'preview')
+
+
+def _encode(image):
+    output = io.BytesIO()
+    image.save(output, format="WEBP", quality=Config.DERIVATIVE_QUALITY, method=4)
+    return output.getvalue()
+
+
+def generate_derivatives(content):
+    """
+    Decodifica a imagem original uma única vez e gera:
+      - 'preview': cópia de trabalho normalizada (orientação EXIF aplicada)
+        com o maior lado limitado a DERIVATIVE_PREVIEW_MAX_SIDE;
+      - 'thumbnail': miniatura com o maior lado limitado a DERIVATIVE_THUMB_MAX_SIDE.
+
+    Retorna um dicionário {tipo: bytes WebP}.
+    """
+    preview_side = Config.DERIVATIVE_PREVIEW_MAX_SIDE
+    source = open_image(content)
+    with get_render_budget().reserve(decode_cost(source, preview_side, copies=3)), stage('derivatives'):
+        with source:
+            # JPEG: decodifica direto em escala reduzida (1/2, 1/4, 1/8) quando possível
+            shrink_on_load(source, preview_side, "RGB")
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or \
+                (image.mode == "P" and "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        image.thumbnail((preview_side, preview_side), Image.LANCZOS)
+        thumbnail = image.copy()
+        thumbnail.thumbnail((Config.DERIVATIVE_THUMB_MAX_SIDE, Config.DERIVATIVE_THUMB_MAX_SIDE), Image.LANCZOS)
+        return {
+            'preview': _encode(image),
+            'thumbnail': _encode(thumbnail),
+        }
+
+
+def store_derivatives(key, content):
+    """
+    Gera as cópias derivadas de `content` e as grava ao lado do objeto `key`.
+    A cópia de trabalho também é registrada no cache do fetcher, para que a
+    primeira pré-visualização não precise baixá-la.
+
+    Retorna um dicionário {tipo: URL pública}.
+    """
+    derivatives = generate_derivatives(content)
+    s3_client = get_s3_client()
+    fetcher = get_image_fetcher()
+    urls = {}
+    for kind, data in derivatives.items():
+        target = derivative_key(key, kind)
+        with stage('upload'):
+            s3_client.put_object(
+                Bucket=Config.S3_BUCKET,
+                Key=target,
+                Body=data,
+                ACL='public-read',
+                ContentType='image/webp'
+            )
+        urls[kind] = public_url(target)
+        if kind == 'preview':
+            fetcher.prime(urls[kind], data)
+    return urls
+
+def store_derivatives_from_bucket(key):
+    """
+    Baixa o objeto `key` do bucket e grava suas cópias derivadas. Feito para
+    rodar na fila de jobs (ex.: depois de um upload direto ao bucket), fora
+    da requisição: até lá, as pré-visualizações usam o original.
+
+    Retorna a URL da cópia de trabalho ou uma mensagem iniciada por "Erro".
+    """
+    try:
+        with stage('fetch'):
+            content = get_s3_client().get_object(Bucket=Config.S3_BUCKET, Key=key)['Body'].read()
+        urls = store_derivatives(key, content)
+    except Exception as e:
+        return f"Erro ao gerar as cópias derivadas de {key}: {str(e)}"
+    return urls['preview']
+
+async def store_derivatives_async(key, content):
+    """
+    Versão não bloqueante de `store_derivatives`: a decodificação e a
+    codificação rodam no pool de renderização e as cópias são enviadas ao
+    bucket em paralelo pelo cliente HTTP do loop de I/O.
+    """
+    from app.utils.aio import offload
+    from app.utils.image_processing import get_render_executor
+    from app.utils.s3 import put_object_async
+
+    derivatives = await offload(generate_derivatives, content, executor=get_render_executor())
+    kinds = list(derivatives)
+    urls = await asyncio.gather(*(
+        put_object_async(derivative_key(key, kind), derivatives[kind], 'image/webp') for kind in kinds
+    ))
+    urls = dict(zip(kinds, urls))
+    await offload(get_image_fetcher().prime, urls['preview'], derivatives['preview'])
+    return urls
@@ -0,0 +1,175 @@
+# app/utils/encoding.py
+import io
+import os
+import threading
+
+from PIL import Image, features
+
+from app.config import Config
+from app.utils.metrics import stage
+from app.utils.s3 import get_s3_client, get_transfer_config, public_url
+
+# Formatos de saída suportados e os parâmetros de codificação de cada um
+OUTPUT_FORMATS = {
+    'png': {
+        'format': 'PNG',
+        'content_type': 'image/png',
+        'extension': 'png',
+        'params': {'compress_level': 6},
+    },
+    'webp': {
+        'format': 'WEBP',
+        'content_type': 'image/webp',
+        'extension': 'webp',
+        'params': {'method': 4},
+        'default_quality': 85,
+    },
+    'jpeg': {
+        'format': 'JPEG',
+        'content_type': 'image/jpeg',
+        'extension': 'jpg',
+        'params': {'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+        'default_quality': 85,
+    },
+}
+
+
+def _avif_supported():
+    try:
+        return features.check_module('avif')
+    except ValueError:
+        # Versões do Pillow sem o módulo AVIF
+        return False
+
+
+if _avif_supported():
+    # speed 8: bem mais rápido que o padrão (6) para renderizações sob demanda,
+    # com arquivos ainda menores que WebP
+    OUTPUT_FORMATS['avif'] = {
+        'format': 'AVIF',
+        'content_type': 'image/avif',
+        'extension': 'avif',
+        'params': {'speed': 8},
+        'default_quality': 60,
+    }
+
+
+def output_options(fmt, quality=None):
+    """
+    Retorna a identificação das opções de saída (usada na chave do cache).
+    """
+    spec = OUTPUT_FORMATS[fmt]
+    if 'default_quality' not in spec:
+        return fmt
+    return f"{fmt}:{quality or spec['default_quality']}"
+
+
+def _prepare(image, fmt):
+    # JPEG não tem canal alfa: achata sobre fundo branco
+    if fmt == 'jpeg' and image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image
+
+
+def _save(image, fp, fmt, quality=None):
+    spec = OUTPUT_FORMATS[fmt]
+    params = dict(spec['params'])
+    if 'default_quality' in spec:
+        params['quality'] = quality or spec['default_quality']
+    _prepare(image, fmt).save(fp, format=spec['format'], **params)
+
+
+def encode_image(image, fmt='png', quality=None):
+    """
+    Codifica `image` em memória no formato `fmt` e retorna os bytes.
+    """
+    output = io.BytesIO()
+    with stage('encode'):
+        _save(image, output, fmt, quality)
+    return output.getvalue()
+
+
+class _TeeWriter:
+    """
+    Arquivo somente-escrita que envia os dados para um pipe (lido pelo upload)
+    e guarda uma cópia em memória (usada pelo cache).
+    """
+
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self._buffer = io.BytesIO()
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._pipe.write(data)
+        return len(data)
+
+    def flush(self):
+        self._pipe.flush()
+
+    def getvalue(self):
+        return self._buffer.getvalue()
+
+
+def encode_and_upload(image, key, fmt='png', quality=None):
+    """
+    Codifica `image` e envia o resultado ao S3 ao mesmo tempo: a codificação
+    roda em uma thread e escreve em um pipe que o `upload_fileobj` consome,
+    sem arquivos temporários.
+
+    Retorna uma tupla (bytes codificados, URL pública).
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, "rb")
+    writer = _TeeWriter(os.fdopen(write_fd, "wb"))
+    errors = []
+
+    def encode():
+        try:
+            _save(image, writer, fmt, quality)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            writer._pipe.close()
+
+    thread = threading.Thread(target=encode, name="preview-encode", daemon=True)
+    # Codificação e envio se sobrepõem: medidos juntos como uma etapa
+    with stage('encode_upload'):
+        thread.start()
+        try:
+            get_s3_client().upload_fileobj(
+                reader,
+                Config.S3_BUCKET,
+                key,
+                ExtraArgs={'ACL': 'public-read', 'ContentType': OUTPUT_FORMATS[fmt]['content_type']},
+                Config=get_transfer_config()
+            )
+        finally:
+            # Se o upload falhar, esvazia o pipe para a thread de codificação terminar
+            while reader.read(64 * 1024):
+                pass
+            reader.close()
+            thread.join()
+    if errors:
+        # A codificação falhou no meio: remove o objeto incompleto
+        get_s3_client().delete_object(Bucket=Config.S3_BUCKET, Key=key)
+        raise errors[0]
+    return writer.getvalue(), public_url(key)
+
+
+def upload_bytes(data, key, fmt='png'):
+    """
+    Envia bytes já codificados ao S3 e retorna a URL pública.
+    """
+    with stage('upload'):
+        get_s3_client().upload_fileobj(
+            io.BytesIO(data),
+            Config.S3_BUCKET,
+            key,
+            ExtraArgs={'ACL': 'public-read', 'ContentType': OUTPUT_FORMATS[fmt]['content_type']},
+            Config=get_transfer_config()
+        )
+    return public_url(key)
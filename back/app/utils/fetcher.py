@@ -0,0 +1,207 @@
+# app/utils/fetcher.py
+import hashlib
+import json
+import threading
+
+from app.config import Config
+from app.utils.metrics import register_collector, stage
+from app.utils.preview_cache import PreviewCache
+from app.utils.s3 import public_url
+
+
+class FetchError(Exception):
+    """
+    Falha ao baixar uma imagem remota (status HTTP, tempo esgotado ou tamanho excedido).
+    """
+
+
+class ImageFetcher:
+    """
+    Download de imagens remotas com:
+
+      - sessão HTTP compartilhada (pool de conexões reaproveitadas);
+      - timeouts de conexão e de leitura;
+      - leitura em streaming com limite máximo de bytes;
+      - cache local dos originais, revalidado com ETag/If-Modified-Since.
+
+    URLs que começam com um dos `immutable_prefixes` (objetos do nosso bucket,
+    cujos nomes são únicos) são servidas direto do cache, sem revalidação.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, max_bytes=25 * 1024 * 1024,
+                 cache=None, immutable_prefixes=()):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.immutable_prefixes = tuple(prefix for prefix in immutable_prefixes if prefix)
+        # requests é importado sob demanda para não pesar na inicialização do app
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.revalidated = 0
+
+    @staticmethod
+    def _cache_key(url):
+        return "fetch-" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _cached(self, url):
+        if self.cache is None:
+            return None, None
+        key = self._cache_key(url)
+        meta = self.cache.get(f"{key}.meta")
+        if meta is None:
+            return None, None
+        body = self.cache.get(key)
+        if body is None:
+            return None, None
+        return json.loads(meta.decode("utf-8")), body
+
+    def prime(self, url, body, etag=None, last_modified=None):
+        """
+        Registra no cache o conteúdo de uma URL já conhecido localmente
+        (por exemplo, logo após o upload), evitando um novo download.
+        """
+        if self.cache is None or len(body) > self.max_bytes:
+            return
+        key = self._cache_key(url)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified}
+        self.cache.put(key, body)
+        self.cache.put(f"{key}.meta", json.dumps(meta).encode("utf-8"))
+
+    def fetch(self, url):
+        """
+        Retorna os bytes de `url`, usando o cache local quando possível.
+        Levanta FetchError em caso de falha.
+        """
+        with stage('fetch'):
+            meta, body = self._cached(url)
+            if body is not None and url.startswith(self.immutable_prefixes):
+                return body
+            headers = self._conditional_headers(meta)
+
+            import requests
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 304 and body is not None:
+                        self.revalidated += 1
+                        return body
+                    response.raise_for_status()
+                    content = self._read_limited(response)
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+            except requests.RequestException as e:
+                raise FetchError(str(e)) from e
+
+            if etag or last_modified or url.startswith(self.immutable_prefixes):
+                self.prime(url, content, etag=etag, last_modified=last_modified)
+            return content
+
+    async def fetch_async(self, url):
+        """
+        Versão não bloqueante de `fetch`, para o modo assíncrono: o download
+        usa o cliente HTTP do loop de I/O e as consultas ao cache (que podem
+        ler o disco) rodam fora do loop. Deve ser aguardado no loop de
+        `get_io_loop()`.
+        """
+        from app.utils.aio import get_io_loop, offload
+        import httpx
+
+        with stage('fetch'):
+            meta, body = await offload(self._cached, url)
+            if body is not None and url.startswith(self.immutable_prefixes):
+                return body
+
+            try:
+                async with get_io_loop().client.stream('GET', url, headers=self._conditional_headers(meta)) as response:
+                    if response.status_code == 304 and body is not None:
+                        self.revalidated += 1
+                        return body
+                    response.raise_for_status()
+                    self._check_length(response)
+                    chunks = []
+                    total = 0
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        total += len(chunk)
+                        if total > self.max_bytes:
+                            raise FetchError(f"Imagem maior que o limite de {self.max_bytes} bytes.")
+                        chunks.append(chunk)
+                    content = b"".join(chunks)
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+            except httpx.HTTPError as e:
+                raise FetchError(str(e)) from e
+
+            if etag or last_modified or url.startswith(self.immutable_prefixes):
+                await offload(self.prime, url, content, etag=etag, last_modified=last_modified)
+            return content
+
+    @staticmethod
+    def _conditional_headers(meta):
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def _check_length(self, response):
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise FetchError(f"Imagem maior que o limite de {self.max_bytes} bytes.")
+
+    def _read_limited(self, response):
+        self._check_length(response)
+
+        chunks = []
+        total = 0
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            total += len(chunk)
+            if total > self.max_bytes:
+                raise FetchError(f"Imagem maior que o limite de {self.max_bytes} bytes.")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def stats(self):
+        stats = {'revalidated': self.revalidated}
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
+
+
+_image_fetcher = None
+_image_fetcher_lock = threading.Lock()
+
+
+def get_image_fetcher():
+    """
+    Retorna o fetcher de imagens do processo, criado na primeira chamada.
+    """
+    global _image_fetcher
+    if _image_fetcher is None:
+        with _image_fetcher_lock:
+            if _image_fetcher is None:
+                cache = PreviewCache(
+                    memory_bytes=Config.FETCH_CACHE_MEMORY_BYTES,
+                    disk_dir=Config.FETCH_CACHE_DIR,
+                    disk_bytes=Config.FETCH_CACHE_DISK_BYTES,
+                )
+                immutable_prefixes = []
+                if Config.S3_BUCKET:
+                    immutable_prefixes.append(public_url(""))
+                _image_fetcher = ImageFetcher(
+                    pool_size=Config.FETCH_POOL_SIZE,
+                    connect_timeout=Config.FETCH_CONNECT_TIMEOUT,
+                    read_timeout=Config.FETCH_READ_TIMEOUT,
+                    max_bytes=Config.FETCH_MAX_BYTES,
+                    cache=cache,
+                    immutable_prefixes=immutable_prefixes,
+                )
+                register_collector('fetch', _image_fetcher.stats,
+                                   counters=('revalidated', 'hits', 'disk_hits', 'misses', 'evictions'))
+    return _image_fetcher
@@ -1,36 +1,227 @@
 # app/utils/image_processing.py
-import requests
-import io
+import contextvars
+import json
 from PIL import Image  # Removido Resampling da importação
-import uuid
-import os
-import boto3
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import Config
+from app.utils.admission import RenderOverloaded, get_render_budget
+from app.utils.decoding import decode, decode_cost, fit_size, load_image, open_image
+from app.utils.derivatives import working_copy_url
+from app.utils.encoding import OUTPUT_FORMATS, encode_and_upload, encode_image, output_options, upload_bytes
+from app.utils.fetcher import FetchError, get_image_fetcher
+from app.utils.metrics import stage
+from app.utils.preview_cache import get_preview_cache, preview_cache_key
+from app.utils.templates import get_template_registry
 
-# Carrega as variáveis de ambiente (caso ainda não estejam carregadas)
-load_dotenv()
+_render_executor = None
+_render_executor_lock = threading.Lock()
 
-# Variáveis de ambiente para S3
-S3_BUCKET = os.environ.get("S3_BUCKET")
-AWS_REGION = os.environ.get("AWS_REGION")
-AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+def get_render_executor():
+    """
+    Pool de threads usado para renderizar variantes em paralelo.
+    As operações do Pillow (resize, paste, encode) liberam o GIL, então as
+    variantes de um lote aproveitam vários núcleos.
+    """
+    global _render_executor
+    if _render_executor is None:
+        with _render_executor_lock:
+            if _render_executor is None:
+                _render_executor = ThreadPoolExecutor(
+                    max_workers=Config.PREVIEW_RENDER_THREADS,
+                    thread_name_prefix="preview-render"
+                )
+    return _render_executor
 
-def upload_to_s3(file_path):
+def download_image(image_url, high_quality=False):
     """
-    Faz o upload de um arquivo para o S3 e retorna a URL pública.
+    Baixa a imagem base e retorna seus bytes (via fetcher compartilhado:
+    conexões reaproveitadas, timeouts, limite de tamanho e cache local).
+
+    Para imagens do nosso bucket, usa a cópia de trabalho gerada no upload,
+    exceto quando `high_quality` é True.
     """
-    s3_client = boto3.client(
-        's3',
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
-    filename = f"{uuid.uuid4()}_{os.path.basename(file_path)}"
-    s3_client.upload_file(file_path, S3_BUCKET, filename, ExtraArgs={'ACL': 'public-read'})
-    return f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{filename}"
+    fetcher = get_image_fetcher()
+    if not high_quality:
+        working_url = working_copy_url(image_url)
+        if working_url != image_url:
+            try:
+                return fetcher.fetch(working_url)
+            except FetchError:
+                # Uploads antigos não têm cópia de trabalho: usa o original
+                pass
+    return fetcher.fetch(image_url)
+
+def decode_image(base_bytes, max_side=None):
+    """
+    Decodifica os bytes da imagem base em RGBA, com o maior lado limitado a
+    `max_side` (padrão PREVIEW_MAX_SIDE; ver `app.utils.decoding`).
+    """
+    return decode(base_bytes, max_side or Config.PREVIEW_MAX_SIDE)
+
+def render_preview(base_image, template, scale, resample=Image.LANCZOS):
+    """
+    Sobrepõe o template no canto inferior direito de uma cópia de `base_image`
+    e retorna a imagem resultante. `base_image` não é alterada.
+    """
+    # Template já decodificado e redimensionado (memorizado por largura)
+    base_width, base_height = base_image.size
+    new_width = int(base_width * scale)
+    with stage('template'):
+        template_image = get_template_registry().resized(template, new_width, resample)
+    new_height = template_image.height
+
+    # Define a posição: canto inferior direito com margem
+    margin = 10
+    position = (base_width - new_width - margin, base_height - new_height - margin)
+
+    # Sobrepõe o template a uma cópia da imagem base
+    with stage('composite'):
+        image = base_image.copy()
+        image.paste(template_image, position, template_image)
+    return image
+
+def result_entry(cache_key, output_format):
+    """
+    Nome, no cache de pré-visualizações, dos bytes de um resultado: a chave
+    com a extensão do formato, igual ao nome do arquivo em /preview/files.
+    Os demais itens do cache (derivados, URLs) não seguem esse padrão e não
+    podem ser servidos como pré-visualização.
+    """
+    return f"{cache_key}.{OUTPUT_FORMATS[output_format]['extension']}"
+
+def result_path(cache_key, output_format):
+    """
+    Caminho (servido por /preview/files) de um resultado guardado no cache.
+    """
+    return f"/preview/files/{result_entry(cache_key, output_format)}"
+
+def result_key(cache_key, output_format):
+    """
+    Chave do objeto no S3 de um resultado enviado com `upload=True`.
+    """
+    return f"processed_{cache_key}.{OUTPUT_FORMATS[output_format]['extension']}"
+
+def store_render(image, cache_key, upload=False, output_format='png', output_quality=None):
+    """
+    Codifica a imagem renderizada, guarda no cache e, com `upload`, envia ao
+    S3 enquanto codifica. Retorna o caminho/URL ou uma mensagem de erro.
+    """
+    cache = get_preview_cache()
+    if not upload:
+        cache.put(result_entry(cache_key, output_format), encode_image(image, output_format, output_quality))
+        return result_path(cache_key, output_format)
 
-def process_image(image_url, template, scale=0.25, upload=False):
+    # Codifica e envia ao S3 em paralelo (nome derivado da chave do cache)
+    try:
+        processed_bytes, url = encode_and_upload(
+            image, result_key(cache_key, output_format), output_format, output_quality
+        )
+    except Exception as e:
+        return f"Erro ao enviar a pré-visualização: {str(e)}"
+    cache.put(result_entry(cache_key, output_format), processed_bytes)
+    cache.put(f"{cache_key}.url", url.encode("utf-8"))
+    return url
+
+def render_variants(base_bytes, variants, upload=False, output_format='png', output_quality=None,
+                    cached_only=False):
+    """
+    Renderiza várias combinações (template, escala) sobre a mesma imagem base.
+
+    A imagem base é decodificada no máximo uma vez (somente se alguma variante
+    não estiver no cache) e as variantes são compostas em paralelo. Nada é
+    gravado em disco: o resultado é codificado em memória e, com `upload`,
+    enviado ao S3 enquanto é codificado.
+
+    Retorna uma lista, na mesma ordem de `variants`, com o caminho/URL de cada
+    pré-visualização ou uma mensagem iniciada por "Erro". Com `cached_only`,
+    nada é renderizado e as variantes fora do cache ficam como None.
+    """
+    templates = get_template_registry()
+    cache = get_preview_cache()
+    options = output_options(output_format, output_quality)
+    results = [None] * len(variants)
+    pending = []
+
+    for index, (template, scale) in enumerate(variants):
+        try:
+            # Identidade do template: caminho + data de modificação + tamanho
+            template_id = templates.identity(template)
+        except Exception as e:
+            results[index] = f"Erro ao abrir o template: {str(e)}"
+            continue
+
+        # Consulta o cache pelo conteúdo da imagem base + template + escala + formato
+        cache_key = preview_cache_key(base_bytes, template_id, scale, options)
+        # Com upload, a URL já enviada ou, na falta dela, os bytes: uma única
+        # consulta (e um único acerto ou falha) por variante
+        url_keys = (f"{cache_key}.url",) if upload else ()
+        found, processed_bytes = cache.get_first(url_keys + (result_entry(cache_key, output_format),))
+        if found in url_keys:
+            results[index] = processed_bytes.decode("utf-8")
+            continue
+        if processed_bytes is not None:
+            if upload:
+                try:
+                    url = upload_bytes(processed_bytes, result_key(cache_key, output_format), output_format)
+                except Exception as e:
+                    results[index] = f"Erro ao enviar a pré-visualização: {str(e)}"
+                    continue
+                cache.put(f"{cache_key}.url", url.encode("utf-8"))
+                results[index] = url
+            else:
+                results[index] = result_path(cache_key, output_format)
+            continue
+        pending.append((index, template, scale, cache_key))
+
+    if not pending or cached_only:
+        return results
+
+    try:
+        source = open_image(base_bytes)
+    except Exception as e:
+        for index, _, _, _ in pending:
+            results[index] = f"Erro ao baixar ou abrir a imagem base: {str(e)}"
+        return results
+
+    def render(template, scale, cache_key):
+        try:
+            image = render_preview(base_image, template, scale)
+        except Exception as e:
+            return f"Erro ao abrir o template: {str(e)}"
+        return store_render(image, cache_key, upload, output_format, output_quality)
+
+    # Memória reservada: a base decodificada e, por variante em paralelo, a
+    # cópia composta e o buffer de codificação (RenderOverloaded se não couber
+    # agora, RenderTooLarge se não couber nem sozinho)
+    parallel = min(len(pending), Config.PREVIEW_RENDER_THREADS)
+    cost = decode_cost(source, Config.PREVIEW_MAX_SIDE, copies=1 + 2 * parallel)
+    with get_render_budget().reserve(cost):
+        try:
+            base_image = load_image(source, Config.PREVIEW_MAX_SIDE)
+        except Exception as e:
+            for index, _, _, _ in pending:
+                results[index] = f"Erro ao baixar ou abrir a imagem base: {str(e)}"
+            return results
+
+        if len(pending) == 1:
+            index, template, scale, cache_key = pending[0]
+            results[index] = render(template, scale, cache_key)
+            return results
+
+        # Cada variante roda com uma cópia do contexto, para que os tempos das
+        # etapas entrem no Server-Timing da requisição
+        executor = get_render_executor()
+        futures = [
+            (index, executor.submit(contextvars.copy_context().run, render, template, scale, cache_key))
+            for index, template, scale, cache_key in pending
+        ]
+        for index, future in futures:
+            results[index] = future.result()
+    return results
+
+def process_image(image_url, template, scale=0.25, upload=False, high_quality=False,
+                  output_format='png', output_quality=None):
     """
     Processa a imagem base obtida de `image_url` e sobrepõe o template (logo)
     fornecido como caminho local para o arquivo de imagem.
@@ -40,47 +231,246 @@ def process_image(image_url, template, scale=0.25, upload=False):
       - template (str): Caminho local para o arquivo de template (logo).
       - scale (float, opcional): Fator de escala para o template em relação à largura da imagem base (default=0.25).
       - upload (bool, opcional): Se True, faz upload da imagem processada para o S3 e retorna a URL pública.
+      - high_quality (bool, opcional): Se True, renderiza a partir do original em resolução total
+        em vez da cópia de trabalho gerada no upload.
+      - output_format (str, opcional): 'png' (default), 'webp' ou 'jpeg'.
+      - output_quality (int, opcional): Qualidade de WebP/JPEG (1-100).
     
     Retorna:
-      - str: Caminho local da imagem processada ou a URL pública (caso upload seja True).
+      - str: Caminho (servido por /preview/files) da imagem processada ou a URL pública (caso upload seja True).
     """
     try:
         # Baixar a imagem base
-        response = requests.get(image_url)
-        response.raise_for_status()
-        base_image = Image.open(io.BytesIO(response.content)).convert("RGBA")
+        base_bytes = download_image(image_url, high_quality=high_quality)
     except Exception as e:
         return f"Erro ao baixar ou abrir a imagem base: {str(e)}"
 
+    return render_variants(
+        base_bytes, [(template, scale)], upload=upload,
+        output_format=output_format, output_quality=output_quality
+    )[0]
+
+async def download_image_async(image_url, high_quality=False):
+    """
+    Versão não bloqueante de `download_image` (mesma escolha da cópia de trabalho).
+    """
+    fetcher = get_image_fetcher()
+    if not high_quality:
+        working_url = working_copy_url(image_url)
+        if working_url != image_url:
+            try:
+                return await fetcher.fetch_async(working_url)
+            except FetchError:
+                pass
+    return await fetcher.fetch_async(image_url)
+
+async def process_image_async(image_url, template, scale=0.25, upload=False, high_quality=False,
+                              output_format='png', output_quality=None):
+    """
+    Versão não bloqueante de `process_image`, para o modo assíncrono: o
+    download e o envio ao S3 são aguardados no loop de I/O e a composição e a
+    codificação rodam no pool de renderização. Mesmos parâmetros e retorno.
+    """
+    from app.utils.aio import offload
+    from app.utils.s3 import put_object_async
+
     try:
-        # Abrir a imagem do template (logo)
-        template_image = Image.open(template).convert("RGBA")
+        base_bytes = await download_image_async(image_url, high_quality=high_quality)
     except Exception as e:
-        return f"Erro ao abrir o template: {str(e)}"
+        return f"Erro ao baixar ou abrir a imagem base: {str(e)}"
 
-    # Redimensionar o template proporcionalmente
-    base_width, base_height = base_image.size
-    new_width = int(base_width * scale)
-    template_aspect_ratio = template_image.width / template_image.height
-    new_height = int(new_width / template_aspect_ratio)
-    # Usa Image.LANCZOS em vez de Resampling.LANCZOS
-    template_image = template_image.resize((new_width, new_height), Image.LANCZOS)
+    executor = get_render_executor()
+    result = (await offload(
+        render_variants, base_bytes, [(template, scale)],
+        output_format=output_format, output_quality=output_quality, executor=executor
+    ))[0]
+    if not upload or result.startswith("Erro"):
+        return result
 
-    # Define a posição: canto inferior direito com margem
-    margin = 10
-    position = (base_width - new_width - margin, base_height - new_height - margin)
+    # O resultado já está no cache: envia os bytes codificados ao S3 sem bloquear
+    cache = get_preview_cache()
+    template_id = get_template_registry().identity(template)
+    cache_key = preview_cache_key(base_bytes, template_id, scale, output_options(output_format, output_quality))
+    # Complemento da consulta já contada em render_variants
+    url_key = f"{cache_key}.url"
+    found, processed_bytes = await offload(
+        cache.get_first, (url_key, result_entry(cache_key, output_format)), count=False
+    )
+    if found == url_key:
+        return processed_bytes.decode("utf-8")
+    if processed_bytes is None:
+        # Removido do cache entre a renderização e o envio: usa o caminho síncrono
+        return (await offload(
+            render_variants, base_bytes, [(template, scale)], upload=True,
+            output_format=output_format, output_quality=output_quality, executor=executor
+        ))[0]
+    try:
+        url = await put_object_async(
+            result_key(cache_key, output_format), processed_bytes, OUTPUT_FORMATS[output_format]['content_type']
+        )
+    except Exception as e:
+        return f"Erro ao enviar a pré-visualização: {str(e)}"
+    await offload(cache.put, f"{cache_key}.url", url.encode("utf-8"))
+    return url
 
-    # Sobrepõe o template à imagem base
-    base_image.paste(template_image, position, template_image)
+def process_image_batch(image_url, variants, upload=False, high_quality=False,
+                        output_format='png', output_quality=None):
+    """
+    Versão em lote de `process_image`: baixa e decodifica a imagem base uma
+    única vez e renderiza todas as combinações (template, escala) informadas.
 
-    # Gera um nome único para o arquivo processado
-    processed_filename = f"processed_{uuid.uuid4()}.png"
-    base_image.save(processed_filename)
+    Retorna uma lista com o caminho/URL (ou a mensagem de erro) de cada variante.
+    """
+    try:
+        base_bytes = download_image(image_url, high_quality=high_quality)
+    except Exception as e:
+        return [f"Erro ao baixar ou abrir a imagem base: {str(e)}"] * len(variants)
+
+    return render_variants(
+        base_bytes, variants, upload=upload,
+        output_format=output_format, output_quality=output_quality
+    )
+
+
+def render_draft(base_bytes, template, scale):
+    """
+    Fase 1 do modo progressivo: renderiza uma pré-visualização em baixa
+    resolução (decodificação reduzida + filtros rápidos) e retorna o caminho
+    servido por /preview/files.
+    """
+    max_side = Config.PREVIEW_DRAFT_MAX_SIDE
+    template_id = get_template_registry().identity(template)
+    cache = get_preview_cache()
+    cache_key = preview_cache_key(base_bytes, template_id, scale, f"draft:{max_side}")
+    if cache.get(result_entry(cache_key, 'jpeg')) is None:
+        # Pequeno para JPEGs (decodificação reduzida), mas outros formatos são decodificados inteiros
+        source = open_image(base_bytes)
+        with get_render_budget().reserve(decode_cost(source, max_side, copies=3)):
+            image = render_preview(
+                load_image(source, max_side, resample=Image.BILINEAR), template, scale, resample=Image.BILINEAR
+            )
+            cache.put(result_entry(cache_key, 'jpeg'), encode_image(image, 'jpeg', Config.PREVIEW_DRAFT_QUALITY))
+    return result_path(cache_key, 'jpeg')
+
+def process_image_progressive(image_url, template, scale=0.25, upload=False, high_quality=False,
+                              output_format='png', output_quality=None):
+    """
+    Modo progressivo de `process_image`.
+
+    Se a versão final já estiver no cache, retorna (resultado final, True).
+    Caso contrário, renderiza apenas o rascunho e retorna (rascunho, False);
+    a versão final deve ser gerada em segundo plano com `process_image`.
+    """
+    try:
+        base_bytes = download_image(image_url, high_quality=high_quality)
+    except Exception as e:
+        return f"Erro ao baixar ou abrir a imagem base: {str(e)}", True
+
+    cached = render_variants(
+        base_bytes, [(template, scale)], upload=upload,
+        output_format=output_format, output_quality=output_quality, cached_only=True
+    )[0]
+    if cached is not None:
+        return cached, True
+
+    try:
+        return render_draft(base_bytes, template, scale), False
+    except RenderOverloaded:
+        raise
+    except Exception as e:
+        return f"Erro ao gerar o rascunho: {str(e)}", True
+
+async def process_image_progressive_async(image_url, template, scale=0.25, upload=False, high_quality=False,
+                                          output_format='png', output_quality=None):
+    """
+    Versão não bloqueante de `process_image_progressive`: o download é
+    aguardado no loop de I/O e a consulta ao cache e o rascunho rodam fora
+    dele. Mesmos parâmetros e retorno.
+    """
+    from app.utils.aio import offload
 
+    try:
+        base_bytes = await download_image_async(image_url, high_quality=high_quality)
+    except Exception as e:
+        return f"Erro ao baixar ou abrir a imagem base: {str(e)}", True
+
+    cached = (await offload(
+        render_variants, base_bytes, [(template, scale)], upload=upload,
+        output_format=output_format, output_quality=output_quality, cached_only=True
+    ))[0]
+    if cached is not None:
+        return cached, True
+
+    try:
+        return await offload(render_draft, base_bytes, template, scale, executor=get_render_executor()), False
+    except RenderOverloaded:
+        raise
+    except Exception as e:
+        return f"Erro ao gerar o rascunho: {str(e)}", True
+
+
+def process_layers(image_url, layers, canvas_size=None, upload=False, high_quality=False,
+                   output_format='png', output_quality=None):
+    """
+    Renderiza uma pilha declarativa de camadas (ver `composite_layers`) em que
+    a imagem de `image_url` é referenciada como `"source": "base"`.
+
+    Retorna o caminho/URL da pré-visualização ou uma mensagem iniciada por
+    "Erro". Uma pilha inválida levanta CompositingError.
+    """
+    try:
+        base_bytes = download_image(image_url, high_quality=high_quality)
+    except Exception as e:
+        return f"Erro ao baixar ou abrir a imagem base: {str(e)}"
+
+    templates = get_template_registry()
+    try:
+        # A identidade de cada template/máscara entra na chave (invalidação por mtime)
+        paths = sorted({
+            path for layer in layers for path in (layer.get('source'), layer.get('mask'))
+            if isinstance(path, str) and path != 'base'
+        })
+        template_id = ",".join(templates.identity(path) for path in paths)
+    except Exception as e:
+        return f"Erro ao abrir o template: {str(e)}"
+
+    cache = get_preview_cache()
+    options = output_options(output_format, output_quality)
+    stack = json.dumps({'layers': layers, 'canvas': canvas_size}, sort_keys=True)
+    cache_key = preview_cache_key(base_bytes, template_id, stack, options)
     if upload:
-        # Envia a imagem processada para o S3 e remove o arquivo local
-        public_url = upload_to_s3(processed_filename)
-        os.remove(processed_filename)
-        return public_url
-    else:
-        return processed_filename
\ No newline at end of file
+        cached_url = cache.get(f"{cache_key}.url")
+        if cached_url is not None:
+            return cached_url.decode("utf-8")
+    elif cache.get(result_entry(cache_key, output_format)) is not None:
+        return result_path(cache_key, output_format)
+
+    try:
+        source = open_image(base_bytes)
+    except Exception as e:
+        return f"Erro ao baixar ou abrir a imagem base: {str(e)}"
+    try:
+        sizes = {path: templates.get(path).size for path in paths}
+    except Exception as e:
+        return f"Erro ao abrir o template: {str(e)}"
+    sizes['base'] = fit_size(source.size, Config.PREVIEW_MAX_SIDE)
+
+    # O motor de composição (NumPy) é importado sob demanda, só quando usado
+    from app.utils.compositing import CompositingError, composite_cost, composite_layers
+
+    # Memória reservada: a base decodificada, as camadas e a tela (float32)
+    cost = decode_cost(source, Config.PREVIEW_MAX_SIDE) + composite_cost(layers, sizes, canvas_size)
+    with get_render_budget().reserve(cost):
+        try:
+            base_image = load_image(source, Config.PREVIEW_MAX_SIDE)
+        except Exception as e:
+            return f"Erro ao baixar ou abrir a imagem base: {str(e)}"
+        try:
+            with stage('composite'):
+                image = composite_layers(layers, sources={'base': base_image}, canvas_size=canvas_size)
+        except CompositingError:
+            # Pilha inválida (ex.: camada grande demais): erro do cliente
+            raise
+        except Exception as e:
+            return f"Erro ao compor as camadas: {str(e)}"
+        return store_render(image, cache_key, upload, output_format, output_quality)
@@ -0,0 +1,155 @@
+# app/utils/jobs.py
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.config import Config
+from app.utils.metrics import register_collector
+from app.utils.preview_cache import get_preview_cache
+
+
+class QueueFullError(Exception):
+    """
+    A fila de jobs atingiu a profundidade máxima configurada.
+    """
+
+
+def _run_in_worker(fn, args, kwargs):
+    # Executado no processo do pool. Sem o nível em disco o processo pai não
+    # enxerga o cache do worker: as entradas usadas pelo job (ex.: a
+    # pré-visualização servida por /preview/files) voltam junto com o resultado
+    cache = get_preview_cache()
+    if cache.disk_dir:
+        return fn(*args, **kwargs), {}
+    with cache.recording() as entries:
+        result = fn(*args, **kwargs)
+    return result, entries
+
+
+class JobQueue:
+    """
+    Fila local de jobs executados em um pool limitado de workers.
+
+    Backends disponíveis:
+      - "process": pool de processos (renderização em paralelo em vários núcleos);
+      - "thread": pool de threads no próprio processo (sem dependências externas).
+
+    A função executada deve retornar uma string; strings iniciadas por "Erro"
+    são tratadas como falha, seguindo a convenção de `process_image`. No
+    backend de processos, as entradas do cache de pré-visualizações usadas
+    pelo job são copiadas para o cache deste processo antes de o job constar
+    como concluído (se o cache não tiver o nível em disco, compartilhado).
+    """
+
+    def __init__(self, backend="process", workers=2, max_pending=32, result_ttl=600, start_method="spawn"):
+        if backend == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+            )
+        elif backend == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview-job")
+        else:
+            raise ValueError(f"Backend de jobs desconhecido: {backend}")
+        self.backend = backend
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job['future'].done())
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Enfileira `fn(*args, **kwargs)` e retorna o id do job.
+        Levanta QueueFullError se a fila estiver cheia.
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job['future'].done())
+            if pending >= self.max_pending:
+                raise QueueFullError("Fila de pré-visualizações cheia. Tente novamente em instantes.")
+            job_id = uuid.uuid4().hex
+            if self.backend == "process":
+                future = self._executor.submit(_run_in_worker, fn, args, kwargs)
+            else:
+                future = self._executor.submit(fn, *args, **kwargs)
+            self._jobs[job_id] = {'future': future, 'created_at': time.time(), 'finished_at': None}
+        future.add_done_callback(lambda _: self._mark_finished(job_id, future))
+        return job_id
+
+    def _mark_finished(self, job_id, future):
+        error = None
+        try:
+            result = future.result()
+        except Exception as e:
+            result, error = None, e
+        else:
+            if self.backend == "process":
+                result, entries = result
+                cache = get_preview_cache()
+                for key, value in entries.items():
+                    cache.put(key, value)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(result=result, error=error, finished_at=time.time())
+
+    def _prune(self):
+        # Remove resultados de jobs finalizados há mais de `result_ttl` segundos
+        limit = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] is not None and job['finished_at'] < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def status(self, job_id):
+        """
+        Retorna o estado do job (`queued`, `running`, `done` ou `error`) ou
+        None se o job não existir (ou já tiver expirado).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job['future']
+        if job['finished_at'] is None:
+            # Concluído só depois de o resultado (e o cache) chegar a este processo
+            return {'status': 'running' if future.done() or future.running() else 'queued'}
+        if job['error'] is not None:
+            return {'status': 'error', 'error': f"Erro ao processar o job: {str(job['error'])}"}
+        result = job['result']
+        if isinstance(result, str) and result.startswith("Erro"):
+            return {'status': 'error', 'error': result}
+        return {'status': 'done', 'result': result}
+
+
+_preview_queue = None
+_preview_queue_lock = threading.Lock()
+
+
+def get_preview_queue():
+    """
+    Retorna a fila de jobs de pré-visualização do processo, criada na primeira chamada.
+    """
+    global _preview_queue
+    if _preview_queue is None:
+        with _preview_queue_lock:
+            if _preview_queue is None:
+                _preview_queue = JobQueue(
+                    backend=Config.PREVIEW_JOB_BACKEND,
+                    workers=Config.PREVIEW_JOB_WORKERS,
+                    max_pending=Config.PREVIEW_JOB_MAX_PENDING,
+                    result_ttl=Config.PREVIEW_JOB_RESULT_TTL,
+                    start_method=Config.PREVIEW_JOB_START_METHOD,
+                )
+                queue = _preview_queue
+                register_collector('preview_jobs', lambda: {'pending': queue.pending(), 'max_pending': queue.max_pending})
+    return _preview_queue
@@ -0,0 +1,328 @@
+# app/utils/metrics.py
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas por etapa do processamento (download, decodificação, codificação, ...)
+STAGE_METRIC = 'stage_duration_seconds'
+STAGE_HELP = 'Duração das etapas internas das requisições (ex.: fetch, decode, encode, upload, stripe, db).'
+
+# Tempos das etapas da requisição atual: uma lista compartilhada (por
+# referência) com as tarefas e threads que herdam o contexto
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+class LatencyHistogram:
+    """
+    Histograma cumulativo de latências (em segundos) com limites fixos.
+    """
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, total = {}, 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                total += count
+                cumulative['+Inf' if bound == float('inf') else str(bound)] = total
+            return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Métricas do processo no formato de exposição do Prometheus.
+
+    - histogramas de latência com rótulos (`histogram(...).observe(s)`);
+    - contadores e gauges atualizados no caminho da requisição (`inc`, `add`);
+    - coletores: funções `stats()` dos componentes (caches, pools, filas),
+      lidas apenas quando /metrics é consultado, sem custo no caminho quente.
+
+    Os nomes recebem o prefixo `prefix`. As séries ficam em dicionários
+    indexados pelos rótulos; atualizar uma série existente custa uma consulta
+    ao dicionário e um lock curto.
+    """
+
+    def __init__(self, prefix='ixtampa'):
+        self.prefix = prefix
+        self._histograms = {}
+        self._values = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, **labels):
+        """
+        Retorna (criando se preciso) o histograma da série `name{labels}`.
+        """
+        key = _labels_key(labels)
+        family = self._histograms.get(name)
+        series = family['series'].get(key) if family is not None else None
+        if series is None:
+            with self._lock:
+                family = self._histograms.setdefault(name, {'help': help_text, 'series': {}})
+                series = family['series'].setdefault(key, LatencyHistogram())
+        return series
+
+    def _update(self, kind, name, help_text, amount, labels):
+        key = _labels_key(labels)
+        with self._lock:
+            family = self._values.setdefault(name, {'type': kind, 'help': help_text, 'series': {}})
+            family['series'][key] = family['series'].get(key, 0) + amount
+
+    def inc(self, name, help_text, amount=1, **labels):
+        """
+        Incrementa o contador `name` (o sufixo _total é adicionado na exposição).
+        """
+        self._update('counter', name, help_text, amount, labels)
+
+    def add(self, name, help_text, amount, **labels):
+        """
+        Soma `amount` (positivo ou negativo) ao gauge `name`.
+        """
+        self._update('gauge', name, help_text, amount, labels)
+
+    def register_collector(self, name, collect, counters=(), label=None):
+        """
+        Registra `collect()`, que retorna um dicionário {chave: número}.
+        Cada chave vira a métrica `<prefixo>_<name>_<chave>`; as chaves em
+        `counters` são expostas como contadores. Valores que são dicionários
+        geram uma série por item, com o rótulo `label`.
+        """
+        with self._lock:
+            self._collectors[name] = (collect, frozenset(counters), label)
+
+    def render(self):
+        """
+        Retorna todas as métricas no formato de texto do Prometheus (0.0.4).
+        """
+        lines = []
+        with self._lock:
+            histograms = {name: (family['help'], dict(family['series'])) for name, family in self._histograms.items()}
+            values = {name: (family['type'], family['help'], dict(family['series']))
+                      for name, family in self._values.items()}
+            collectors = dict(self._collectors)
+
+        for name, (help_text, series) in sorted(histograms.items()):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for labels, histogram in sorted(series.items()):
+                snapshot = histogram.snapshot()
+                for bound, count in snapshot['buckets'].items():
+                    lines.append(f'{metric}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {_format_value(snapshot["sum"])}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {snapshot["count"]}')
+
+        for name, (kind, help_text, series) in sorted(values.items()):
+            metric = f'{self.prefix}_{name}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{metric}{_format_labels(labels)} {_format_value(value)}')
+
+        for name, (collect, counters, label) in sorted(collectors.items()):
+            try:
+                stats = collect()
+            except Exception:
+                # Um componente com problema não derruba a exposição das demais métricas
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, dict) and label:
+                    samples = [((label, item),) for item in value]
+                    numbers = list(value.values())
+                else:
+                    samples, numbers = [()], [value]
+                if not all(isinstance(v, (int, float)) for v in numbers):
+                    continue
+                kind = 'counter' if key in counters else 'gauge'
+                metric = f'{self.prefix}_{name}_{key}' + ('_total' if kind == 'counter' else '')
+                lines.append(f'# TYPE {metric} {kind}')
+                for labels, v in zip(samples, numbers):
+                    lines.append(f'{metric}{_format_labels(labels)} {_format_value(v)}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Retorna o registro de métricas do processo, criado na primeira chamada.
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
+
+
+def register_collector(name, collect, counters=(), label=None):
+    """
+    Atalho para `get_metrics().register_collector(...)`, usado pelos
+    componentes (caches, pools, filas) logo após serem criados.
+    """
+    get_metrics().register_collector(name, collect, counters=counters, label=label)
+
+
+def record_stage(name, seconds):
+    """
+    Registra a duração de uma etapa no histograma por etapa e, dentro de
+    uma requisição, na lista usada para o cabeçalho Server-Timing.
+    """
+    get_metrics().histogram(STAGE_METRIC, STAGE_HELP, stage=name).observe(seconds)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """
+    Mede o bloco como a etapa `name` (funciona também em torno de `await`).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def start_request_timings():
+    """
+    Inicia a coleta dos tempos por etapa da requisição atual.
+    """
+    timings = []
+    _stage_timings.set(timings)
+    return timings
+
+
+def server_timing(timings, total=None):
+    """
+    Monta o valor do cabeçalho Server-Timing: a soma por etapa (na ordem em
+    que apareceram) e, se informado, o tempo total da requisição.
+    """
+    sums = {}
+    for name, seconds in list(timings):
+        sums[name] = sums.get(name, 0.0) + seconds
+    entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sums.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_metrics(app):
+    """
+    Instrumenta o app: histograma de latência e gauge de requisições em
+    andamento por endpoint, cabeçalho Server-Timing (SERVER_TIMING), tempo
+    das consultas ao banco como a etapa 'db' e coletores do pool de conexões.
+    """
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app.extensions import db
+
+    metrics = get_metrics()
+
+    def endpoint_label():
+        # Regra da rota (não a URL) para manter a cardinalidade limitada
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = endpoint_label()
+        g._stage_timings = start_request_timings()
+        metrics.add('http_requests_in_flight', 'Requisições em andamento por endpoint.', 1,
+                    endpoint=g._metrics_endpoint)
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        start = g.get('_metrics_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        metrics.histogram(
+            'http_request_duration_seconds', 'Latência das requisições HTTP por endpoint.',
+            endpoint=g._metrics_endpoint, method=request.method, status=str(response.status_code),
+        ).observe(elapsed)
+        if app.config.get('SERVER_TIMING'):
+            response.headers['Server-Timing'] = server_timing(g._stage_timings, total=elapsed)
+        return response
+
+    @app.teardown_request
+    def _end_request_metrics(exc):
+        if g.get('_metrics_start') is not None:
+            metrics.add('http_requests_in_flight', 'Requisições em andamento por endpoint.', -1,
+                        endpoint=g._metrics_endpoint)
+            g._metrics_start = None
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def database_pool():
+        # Lido dentro do contexto do app (a rota /metrics)
+        stats = {'size': {}, 'checked_out': {}, 'overflow': {}}
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, 'checkedout'):
+                continue
+            name = bind or 'default'
+            stats['size'][name] = pool.size()
+            stats['checked_out'][name] = pool.checkedout()
+            stats['overflow'][name] = max(pool.overflow(), 0)
+        return stats
+
+    register_collector('db_pool', database_pool, label='bind')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_query_start')
+    if starts:
+        record_stage('db', time.perf_counter() - starts.pop())
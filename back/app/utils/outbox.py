@@ -0,0 +1,266 @@
+# app/utils/outbox.py
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+
+from app.config import Config
+from app.extensions import db
+from app.models import StripeOutbox, User
+from app.utils.stripe_gateway import get_stripe_gateway
+
+
+def _create_customer(job):
+    outbox_id, idempotency_key, user_id, email, name = job
+    try:
+        customer = get_stripe_gateway().create_customer(
+            email=email,
+            name=name,
+            metadata={'user_id': str(user_id)},
+            idempotency_key=idempotency_key,
+        )
+        return outbox_id, customer['id'], None
+    except Exception as e:
+        return outbox_id, None, str(e)
+
+
+class OutboxWorker:
+    """
+    Drena a tabela StripeOutbox em segundo plano.
+
+    A cada ciclo, até `batch_size` registros vencidos são reivindicados
+    (status 'processing', com um prazo de `claim_timeout` segundos), os
+    clientes são criados no Stripe em paralelo (fora de qualquer transação) e
+    os resultados são gravados em uma única transação, preenchendo
+    User.stripe_customer_id.
+
+    A reivindicação é um UPDATE condicional ao estado lido (compare-and-swap),
+    então vários processos drenando a mesma tabela nunca processam o mesmo
+    registro ao mesmo tempo. Um registro reivindicado por um processo que caiu
+    volta a ser elegível quando o prazo vence; a chave de idempotência do
+    registro faz com que essa nova tentativa devolva o mesmo cliente.
+
+    Falhas são repetidas com backoff exponencial e jitter; após
+    `max_attempts` tentativas o registro fica como 'failed' até que
+    `ensure_customer` o recoloque na fila.
+    """
+
+    def __init__(self, app, batch_size=20, concurrency=4, poll_interval=2.0,
+                 max_attempts=8, backoff_base=2.0, backoff_max=300.0, claim_timeout=300.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_timeout = claim_timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stripe-outbox")
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._drain_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Inicia a drenagem em uma thread em segundo plano.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="stripe-outbox-drain", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """
+        Acorda o worker imediatamente (ex.: logo após um novo registro).
+        """
+        self._wake.set()
+
+    def run(self):
+        """
+        Drena a outbox até `stop()` (bloqueia a thread atual).
+        """
+        processed = 0
+        while not self._stopped.is_set():
+            # Lote cheio: provavelmente há mais registros, continua sem esperar
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+            try:
+                processed = self.drain_once()
+            except Exception as e:
+                self.app.logger.warning("Falha ao drenar a outbox do Stripe: %s", e)
+                processed = 0
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def _claim(self, rows, now):
+        # Reivindica cada registro só se ele ainda estiver no estado lido;
+        # outro processo que leu o mesmo registro não consegue reivindicá-lo
+        claimed = []
+        for row in rows:
+            result = db.session.execute(
+                update(StripeOutbox)
+                .where(
+                    StripeOutbox.id == row.id,
+                    StripeOutbox.status == row.status,
+                    StripeOutbox.next_attempt_at == row.next_attempt_at,
+                )
+                .values(status='processing', next_attempt_at=now + timedelta(seconds=self.claim_timeout))
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed.append(row.id)
+        db.session.commit()
+        return claimed
+
+    def _process(self, query):
+        # Lê e reivindica o lote e encerra a transação antes de chamar o Stripe.
+        # Só essa etapa é serializada no processo: as chamadas ao Stripe (e a
+        # gravação dos resultados) de registros já reivindicados ficam fora do lock
+        with self._drain_lock:
+            rows = query.order_by(StripeOutbox.id).limit(self.batch_size).all()
+            if not rows:
+                db.session.rollback()
+                return 0
+            claimed = self._claim(rows, datetime.utcnow())
+            rows = [db.session.get(StripeOutbox, outbox_id) for outbox_id in claimed]
+            jobs = []
+            for row in rows:
+                user = db.session.get(User, row.user_id)
+                if user is not None:
+                    jobs.append((row.id, row.idempotency_key, user.id, user.email, user.username))
+            db.session.rollback()
+        if not rows:
+            return 0
+
+        results = list(self._executor.map(_create_customer, jobs))
+        now = datetime.utcnow()
+        handled = {outbox_id for outbox_id, _, _ in results}
+        for row in rows:
+            if row.id not in handled:
+                # Usuário removido: não há o que criar
+                row.status, row.processed_at = 'done', now
+        for outbox_id, customer_id, error in results:
+            row = db.session.get(StripeOutbox, outbox_id)
+            row.attempts += 1
+            if customer_id is not None:
+                user = db.session.get(User, row.user_id)
+                if user is not None and not user.stripe_customer_id:
+                    user.stripe_customer_id = customer_id
+                row.status, row.processed_at, row.last_error = 'done', now, None
+            else:
+                row.last_error = error
+                if row.attempts >= self.max_attempts:
+                    row.status = 'failed'
+                    self.app.logger.warning(
+                        "Cliente Stripe do usuário %s não foi criado após %s tentativas: %s",
+                        row.user_id, row.attempts, error,
+                    )
+                else:
+                    row.status = 'pending'
+                    row.next_attempt_at = now + self._backoff(row.attempts)
+        db.session.commit()
+        return len(rows)
+
+    def drain_once(self):
+        """
+        Processa um lote de registros pendentes e vencidos (ou reivindicados
+        por um processo cujo prazo venceu). Retorna quantos registros foram
+        reivindicados.
+        """
+        with self.app.app_context():
+            query = StripeOutbox.query.filter(
+                StripeOutbox.status.in_(('pending', 'processing')),
+                StripeOutbox.next_attempt_at <= datetime.utcnow(),
+            )
+            return self._process(query)
+
+    def ensure_customer(self, user_id):
+        """
+        Processa imediatamente o registro de um usuário ainda sem cliente
+        (ignorando o backoff) e retorna o stripe_customer_id, ou None se ainda
+        não existir. Usa a mesma chave de idempotência do worker.
+
+        Um registro 'failed' volta para a fila com as tentativas zeradas, e um
+        usuário sem registro (criado antes da outbox) ganha um: assim o
+        cliente sempre acaba sendo criado. Um registro reivindicado por outro
+        processo (ou pelo worker deste processo), dentro do prazo, não é
+        tocado. O registro é reivindicado com o mesmo UPDATE condicional do
+        worker, sem manter lock algum durante a chamada ao Stripe.
+        """
+        with self.app.app_context():
+            user = db.session.get(User, user_id)
+            if user is None or user.stripe_customer_id:
+                customer_id = user.stripe_customer_id if user is not None else None
+                db.session.rollback()
+                return customer_id
+
+            rows = StripeOutbox.query.filter(
+                StripeOutbox.user_id == user_id, StripeOutbox.operation == 'create_customer'
+            ).all()
+            if not rows:
+                db.session.add(StripeOutbox(user_id=user_id, operation='create_customer'))
+            for row in rows:
+                if row.status == 'failed':
+                    row.status, row.attempts, row.next_attempt_at = 'pending', 0, datetime.utcnow()
+            db.session.commit()
+
+            now = datetime.utcnow()
+            query = StripeOutbox.query.filter(
+                StripeOutbox.user_id == user_id,
+                or_(
+                    StripeOutbox.status == 'pending',
+                    and_(StripeOutbox.status == 'processing', StripeOutbox.next_attempt_at <= now),
+                ),
+            )
+            self._process(query)
+            user = db.session.get(User, user_id)
+            customer_id = user.stripe_customer_id if user is not None else None
+            db.session.rollback()
+            return customer_id
+
+
+_outbox_worker = None
+_outbox_worker_lock = threading.Lock()
+
+
+def init_outbox_worker(app, start=None):
+    """
+    Cria o worker da outbox do processo (uma única vez). A thread de drenagem
+    só é iniciada com `start` (padrão: STRIPE_OUTBOX_WORKER, desabilitado):
+    normalmente um único processo drena a outbox (ou `flask --app manage
+    outbox-worker`) e os demais usam apenas `ensure_customer`.
+    """
+    global _outbox_worker
+    if _outbox_worker is None:
+        with _outbox_worker_lock:
+            if _outbox_worker is None:
+                worker = OutboxWorker(
+                    app,
+                    batch_size=Config.STRIPE_OUTBOX_BATCH_SIZE,
+                    concurrency=Config.STRIPE_OUTBOX_CONCURRENCY,
+                    poll_interval=Config.STRIPE_OUTBOX_POLL_INTERVAL,
+                    max_attempts=Config.STRIPE_OUTBOX_MAX_ATTEMPTS,
+                    backoff_base=Config.STRIPE_OUTBOX_BACKOFF,
+                    claim_timeout=Config.STRIPE_OUTBOX_CLAIM_TIMEOUT,
+                )
+                if Config.STRIPE_OUTBOX_WORKER if start is None else start:
+                    worker.start()
+                _outbox_worker = worker
+    return _outbox_worker
+
+
+def get_outbox_worker():
+    """
+    Retorna o worker da outbox, ou None se o app ainda não foi criado.
+    """
+    return _outbox_worker
@@ -0,0 +1,92 @@
+# app/utils/passwords.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.config import Config
+from app.utils.metrics import stage
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Há cálculos de hash demais aguardando na fila; a requisição deve ser repetida depois.
+    """
+
+
+class PasswordHasher:
+    """
+    Executa os hashes de senha (operações deliberadamente caras) em um pool
+    limitado de threads. O PBKDF2/scrypt do hashlib libera o GIL, então a
+    thread da requisição apenas espera o resultado enquanto as requisições de
+    I/O continuam sendo atendidas; o limite de workers impede que uma rajada de
+    logins ocupe toda a CPU, e o limite de fila rejeita o excesso.
+    """
+
+    def __init__(self, method, workers=2, max_pending=64):
+        self.method = method
+        # Prefixo que o Werkzeug grava para o método configurado, com o custo
+        # explícito mesmo quando o método o omite (ex.: 'scrypt' -> 'scrypt:32768:8:1')
+        self.prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Muitas requisições de autenticação. Tente novamente em instantes.")
+        try:
+            return self._executor.submit(fn, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """
+        Gera o hash de `password` com o método/custo configurado.
+        """
+        with stage('password'):
+            return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Verifica `password` contra `password_hash`.
+        """
+        with stage('password'):
+            return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        Indica se o hash armazenado usa parâmetros diferentes dos configurados
+        (ex.: menos iterações). O método pode omitir o custo ('scrypt',
+        'pbkdf2:sha256'): vale o padrão do Werkzeug.
+        """
+        return password_hash.split("$", 1)[0] != self.prefix
+
+
+_password_hasher = None
+_password_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """
+    Retorna o hasher de senhas do processo, criado na primeira chamada.
+    """
+    global _password_hasher
+    if _password_hasher is None:
+        with _password_hasher_lock:
+            if _password_hasher is None:
+                _password_hasher = PasswordHasher(
+                    method=Config.PASSWORD_HASH_METHOD,
+                    workers=Config.PASSWORD_HASH_WORKERS,
+                    max_pending=Config.PASSWORD_HASH_MAX_PENDING,
+                )
+    return _password_hasher
+
+
+def reset_password_hasher():
+    """
+    Descarta o hasher atual (por exemplo, após alterar o método ou o custo na
+    configuração). Hashes em andamento no pool antigo terminam normalmente.
+    """
+    global _password_hasher
+    with _password_hasher_lock:
+        _password_hasher = None
@@ -0,0 +1,231 @@
+# app/utils/preview_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.config import Config
+from app.utils.metrics import register_collector
+
+
+def preview_cache_key(base_bytes, template_id, scale, options=""):
+    """
+    Gera a chave de cache de uma pré-visualização a partir do conteúdo da
+    imagem base, da identidade do template, da escala e das opções de saída.
+    """
+    digest = hashlib.sha256(base_bytes)
+    digest.update(f"|{template_id}|{scale!r}|{options}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PreviewCache:
+    """
+    Cache de resultados de pré-visualização em dois níveis:
+
+      - memória: LRU limitado por um orçamento de bytes;
+      - disco: diretório local com remoção dos itens mais antigos quando o
+        tamanho total ultrapassa o limite configurado.
+
+    Os valores são sempre `bytes` (a imagem já codificada). A mesma classe
+    serve de cache genérico de bytes, por exemplo para os originais baixados.
+    """
+
+    def __init__(self, memory_bytes, disk_dir=None, disk_bytes=0):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir if disk_bytes > 0 else None
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._recorded = None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        # Reconstrói o índice do disco (do mais antigo para o mais recente)
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.disk_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def get(self, key):
+        """
+        Retorna os bytes armazenados para `key` ou None.
+        """
+        return self.get_first((key,))[1]
+
+    def get_first(self, keys, count=True):
+        """
+        Retorna (chave, bytes) da primeira de `keys`, na ordem, presente no
+        cache, ou (None, None). A consulta inteira conta como um único acerto
+        ou falha; com `count=False` não é contada (consulta complementar de
+        um resultado já contado).
+        """
+        for key in keys:
+            with self._lock:
+                value = self._memory.get(key)
+                if value is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += count
+                    self._record(key, value)
+                    return key, value
+
+            value = self._read_disk(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += count
+                    self._store_memory(key, value)
+                    self._record(key, value)
+                return key, value
+
+        with self._lock:
+            self.misses += count
+        return None, None
+
+    def put(self, key, value):
+        """
+        Armazena `value` (bytes) nos dois níveis do cache.
+        """
+        with self._lock:
+            self._store_memory(key, value)
+            self._record(key, value)
+        self._write_disk(key, value)
+
+    @contextmanager
+    def recording(self):
+        """
+        Registra as entradas lidas ou gravadas durante o bloco, em um dict
+        chave -> bytes, para que sejam copiadas para o cache de outro processo
+        (ex.: jobs executados em um pool de processos sem o nível em disco).
+        """
+        with self._lock:
+            self._recorded = recorded = {}
+        try:
+            yield recorded
+        finally:
+            with self._lock:
+                self._recorded = None
+
+    def _record(self, key, value):
+        if self._recorded is not None:
+            self._recorded[key] = value
+
+    def _store_memory(self, key, value):
+        size = len(value)
+        if size > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = value
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.evictions += 1
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                value = f.read()
+        except OSError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_size -= size
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return value
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir or len(value) > self.disk_bytes:
+            return
+        path = self._disk_path(key)
+        try:
+            # Escrita atômica: outro processo nunca lê um arquivo incompleto
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        to_remove = []
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_size -= previous
+            self._disk[key] = len(value)
+            self._disk_size += len(value)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                evicted_key, evicted_size = self._disk.popitem(last=False)
+                self._disk_size -= evicted_size
+                self.evictions += 1
+                to_remove.append(evicted_key)
+        for evicted_key in to_remove:
+            try:
+                os.remove(self._disk_path(evicted_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        Retorna os contadores de acertos/falhas e a ocupação de cada nível.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+            }
+
+
+_preview_cache = None
+_preview_cache_lock = threading.Lock()
+
+
+def get_preview_cache():
+    """
+    Retorna o cache de pré-visualizações do processo, criado na primeira chamada.
+    """
+    global _preview_cache
+    if _preview_cache is None:
+        with _preview_cache_lock:
+            if _preview_cache is None:
+                _preview_cache = PreviewCache(
+                    memory_bytes=Config.PREVIEW_CACHE_MEMORY_BYTES,
+                    disk_dir=Config.PREVIEW_CACHE_DIR,
+                    disk_bytes=Config.PREVIEW_CACHE_DISK_BYTES,
+                )
+                register_collector('preview_cache', _preview_cache.stats,
+                                   counters=('hits', 'disk_hits', 'misses', 'evictions'))
+    return _preview_cache
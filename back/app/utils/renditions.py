@@ -0,0 +1,155 @@
+# app/utils/renditions.py
+import bisect
+import hashlib
+import threading
+
+from app.config import Config
+from app.utils.admission import get_render_budget
+from app.utils.decoding import decode_cost, fit_width, load_image, open_image
+from app.utils.encoding import OUTPUT_FORMATS, encode_image, output_options
+from app.utils.image_processing import result_entry, result_key
+from app.utils.metrics import get_metrics
+from app.utils.preview_cache import get_preview_cache
+from app.utils.s3 import get_s3_client, public_url
+
+# Renderizações em andamento por chave: pedidos simultâneos do mesmo derivado
+# esperam o primeiro em vez de renderizar de novo
+_inflight = {}
+_inflight_lock = threading.Lock()
+_INFLIGHT_TIMEOUT = 30
+
+
+def negotiate_format(accept):
+    """
+    Escolhe o formato do derivado a partir do cabeçalho Accept (um
+    `MIMEAccept` do Werkzeug): o primeiro de RENDITION_FORMATS suportado pelo
+    Pillow e listado explicitamente pelo cliente, ou JPEG. Curingas como
+    `image/*` não contam: navegadores sem AVIF também os enviam.
+    """
+    accepted = {value.lower() for value, quality in accept if quality > 0}
+    for fmt in Config.RENDITION_FORMATS:
+        spec = OUTPUT_FORMATS.get(fmt)
+        if spec and spec['content_type'] in accepted:
+            return fmt
+    return 'jpeg'
+
+
+def snap_width(width):
+    """
+    Arredonda `width` para cima até uma das larguras de RENDITION_WIDTHS
+    (acima da maior, usa a maior), para limitar o número de derivados por
+    imagem.
+    """
+    widths = Config.RENDITION_WIDTHS
+    return widths[min(bisect.bisect_left(widths, width), len(widths) - 1)]
+
+
+def rendition_key(source, width, fmt, quality=None):
+    """
+    Chave do derivado (largura, formato e qualidade) da pré-visualização
+    guardada no cache como `source` (ver `result_entry`). Também é o ETag: o
+    derivado é função apenas desses valores.
+    """
+    options = output_options(fmt, quality)
+    return hashlib.sha256(f"{source}|{width or 'full'}|{options}".encode("utf-8")).hexdigest()
+
+
+def is_stored(cache_key):
+    """
+    Verifica se a pré-visualização `cache_key` foi enviada ao bucket (tem a
+    URL registrada no cache). Só nesse caso os derivados podem ser refeitos
+    depois de a pré-visualização sair do cache.
+    """
+    # Consulta complementar à do derivado: não conta como acerto nem falha
+    return get_preview_cache().get_first((f"{cache_key}.url",), count=False)[1] is not None
+
+
+def source_width(cache_key, source_format):
+    """
+    Largura da pré-visualização `cache_key`, lida do cabeçalho da imagem no
+    cache (ou no bucket, se já removida do cache), ou None se ela não existir
+    mais. Define a largura efetiva dos derivados: pedidos a partir dela
+    resultam na imagem na largura original.
+    """
+    source_bytes = _load_source(cache_key, source_format)
+    if source_bytes is None:
+        return None
+    try:
+        return open_image(source_bytes).width
+    except Exception:
+        return None
+
+
+def _load_source(cache_key, source_format):
+    # A pré-visualização no cache ou, se já removida, o objeto no bucket. A
+    # consulta não é contada: só a do derivado conta como acerto ou falha
+    cache = get_preview_cache()
+    source_bytes = cache.get_first((result_entry(cache_key, source_format),), count=False)[1]
+    if source_bytes is not None or not Config.S3_BUCKET:
+        return source_bytes
+    key = result_key(cache_key, source_format)
+    try:
+        source_bytes = get_s3_client().get_object(Bucket=Config.S3_BUCKET, Key=key)['Body'].read()
+    except Exception:
+        return None
+    cache.put(result_entry(cache_key, source_format), source_bytes)
+    cache.put(f"{cache_key}.url", public_url(key).encode("utf-8"))
+    return source_bytes
+
+
+def _render(source_bytes, width, fmt, quality):
+    source = open_image(source_bytes)
+    size = fit_width(source.size, width) if width and width < source.width else source.size
+    has_alpha = 'A' in source.getbands() or 'transparency' in source.info
+    mode = 'RGBA' if has_alpha and fmt != 'jpeg' else 'RGB'
+    with get_render_budget().reserve(decode_cost(source, copies=2, size=size)):
+        with source:
+            image = load_image(source, mode=mode, size=size)
+        return encode_image(image, fmt, quality)
+
+
+def get_rendition(cache_key, source_format, width, fmt, quality=None):
+    """
+    Retorna (chave, bytes) do derivado da pré-visualização `cache_key`
+    (gerada no formato `source_format`) com largura `width` (None: largura
+    original; nunca amplia), no formato `fmt`. Larguras a partir da original
+    devem ser passadas como None (ver `source_width`), para que todas
+    compartilhem o mesmo derivado e a mesma chave.
+
+    Cada derivado é renderizado no máximo uma vez: fica no cache de
+    pré-visualizações (memória e disco, compartilhado entre processos) e
+    pedidos simultâneos do mesmo derivado aguardam a primeira renderização.
+    Se a pré-visualização já saiu do cache, é lida do bucket (quando foi
+    enviada com `upload`); os bytes são None se ela não existir em nenhum dos
+    dois.
+    """
+    cache = get_preview_cache()
+    key = rendition_key(result_entry(cache_key, source_format), width, fmt, quality)
+    data = cache.get(key)
+    if data is not None:
+        return key, data
+
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(_INFLIGHT_TIMEOUT)
+        data = cache.get(key)
+        if data is not None:
+            return key, data
+
+    try:
+        source_bytes = _load_source(cache_key, source_format)
+        if source_bytes is None:
+            return key, None
+        data = _render(source_bytes, width, fmt, quality)
+        cache.put(key, data)
+        get_metrics().inc('renditions_rendered', 'Derivados renderizados por formato.', format=fmt)
+        return key, data
+    finally:
+        if leader:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            event.set()
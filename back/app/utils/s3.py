@@ -0,0 +1,97 @@
+# app/utils/s3.py
+import threading
+
+from app.config import Config
+from app.utils.metrics import stage
+
+_s3_client = None
+_transfer_config = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Retorna o cliente S3 compartilhado do processo, criado na primeira chamada.
+
+    Clientes do boto3 são thread-safe; reaproveitar o mesmo cliente mantém o
+    pool de conexões (e as sessões TLS) entre as requisições.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                # boto3 é importado sob demanda para não pesar na inicialização do app
+                import boto3
+                from botocore.config import Config as BotocoreConfig
+                session = boto3.session.Session()
+                _s3_client = session.client(
+                    's3',
+                    region_name=Config.AWS_REGION,
+                    aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
+                    endpoint_url=Config.S3_ENDPOINT_URL,
+                    config=BotocoreConfig(
+                        max_pool_connections=Config.S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': Config.S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                    ),
+                )
+    return _s3_client
+
+
+def get_transfer_config():
+    """
+    Retorna o TransferConfig compartilhado por todos os uploads.
+    """
+    global _transfer_config
+    if _transfer_config is None:
+        with _s3_lock:
+            if _transfer_config is None:
+                from boto3.s3.transfer import TransferConfig
+                _transfer_config = TransferConfig(
+                    multipart_threshold=Config.S3_MULTIPART_THRESHOLD,
+                    multipart_chunksize=Config.S3_MULTIPART_CHUNKSIZE,
+                    max_concurrency=Config.S3_MAX_CONCURRENCY,
+                )
+    return _transfer_config
+
+
+def public_url(key):
+    """
+    Retorna a URL pública de um objeto do bucket configurado.
+    """
+    if Config.S3_ENDPOINT_URL:
+        return f"{Config.S3_ENDPOINT_URL.rstrip('/')}/{Config.S3_BUCKET}/{key}"
+    return f"https://{Config.S3_BUCKET}.s3.{Config.AWS_REGION}.amazonaws.com/{key}"
+
+
+async def put_object_async(key, body, content_type):
+    """
+    Envia `body` ao bucket sem bloquear o loop de I/O e retorna a URL pública.
+
+    O PUT é feito pelo cliente HTTP assíncrono compartilhado com uma URL
+    pré-assinada (a assinatura é calculada localmente pelo boto3, sem rede).
+    Deve ser aguardado no loop de `get_io_loop()`.
+    """
+    from app.utils.aio import get_io_loop
+    url = get_s3_client().generate_presigned_url(
+        'put_object',
+        Params={'Bucket': Config.S3_BUCKET, 'Key': key, 'ContentType': content_type, 'ACL': 'public-read'},
+        ExpiresIn=300
+    )
+    with stage('upload'):
+        response = await get_io_loop().client.put(
+            url, content=body, headers={'Content-Type': content_type, 'x-amz-acl': 'public-read'}
+        )
+    response.raise_for_status()
+    return public_url(key)
+
+
+def reset_s3_client():
+    """
+    Descarta o cliente e o TransferConfig atuais (por exemplo, após alterar a
+    configuração para apontar para um S3 local).
+    """
+    global _s3_client, _transfer_config
+    with _s3_lock:
+        _s3_client = None
+        _transfer_config = None
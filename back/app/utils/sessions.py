@@ -0,0 +1,315 @@
+# app/utils/sessions.py
+import base64
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from PIL import Image
+
+from app.config import Config
+from app.utils.admission import get_render_budget
+from app.utils.decoding import decode_cost, load_image, open_image
+from app.utils.encoding import OUTPUT_FORMATS, encode_image
+from app.utils.metrics import register_collector, stage
+
+
+class SessionError(Exception):
+    """
+    Falha ao abrir ou atualizar uma sessão de edição (imagem, template ou parâmetros).
+    """
+
+
+class SessionStateError(SessionError):
+    """
+    Posição, escala ou rotação inválida para a imagem da sessão.
+    """
+
+
+def _clip(box, size):
+    left, top, right, bottom = box
+    width, height = size
+    box = (max(left, 0), max(top, 0), min(right, width), min(bottom, height))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _dirty_regions(old, new):
+    # Regiões a recompor: a união das caixas quando se sobrepõem (arrastar),
+    # ou as duas separadas quando a união seria muito maior que elas (saltos)
+    boxes = [box for box in (old, new) if box is not None]
+    if len(boxes) == 2:
+        union = (min(old[0], new[0]), min(old[1], new[1]), max(old[2], new[2]), max(old[3], new[3]))
+        if _area(union) <= _area(old) + _area(new):
+            boxes = [union]
+    return boxes
+
+
+class EditingSession:
+    """
+    Estado de uma sessão de edição: a imagem base e o template já
+    decodificados, a tela atual (base com o logo aplicado) e a posição, a
+    escala e a rotação do logo.
+
+    `x` e `y` são o canto superior esquerdo do logo sem rotação; a rotação
+    (em graus, sentido horário) é feita em torno do centro do logo. Sem
+    rotação e na posição padrão, a tela é igual ao resultado de `/preview`.
+
+    Cada atualização restaura da base apenas a região coberta pelo logo na
+    posição anterior e recompõe o logo na nova posição: o custo depende do
+    tamanho do logo, não do tamanho da imagem. Os métodos devem ser chamados
+    com `lock` adquirido.
+    """
+
+    def __init__(self, session_id, base_image, template_image, output_format='png', output_quality=None):
+        self.id = session_id
+        self.base = base_image
+        self.canvas = base_image.copy()
+        self.template_image = template_image
+        self.output_format = output_format
+        self.output_quality = output_quality
+        self.state = {'x': None, 'y': None, 'scale': 0.25, 'rotation': 0}
+        self.version = 0
+        self.box = None
+        self.lock = threading.Lock()
+        self.expires_at = 0.0
+        self._overlay_key = None
+        self._overlay = None
+        self._frame = None
+
+    @property
+    def size(self):
+        return self.base.size
+
+    @property
+    def nbytes(self):
+        # Base e tela em RGBA; o logo é pequeno em comparação
+        width, height = self.base.size
+        return width * height * 4 * 2
+
+    def _overlay_for(self, scale, rotation):
+        width = max(1, int(self.base.width * scale))
+        key = (width, rotation)
+        if key != self._overlay_key:
+            aspect_ratio = self.template_image.width / self.template_image.height
+            overlay = self.template_image.resize((width, max(1, int(width / aspect_ratio))), Image.LANCZOS)
+            unrotated = overlay.size
+            if rotation:
+                overlay = overlay.rotate(-rotation, resample=Image.BICUBIC, expand=True)
+            self._overlay_key, self._overlay = key, (overlay, unrotated)
+        return self._overlay
+
+    def apply(self, **changes):
+        """
+        Atualiza `x`, `y`, `scale` e/ou `rotation` e recompõe somente as
+        regiões afetadas. Retorna a lista das regiões alteradas (esquerda,
+        topo, direita, base), limitadas à imagem: uma ao arrastar, duas
+        quando o logo salta para longe, nenhuma se nada visível mudou.
+
+        Levanta SessionStateError, sem alterar a sessão, se a escala ou a
+        rotação não forem finitas ou se `x`/`y` estiverem a mais de uma
+        largura/altura da imagem.
+        """
+        state = dict(self.state)
+        state.update({name: value for name, value in changes.items() if value is not None})
+        for name in ('scale', 'rotation'):
+            if not math.isfinite(state[name]):
+                raise SessionStateError(f"{name} deve ser um número finito.")
+        for name, limit in (('x', self.base.width), ('y', self.base.height)):
+            if state[name] is not None and not -limit <= state[name] <= limit:
+                raise SessionStateError(f"{name} deve estar entre {-limit} e {limit} (pixels).")
+        state['rotation'] = state['rotation'] % 360
+
+        with stage('composite'):
+            overlay, (width, height) = self._overlay_for(state['scale'], state['rotation'])
+            # Posição padrão de process_image: canto inferior direito com
+            # margem. Só na criação: depois disso, x e y já são concretos e
+            # cada um muda apenas quando informado
+            margin = 10
+            if state['x'] is None:
+                state['x'] = self.base.width - width - margin
+            if state['y'] is None:
+                state['y'] = self.base.height - height - margin
+            left = int(round(state['x'] + (width - overlay.width) / 2))
+            top = int(round(state['y'] + (height - overlay.height) / 2))
+            box = (left, top, left + overlay.width, top + overlay.height)
+
+            regions = []
+            for region in _dirty_regions(self.box, box):
+                region = _clip(region, self.base.size)
+                if region is not None:
+                    self.canvas.paste(self.base.crop(region), region[:2])
+                    regions.append(region)
+            if regions:
+                self.canvas.paste(overlay, box[:2], overlay)
+
+        self.state, self.box = state, box
+        self.version += 1
+        return regions
+
+    def encode_region(self, region):
+        """
+        Codifica a região `region` da tela no formato de saída da sessão.
+        """
+        return encode_image(self.canvas.crop(region), self.output_format, self.output_quality)
+
+    def patch_data_url(self, region):
+        """
+        Região alterada como data URL, para ser desenhada pelo cliente sobre
+        o quadro anterior na posição (esquerda, topo) da região.
+        """
+        content_type = OUTPUT_FORMATS[self.output_format]['content_type']
+        encoded = base64.b64encode(self.encode_region(region)).decode('ascii')
+        return f"data:{content_type};base64,{encoded}"
+
+    def frame(self):
+        """
+        Retorna a tela inteira codificada, memorizada por versão.
+        """
+        if self._frame is None or self._frame[0] != self.version:
+            self._frame = (self.version, self.encode_region((0, 0) + self.base.size))
+        return self._frame[1]
+
+
+class SessionStore:
+    """
+    Sessões de edição do processo, em memória.
+
+    Limites: `max_sessions` sessões e `max_bytes` de imagens decodificadas
+    (as menos usadas recentemente são descartadas) e expiração após `ttl`
+    segundos sem uso. As sessões não são compartilhadas entre processos:
+    com vários workers, o balanceador deve manter o cliente no mesmo worker
+    (sticky), e uma sessão não encontrada deve ser recriada pelo cliente.
+    """
+
+    def __init__(self, max_sessions=64, max_bytes=512 * 1024 * 1024, ttl=900):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.nbytes
+
+    def _prune(self, now):
+        # As sessões são renovadas a cada uso: as expiradas ficam no início
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            self._remove(session_id)
+            self.expired += 1
+
+    def add(self, session):
+        """
+        Guarda uma nova sessão, descartando as menos usadas se necessário.
+        """
+        if session.nbytes > self.max_bytes:
+            raise SessionError("Imagem grande demais para uma sessão de edição.")
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            while self._sessions and (len(self._sessions) >= self.max_sessions or
+                                      self._bytes + session.nbytes > self.max_bytes):
+                self._remove(next(iter(self._sessions)))
+                self.evicted += 1
+            session.expires_at = now + self.ttl
+            self._sessions[session.id] = session
+            self._bytes += session.nbytes
+            self.created += 1
+        return session
+
+    def get(self, session_id):
+        """
+        Retorna a sessão (renovando sua expiração) ou None se não existir ou
+        tiver expirado.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.expires_at = now + self.ttl
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove(session_id)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'created': self.created,
+                'expired': self.expired,
+                'evicted': self.evicted,
+            }
+
+
+def open_session(image_url, template, high_quality=False, output_format='png', output_quality=None, **state):
+    """
+    Baixa e decodifica a imagem base e o template uma única vez, aplica o
+    estado inicial (`x`, `y`, `scale`, `rotation`) e guarda a sessão.
+    Levanta SessionError em caso de falha.
+    """
+    from app.utils.image_processing import download_image
+    from app.utils.templates import get_template_registry
+
+    try:
+        source = open_image(download_image(image_url, high_quality=high_quality))
+    except Exception as e:
+        raise SessionError(f"Erro ao baixar ou abrir a imagem base: {str(e)}") from e
+    try:
+        template_image = get_template_registry().get(template)
+    except Exception as e:
+        raise SessionError(f"Erro ao abrir o template: {str(e)}") from e
+
+    # A decodificação e a primeira composição passam pelo controle de
+    # admissão; depois disso, a memória da sessão é limitada pelo armazenamento
+    max_side = Config.PREVIEW_SESSION_MAX_SIDE
+    with get_render_budget().reserve(decode_cost(source, max_side, copies=2)):
+        try:
+            base_image = load_image(source, max_side)
+        except Exception as e:
+            raise SessionError(f"Erro ao baixar ou abrir a imagem base: {str(e)}") from e
+        session = EditingSession(uuid.uuid4().hex, base_image, template_image, output_format, output_quality)
+        with session.lock:
+            session.apply(**state)
+    return get_session_store().add(session)
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    Retorna o armazenamento de sessões de edição do processo, criado na primeira chamada.
+    """
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(
+                    max_sessions=Config.PREVIEW_SESSION_MAX,
+                    max_bytes=Config.PREVIEW_SESSION_MAX_BYTES,
+                    ttl=Config.PREVIEW_SESSION_TTL,
+                )
+                register_collector('preview_sessions', _session_store.stats,
+                                   counters=('created', 'expired', 'evicted'))
+    return _session_store
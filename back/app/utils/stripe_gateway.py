@@ -0,0 +1,328 @@
+# app/utils/stripe_gateway.py
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+from app.config import Config
+from app.utils.metrics import get_metrics, record_stage, register_collector
+
+
+class StripeUnavailable(Exception):
+    """
+    O circuito do Stripe está aberto: chamadas recentes falharam e novas
+    chamadas são recusadas imediatamente até o próximo teste.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjuntor simples: abre após `failure_threshold` falhas consecutivas e,
+    passado `reset_timeout` segundos, deixa passar uma chamada de teste
+    (meio-aberto); o sucesso dela fecha o circuito, a falha o reabre.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Retorna None se a chamada pode seguir, ou os segundos até o próximo teste.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return None
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                return max(remaining, 1.0)
+            self.state, self._probing = 'half_open', True
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = 'closed', 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = 'open', time.monotonic()
+
+    def record_ignored(self):
+        # Chamada concluída com erro do cliente (4xx): não diz nada sobre a saúde do Stripe
+        with self._lock:
+            if self.state == 'half_open':
+                self.state, self.failures, self._probing = 'closed', 0, False
+
+
+def _retryable(error):
+    # Falhas de rede, limite de requisições, conflito de idempotência em andamento e erros 5xx
+    import stripe
+    if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+        return True
+    status = getattr(error, 'http_status', None)
+    return isinstance(error, stripe.StripeError) and status is not None and (status >= 500 or status == 409)
+
+
+class StripeGateway:
+    """
+    Ponto único de acesso à API do Stripe.
+
+    - um pool de conexões HTTP compartilhado (requests.Session) com timeouts
+      de conexão/leitura por chamada;
+    - novas tentativas limitadas, com backoff exponencial e jitter, apenas
+      para falhas transitórias; operações de escrita sempre levam uma chave
+      de idempotência, então repetir não duplica objetos no Stripe;
+    - um disjuntor que recusa chamadas imediatamente (StripeUnavailable)
+      enquanto o Stripe estiver instável;
+    - histogramas de latência por operação.
+
+    Os métodos retornam dicionários simples (já convertidos com to_dict()).
+    """
+
+    def __init__(self, api_key, api_base=None, connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff_base=0.25, backoff_max=2.0, pool_size=10, failure_threshold=5, reset_timeout=30.0):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # stripe e requests são importados sob demanda para não pesar na inicialização do app
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._clients = {}
+        self._async_clients = {}
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def _client(self, timeout):
+        # Um StripeClient por timeout, todos sobre a mesma sessão (mesmo pool de conexões)
+        with self._lock:
+            client = self._clients.get(timeout)
+            if client is None:
+                import stripe
+                client = stripe.StripeClient(
+                    self.api_key,
+                    base_addresses={'api': self.api_base} if self.api_base else None,
+                    max_network_retries=0,
+                    http_client=stripe.RequestsClient(timeout=timeout, session=self._session),
+                )
+                self._clients[timeout] = client
+            return client
+
+    def _observe(self, operation, seconds, error=None):
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                # Os histogramas ficam no registro de métricas (expostos em /metrics)
+                histogram = self._histograms[operation] = get_metrics().histogram(
+                    'stripe_request_duration_seconds', 'Latência das chamadas ao Stripe (com novas tentativas).',
+                    operation=operation,
+                )
+            if error is not None:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+        histogram.observe(seconds)
+        record_stage('stripe', seconds)
+        if error is not None:
+            get_metrics().inc('stripe_errors', 'Chamadas ao Stripe que falharam.', operation=operation)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _async_client(self, timeout):
+        # StripeClient com cliente httpx assíncrono (um por timeout); o pool de
+        # conexões dele fica preso ao loop de I/O, onde todas as chamadas rodam
+        with self._lock:
+            client = self._async_clients.get(timeout)
+            if client is None:
+                import httpx
+                import stripe
+                client = stripe.StripeClient(
+                    self.api_key,
+                    base_addresses={'api': self.api_base} if self.api_base else None,
+                    max_network_retries=0,
+                    http_client=stripe.HTTPXClient(timeout=httpx.Timeout(timeout[1], connect=timeout[0])),
+                )
+                self._async_clients[timeout] = client
+            return client
+
+    def _begin(self, idempotency_key, retries):
+        retry_after = self.breaker.allow()
+        if retry_after is not None:
+            raise StripeUnavailable("Stripe indisponível no momento. Tente novamente em instantes.", retry_after)
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+        return options, self.max_retries if retries is None else retries
+
+    def _fail(self, operation, start, error):
+        if _retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+        self._observe(operation, time.perf_counter() - start, error=error)
+
+    def _succeed(self, operation, start):
+        self.breaker.record_success()
+        self._observe(operation, time.perf_counter() - start)
+
+    def call(self, operation, fn, idempotency_key=None, timeout=None, retries=None):
+        """
+        Executa `fn(client, options)` com timeout, novas tentativas e disjuntor.
+
+        `operation` nomeia a operação nas métricas (ex.: 'customers.create').
+        Quando `idempotency_key` é informado, ele é enviado em todas as
+        tentativas. Levanta StripeUnavailable se o circuito estiver aberto, ou
+        o último erro do Stripe.
+        """
+        client = self._client(timeout or self.timeout)
+        options, retries = self._begin(idempotency_key, retries)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = fn(client, options)
+            except Exception as e:
+                if _retryable(e) and attempt < retries:
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._fail(operation, start, e)
+                raise
+            self._succeed(operation, start)
+            return result
+
+    async def call_async(self, operation, fn, idempotency_key=None, timeout=None, retries=None):
+        """
+        Versão não bloqueante de `call`: `fn(client, options)` retorna uma
+        corrotina (métodos *_async do StripeClient) e as esperas entre
+        tentativas não bloqueiam o loop. Deve ser aguardado no loop de
+        `get_io_loop()`; o disjuntor e as métricas são os mesmos de `call`.
+        """
+        client = self._async_client(timeout or self.timeout)
+        options, retries = self._begin(idempotency_key, retries)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = await fn(client, options)
+            except Exception as e:
+                if _retryable(e) and attempt < retries:
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._fail(operation, start, e)
+                raise
+            self._succeed(operation, start)
+            return result
+
+    def create_customer(self, email, name, metadata=None, idempotency_key=None):
+        return self.call(
+            'customers.create',
+            lambda client, options: client.v1.customers.create(
+                params={'email': email, 'name': name, 'metadata': metadata or {}}, options=options,
+            ).to_dict(),
+            idempotency_key=idempotency_key or uuid.uuid4().hex,
+        )
+
+    def create_subscription(self, customer_id, price_id, idempotency_key=None):
+        return self.call(
+            'subscriptions.create',
+            lambda client, options: client.v1.subscriptions.create(
+                params={
+                    'customer': customer_id,
+                    'items': [{'price': price_id}],
+                    'expand': ['latest_invoice.payment_intent'],
+                },
+                options=options,
+            ).to_dict(),
+            idempotency_key=idempotency_key or uuid.uuid4().hex,
+        )
+
+    async def create_subscription_async(self, customer_id, price_id, idempotency_key=None):
+        async def create(client, options):
+            subscription = await client.v1.subscriptions.create_async(
+                params={
+                    'customer': customer_id,
+                    'items': [{'price': price_id}],
+                    'expand': ['latest_invoice.payment_intent'],
+                },
+                options=options,
+            )
+            return subscription.to_dict()
+
+        return await self.call_async(
+            'subscriptions.create', create, idempotency_key=idempotency_key or uuid.uuid4().hex,
+        )
+
+    def list_active_prices(self):
+        """
+        Lista todos os preços ativos, com o produto expandido (percorre a paginação).
+        """
+        return self.call(
+            'prices.list',
+            lambda client, options: [
+                price.to_dict() for price in client.v1.prices.list(
+                    params={'active': True, 'expand': ['data.product'], 'limit': 100}, options=options,
+                ).auto_paging_iter()
+            ],
+        )
+
+    def stats(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            errors = dict(self._errors)
+        return {
+            'circuit': self.breaker.state,
+            'operations': {
+                operation: dict(histogram.snapshot(), errors=errors.get(operation, 0))
+                for operation, histogram in histograms.items()
+            },
+        }
+
+
+_stripe_gateway = None
+_stripe_gateway_lock = threading.Lock()
+
+
+def get_stripe_gateway():
+    """
+    Retorna o gateway do Stripe do processo, criado na primeira chamada.
+    """
+    global _stripe_gateway
+    if _stripe_gateway is None:
+        with _stripe_gateway_lock:
+            if _stripe_gateway is None:
+                _stripe_gateway = StripeGateway(
+                    api_key=Config.STRIPE_SECRET_KEY,
+                    api_base=Config.STRIPE_API_BASE,
+                    connect_timeout=Config.STRIPE_CONNECT_TIMEOUT,
+                    read_timeout=Config.STRIPE_READ_TIMEOUT,
+                    max_retries=Config.STRIPE_MAX_RETRIES,
+                    pool_size=Config.STRIPE_POOL_SIZE,
+                    failure_threshold=Config.STRIPE_BREAKER_THRESHOLD,
+                    reset_timeout=Config.STRIPE_BREAKER_RESET,
+                )
+                breaker = _stripe_gateway.breaker
+                register_collector('stripe', lambda: {
+                    'circuit_open': breaker.state != 'closed',
+                    'consecutive_failures': breaker.failures,
+                })
+    return _stripe_gateway
@@ -1,16 +1,8 @@
 # app/utils/stripe_helper.py
-import stripe
+from app.utils.stripe_gateway import get_stripe_gateway
 
-def create_stripe_subscription(customer_id, price_id):
+def create_stripe_subscription(customer_id, price_id, idempotency_key=None):
     """
-    Cria uma assinatura no Stripe para o cliente e preço informados.
+    Cria uma assinatura no Stripe para o cliente e preço informados (via gateway).
     """
-    try:
-        subscription = stripe.Subscription.create(
-            customer=customer_id,
-            items=[{'price': price_id}],
-            expand=['latest_invoice.payment_intent']
-        )
-        return subscription
-    except Exception as e:
-        raise e
\ No newline at end of file
+    return get_stripe_gateway().create_subscription(customer_id, price_id, idempotency_key=idempotency_key)
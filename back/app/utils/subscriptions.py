@@ -0,0 +1,75 @@
+# app/utils/subscriptions.py
+from datetime import datetime
+
+from app.config import Config
+from app.extensions import db
+from app.models import Subscription, User
+
+
+def _period_end(data):
+    # Versões recentes da API movem o período para os itens da assinatura
+    value = data.get('current_period_end')
+    if value is None:
+        items = (data.get('items') or {}).get('data') or []
+        value = items[0].get('current_period_end') if items else None
+    return datetime.utcfromtimestamp(value) if value else None
+
+
+def _price_id(data):
+    items = (data.get('items') or {}).get('data') or []
+    price = items[0].get('price') if items else None
+    if isinstance(price, dict):
+        return price.get('id')
+    return price
+
+
+def _user_id(data):
+    user = User.query.filter_by(stripe_customer_id=data.get('customer')).first()
+    if user is not None:
+        return user.id
+    user_id = (data.get('metadata') or {}).get('user_id')
+    return int(user_id) if user_id and str(user_id).isdigit() else None
+
+
+def apply_subscription(data, updated_at):
+    """
+    Grava no espelho local o objeto de assinatura `data` (dicionário no
+    formato da API do Stripe), alterado no instante `updated_at` (segundos
+    Unix, normalmente event.created). Alterações mais antigas que a última
+    aplicada são descartadas, então eventos fora de ordem não regridem o
+    estado. Não faz commit; retorna a assinatura, ou None se descartada.
+    """
+    subscription = Subscription.query.filter_by(stripe_subscription_id=data['id']).first()
+    if subscription is not None and subscription.stripe_updated_at > updated_at:
+        return None
+
+    user_id = _user_id(data)
+    if subscription is None:
+        subscription = Subscription(stripe_subscription_id=data['id'])
+        db.session.add(subscription)
+    subscription.stripe_customer_id = data.get('customer')
+    subscription.user_id = user_id or subscription.user_id
+    subscription.status = data.get('status')
+    subscription.price_id = _price_id(data)
+    subscription.current_period_end = _period_end(data)
+    subscription.cancel_at_period_end = bool(data.get('cancel_at_period_end'))
+    subscription.stripe_updated_at = updated_at
+    return subscription
+
+
+def get_active_subscription(user_id):
+    """
+    Retorna a assinatura ativa do usuário (status em
+    SUBSCRIPTION_ACTIVE_STATUSES) a partir do banco local, ou None.
+    """
+    return Subscription.query.filter(
+        Subscription.user_id == user_id,
+        Subscription.status.in_(Config.SUBSCRIPTION_ACTIVE_STATUSES),
+    ).order_by(Subscription.current_period_end.desc()).first()
+
+
+def is_subscribed(user_id):
+    """
+    Indica se o usuário tem acesso de assinante, sem consultar o Stripe.
+    """
+    return get_active_subscription(user_id) is not None
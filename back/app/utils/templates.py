@@ -0,0 +1,142 @@
+# app/utils/templates.py
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from app.config import Config
+from app.utils.metrics import register_collector
+
+
+class TemplateRegistry:
+    """
+    Registro de templates (logos/peças) por processo.
+
+    Cada arquivo é decodificado uma única vez e mantido em RGBA. As versões
+    redimensionadas são memorizadas por largura de destino em um LRU limitado
+    por um orçamento de bytes decodificados (`max_bytes`): poucas versões
+    grandes ocupam o mesmo que muitas pequenas.
+    Quando o arquivo muda no disco (mtime/tamanho), o template é recarregado e
+    as versões redimensionadas antigas são descartadas.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._templates = {}
+        self._variants = OrderedDict()
+        self._variants_size = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.variant_hits = 0
+        self.variant_misses = 0
+        self.variant_evictions = 0
+
+    @staticmethod
+    def _nbytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def _drop_variant(self, key):
+        self._variants_size -= self._nbytes(self._variants.pop(key))
+
+    def _entry(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._templates.get(path)
+            if entry is not None and entry[0] == version:
+                return path, entry
+
+        # Decodifica fora do lock; em caso de corrida, a última carga vence
+        with Image.open(path) as source:
+            image = source.convert("RGBA")
+        image.load()
+        entry = (version, image)
+        with self._lock:
+            current = self._templates.get(path)
+            if current is None or current[0] != version:
+                self._templates[path] = entry
+                self.loads += 1
+                for key in [k for k in self._variants if k[0] == path and k[1] != version]:
+                    self._drop_variant(key)
+            else:
+                entry = current
+        return path, entry
+
+    def identity(self, path):
+        """
+        Retorna uma identificação estável do template (caminho + versão).
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def get(self, path):
+        """
+        Retorna o template decodificado em RGBA (não deve ser alterado).
+        """
+        return self._entry(path)[1][1]
+
+    def resized(self, path, width, resample=Image.LANCZOS):
+        """
+        Retorna o template redimensionado para a largura `width` (LANCZOS por
+        padrão), mantendo a proporção original. A imagem retornada é
+        compartilhada e não deve ser alterada.
+        """
+        path, (version, image) = self._entry(path)
+        key = (path, version, width, resample)
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is not None:
+                self._variants.move_to_end(key)
+                self.variant_hits += 1
+                return variant
+            self.variant_misses += 1
+
+        aspect_ratio = image.width / image.height
+        height = int(width / aspect_ratio)
+        variant = image.resize((width, height), resample)
+        if self._nbytes(variant) > self.max_bytes:
+            # Maior que o orçamento inteiro: usada sem ser memorizada
+            return variant
+        with self._lock:
+            if key in self._variants:
+                self._drop_variant(key)
+            self._variants[key] = variant
+            self._variants_size += self._nbytes(variant)
+            while self._variants_size > self.max_bytes:
+                self._drop_variant(next(iter(self._variants)))
+                self.variant_evictions += 1
+        return variant
+
+    def stats(self):
+        with self._lock:
+            return {
+                'templates': len(self._templates),
+                'variants': len(self._variants),
+                'variant_bytes': self._variants_size,
+                'max_bytes': self.max_bytes,
+                'loads': self.loads,
+                'variant_hits': self.variant_hits,
+                'variant_misses': self.variant_misses,
+                'variant_evictions': self.variant_evictions,
+            }
+
+
+_template_registry = None
+_template_registry_lock = threading.Lock()
+
+
+def get_template_registry():
+    """
+    Retorna o registro de templates do processo, criado na primeira chamada.
+    """
+    global _template_registry
+    if _template_registry is None:
+        with _template_registry_lock:
+            if _template_registry is None:
+                _template_registry = TemplateRegistry(max_bytes=Config.TEMPLATE_CACHE_MAX_BYTES)
+                register_collector('templates', _template_registry.stats,
+                                   counters=('loads', 'variant_hits', 'variant_misses', 'variant_evictions'))
+    return _template_registry
@@ -0,0 +1,170 @@
+# app/utils/users.py
+import inspect
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.extensions import db
+from app.utils.metrics import register_collector
+from app.models import User
+
+# Registro compacto e imutável do usuário (sem o hash da senha)
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'email', 'stripe_customer_id'])
+
+
+class UserCache:
+    """
+    Cache por processo dos usuários autenticados, por id.
+
+    Guarda até `max_entries` registros (LRU), cada um válido por `ttl`
+    segundos. As alterações feitas pelo ORM neste processo invalidam a
+    entrada na hora (eventos de flush/commit da sessão); o TTL limita o
+    tempo em que alterações feitas por outros processos, ou por UPDATEs em
+    massa que não passam pelo ORM, ficam invisíveis.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """
+        Retorna o CachedUser do id informado (carregando do banco se preciso),
+        ou None se o usuário não existir.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        record = CachedUser(user.id, user.username, user.email, user.stripe_customer_id)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, record)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    """
+    Retorna o cache de usuários do processo, criado na primeira chamada.
+    """
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = UserCache(max_entries=Config.USER_CACHE_MAX_ENTRIES, ttl=Config.USER_CACHE_TTL)
+                register_collector('user_cache', _user_cache.stats, counters=('hits', 'misses'))
+    return _user_cache
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    # Invalida já no flush e guarda os ids para invalidar de novo após o commit,
+    # descartando o que outra thread tenha lido do banco antes dele
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('changed_user_ids', set()).update(changed)
+        for user_id in changed:
+            get_user_cache().invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        get_user_cache().invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+
+def get_current_user():
+    """
+    Retorna o CachedUser do token JWT da requisição atual, ou None.
+    Deve ser usado em rotas protegidas por @jwt_required().
+    """
+    identity = get_jwt_identity()
+    if identity is None:
+        return None
+    return get_user_cache().get(int(identity))
+
+
+def async_jwt_required():
+    """
+    Equivalente de @jwt_required() para views async. O decorador do
+    flask_jwt_extended é síncrono e executa a view com `ensure_sync`, o que
+    bloquearia uma thread até o fim da corrotina; aqui o token é validado
+    (sem acesso ao banco) e a view é aguardada no próprio loop.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_user_required(fn):
+    """
+    Decorador para rotas protegidas (aplicado depois de @jwt_required()):
+    carrega o usuário do token em `g.current_user` a partir do cache, ou
+    responde 404 se ele não existir mais. Em views async, a consulta (que
+    pode ir ao banco) roda fora do loop de I/O.
+    """
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            from app.utils.aio import offload
+            user = await offload(get_current_user)
+            if user is None:
+                return jsonify({'error': 'Usuário não encontrado.'}), 404
+            g.current_user = user
+            return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = get_current_user()
+        if user is None:
+            return jsonify({'error': 'Usuário não encontrado.'}), 404
+        g.current_user = user
+        return fn(*args, **kwargs)
+    return wrapper
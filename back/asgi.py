@@ -0,0 +1,20 @@
+# asgi.py
+"""
+Ponto de entrada ASGI, com o modo assíncrono ativado:
+
+    uvicorn asgi:app --workers 4
+
+As views async de /upload, /preview e /subscription são aguardadas no loop
+do servidor, que também é o loop de I/O do processo: as esperas de S3,
+hosts de imagens e Stripe de todas as requisições em andamento não ocupam
+threads. Só as rotas síncronas rodam em threads (até ASGI_THREADS). O modo
+síncrono continua disponível em api.py.
+"""
+from app import create_app
+from app.config import Config
+from app.extensions import check_schema
+from app.utils.aio import AsgiApp
+
+flask_app = create_app(async_mode=True)
+check_schema(flask_app)
+app = AsgiApp(flask_app, threads=Config.ASGI_THREADS)
@@ -0,0 +1,21 @@
+# benchmarks/common.py
+"""
+Utilidades compartilhadas pelos benchmarks.
+"""
+
+
+def create_benchmark_app():
+    """
+    Cria o app e aplica as migrações no banco configurado (normalmente um
+    SQLite temporário), como seria feito no deploy.
+    """
+    from flask_migrate import upgrade
+
+    from app import create_app
+    from app.extensions import init_migrations
+
+    app = create_app()
+    init_migrations(app)
+    with app.app_context():
+        upgrade()
+    return app
@@ -0,0 +1,97 @@
+# benchmarks/compositing.py
+"""
+Compara o motor de composição vetorizado (app.utils.compositing) com o
+caminho atual baseado em Image.paste / Image.alpha_composite.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.compositing --size 1600 --layers 4 --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from PIL import Image, ImageChops, ImageDraw
+
+from app.utils.compositing import composite_layers
+
+
+def make_layer(size, color, alpha):
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((size // 8, size // 8, size * 7 // 8, size * 7 // 8), fill=color + (alpha,))
+    return image
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1600, help="Lado da imagem base em pixels.")
+    parser.add_argument("--layers", type=int, default=4, help="Número de camadas sobre a base.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    base = Image.new("RGBA", (args.size, args.size), (230, 230, 230, 255))
+    overlay_size = args.size // 2
+    overlays = [make_layer(overlay_size, (40 * i % 255, 90, 160), 180) for i in range(args.layers)]
+    position = (args.size - overlay_size - 10, args.size - overlay_size - 10)
+
+    def paste_path():
+        # Caminho atual: uma cópia da base e um paste por camada
+        image = base.copy()
+        for overlay in overlays:
+            image.paste(overlay, position, overlay)
+        return image
+
+    def alpha_composite_path():
+        image = base.copy()
+        for overlay in overlays:
+            image.alpha_composite(overlay, position)
+        return image
+
+    blend_functions = (ImageChops.multiply, ImageChops.screen, ImageChops.overlay)
+
+    def pillow_blend_path():
+        # Equivalente com operações encadeadas do Pillow: cada camada precisa
+        # de uma tela do tamanho da base, da mesclagem e de uma composição alfa
+        image = base.copy()
+        for i, overlay in enumerate(overlays):
+            layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
+            layer.paste(overlay, position)
+            mixed = blend_functions[i % 3](image.convert("RGB"), layer.convert("RGB")).convert("RGBA")
+            mixed.putalpha(layer.getchannel("A"))
+            image.alpha_composite(mixed)
+        return image
+
+    sources = {'base': base}
+    sources.update({f"layer{i}": overlay for i, overlay in enumerate(overlays)})
+    stack = [{'source': 'base'}] + [
+        {'source': f"layer{i}", 'x': position[0], 'y': position[1]} for i in range(args.layers)
+    ]
+    blend_stack = [{'source': 'base'}] + [
+        {'source': f"layer{i}", 'x': position[0], 'y': position[1],
+         'blend': ('multiply', 'screen', 'overlay')[i % 3]} for i in range(args.layers)
+    ]
+
+    results = [
+        ("Image.paste (atual)", timed(paste_path, args.repeat)),
+        ("Image.alpha_composite", timed(alpha_composite_path, args.repeat)),
+        ("composite_layers (normal)", timed(lambda: composite_layers(stack, sources), args.repeat)),
+        ("Pillow encadeado (blend modes)", timed(pillow_blend_path, args.repeat)),
+        ("composite_layers (blend modes)", timed(lambda: composite_layers(blend_stack, sources), args.repeat)),
+    ]
+
+    print(f"base {args.size}x{args.size}, {args.layers} camadas de {overlay_size}x{overlay_size}, {args.repeat} execuções")
+    for name, (median, best) in results:
+        print(f"{name:32s} mediana {median:8.2f} ms   melhor {best:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/database.py
+"""
+Mede a vazão de registros e logins concorrentes com dois perfis de SQLite:
+  - "antes": journal em rollback, synchronous=FULL e sem busy_timeout (o
+    comportamento padrão anterior);
+  - "depois": o perfil atual (WAL, synchronous=NORMAL, busy_timeout).
+
+Cada perfil roda em um subprocesso próprio (a configuração é lida na
+importação) com um banco novo. Erros contam respostas diferentes de 200,
+como os 500 causados por "database is locked".
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.database --users 200 --concurrency 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    'antes': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '0'},
+    'depois': {},
+}
+
+
+def run_phase(app, path, payloads, concurrency):
+    errors, lock = [0], threading.Lock()
+    queue = list(payloads)
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not queue:
+                    return
+                payload = queue.pop()
+            try:
+                ok = client.post(path, json=payload).status_code == 200
+            except Exception:
+                ok = False
+            if not ok:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # Vazão considera apenas as respostas bem-sucedidas
+    return {'per_second': (len(payloads) - errors[0]) / elapsed, 'errors': errors[0]}
+
+
+def measure(users, concurrency):
+    from benchmarks.common import create_benchmark_app
+
+    app = create_benchmark_app()
+    app.logger.disabled = True
+    registrations = [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'secret'} for i in range(users)
+    ]
+    logins = [{'username': f'user{i}', 'password': 'secret'} for i in range(users)]
+    return {
+        'register': run_phase(app, '/register', registrations, concurrency),
+        'login': run_phase(app, '/login', logins, concurrency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(measure(args.users, args.concurrency)))
+        return
+
+    print(f"{'perfil':<8}{'registros/s':>13}{'erros':>7}{'logins/s':>11}{'erros':>7}")
+    for name, overrides in PROFILES.items():
+        workdir = tempfile.mkdtemp(prefix='ixtampa-db-bench-')
+        env = dict(os.environ, **overrides)
+        env.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            'STRIPE_OUTBOX_WORKER': 'false',
+            # Custo baixo para que o hash da senha não domine a medição
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+            'PASSWORD_HASH_MAX_PENDING': str(max(64, args.concurrency)),
+        })
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.database', '--profile', name,
+             '--users', str(args.users), '--concurrency', str(args.concurrency)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<8}{result['register']['per_second']:>13.1f}{result['register']['errors']:>7}"
+              f"{result['login']['per_second']:>11.1f}{result['login']['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+# benchmarks/e2e.py
+"""
+Benchmark de ponta a ponta do backend, sem AWS nem Stripe.
+
+Sobe o app (create_app, com as migrações aplicadas em um SQLite temporário)
+em um servidor WSGI local com threads, apontado para substitutos locais:
+  - benchmarks.s3_stub: emulador do S3 em memória;
+  - benchmarks.image_host: servidor de imagens base de exemplo;
+  - benchmarks.stripe_stub: simulador da API do Stripe.
+
+Cada cenário (register, login, subscription, upload, preview,
+preview_cached, session_drag, render) dispara `--requests` requisições HTTP com `--concurrency`
+clientes e informa latência p50/p95/p99, requisições por segundo e o pico de
+memória (RSS) do processo. Em seguida, micro-benchmarks medem as etapas de
+process_image (download, decodificação, composição, codificação e envio).
+
+Com `--json`, o resultado é gravado em um arquivo; com `--baseline`, é
+comparado a um resultado anterior.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.e2e --requests 200 --concurrency 16 --json atual.json
+    python -m benchmarks.e2e --async-mode --baseline atual.json
+    python -m benchmarks.e2e --scenarios preview --image-size 3000x2000 --host-latency 0.1
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+SCENARIOS = ('register', 'login', 'subscription', 'upload', 'preview', 'preview_cached', 'session_drag', 'render')
+BUCKET = 'bench'
+
+
+def peak_rss_mb():
+    # ru_maxrss é informado em KiB no Linux (e em bytes no macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49], 2),
+        'p95': round(cuts[94], 2),
+        'p99': round(cuts[98], 2),
+        'mean': round(statistics.fmean(samples), 2),
+        'max': round(max(samples), 2),
+    }
+
+
+def run_scenario(name, request, total, concurrency):
+    """
+    Executa `request(session, i)` para i em [0, total) com `concurrency`
+    clientes em paralelo (cada um com sua sessão HTTP) e resume as latências
+    das respostas 2xx/3xx.
+    """
+    import requests
+
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses = [], Counter()
+
+    def client():
+        session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            start = time.perf_counter()
+            try:
+                status = request(session, i).status_code
+            except requests.RequestException:
+                status = 'erro de conexão'
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[status] += 1
+                if isinstance(status, int) and status < 400:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(min(concurrency, total))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    result = {
+        'requests': total,
+        'ok': len(latencies),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'wall_s': round(wall, 3),
+        'rps': round(len(latencies) / wall, 2) if wall else None,
+        'latency_ms': percentiles(latencies),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    print_scenario(name, result)
+    return result
+
+
+def print_scenario(name, result):
+    latency = result['latency_ms']
+    errors = result['requests'] - result['ok']
+    print(f"{name:<15} {result['rps'] or 0:>8.1f} req/s  p50 {latency['p50'] or 0:>8.1f} ms  "
+          f"p95 {latency['p95'] or 0:>8.1f} ms  p99 {latency['p99'] or 0:>8.1f} ms  "
+          f"RSS {result['peak_rss_mb']:>7.1f} MB" + (f"  falhas {errors} {result['statuses']}" if errors else ""))
+
+
+def timed(fn, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median': round(statistics.median(samples), 2),
+        'p95': percentiles(samples)['p95'],
+        'min': round(min(samples), 2),
+    }
+
+
+def micro_benchmarks(host_url, image_size, template, repeat, seed_base):
+    """
+    Mede as etapas de process_image isoladamente, no mesmo processo.
+    """
+    from app.utils.encoding import encode_image, upload_bytes
+    from app.utils.fetcher import get_image_fetcher
+    from app.utils.image_processing import decode_image, process_image, render_preview
+
+    width, height = image_size
+    fetcher = get_image_fetcher()
+    url = f"{host_url}/images/{width}x{height}/{seed_base}.jpg"
+    base_bytes = fetcher.fetch(url)
+    base_image = decode_image(base_bytes)
+    rendered = render_preview(base_image, template, 0.25)
+    encoded = encode_image(rendered, 'png')
+
+    stages = {
+        # Download sem cache (URLs novas) e revalidação de uma URL já baixada (304)
+        'fetch_miss': lambda i: fetcher.fetch(f"{host_url}/images/{width}x{height}/{seed_base + 1 + i}.jpg"),
+        'fetch_revalidate': lambda i: fetcher.fetch(url),
+        'decode': lambda i: decode_image(base_bytes),
+        'render': lambda i: render_preview(base_image, template, 0.25),
+        'encode_png': lambda i: encode_image(rendered, 'png'),
+        'encode_webp': lambda i: encode_image(rendered, 'webp'),
+        'encode_jpeg': lambda i: encode_image(rendered, 'jpeg'),
+        'upload': lambda i: upload_bytes(encoded, f"micro/{seed_base}-{i}.png", 'png'),
+        # Fluxo completo: imagem nova (sem cache) e repetida (cache de pré-visualizações)
+        'process_image_cold': lambda i: process_image(
+            f"{host_url}/images/{width}x{height}/{seed_base + 1 + repeat + i}.jpg", template),
+        'process_image_cached': lambda i: process_image(url, template),
+    }
+    results = {}
+    for name, fn in stages.items():
+        results[name] = timed(fn, repeat)
+        print(f"  {name:<22} mediana {results[name]['median']:>8.2f} ms  p95 {results[name]['p95']:>8.2f} ms")
+    return results
+
+
+def compare(current, baseline):
+    """
+    Imprime a variação de cada métrica em relação a um resultado anterior.
+    """
+    def delta(new, old, higher_is_better):
+        if not new or not old:
+            return "      -"
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        return f"{change:+6.1f}%" + (" (melhor)" if better and abs(change) >= 5 else "")
+
+    print(f"\nComparação com {baseline['meta'].get('git_commit') or 'resultado anterior'}:")
+    for name, result in current['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        print(f"  {name:<15} req/s {delta(result['rps'], old['rps'], True)}  "
+              f"p50 {delta(result['latency_ms']['p50'], old['latency_ms']['p50'], False)}  "
+              f"p99 {delta(result['latency_ms']['p99'], old['latency_ms']['p99'], False)}")
+    for name, result in current.get('micro', {}).items():
+        old = baseline.get('micro', {}).get(name)
+        if old:
+            print(f"  {name:<22} mediana {delta(result['median'], old['median'], False)}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="Requisições por cenário.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultâneos.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Cenários separados por vírgula ({', '.join(SCENARIOS)}).")
+    parser.add_argument("--image-size", default="1600x1200", help="Tamanho das imagens base (LxA).")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="Latência do emulador do S3, em segundos.")
+    parser.add_argument("--host-latency", type=float, default=0.0,
+                        help="Latência do servidor de imagens, em segundos.")
+    parser.add_argument("--stripe-latency", type=float, default=0.0, help="Latência do Stripe, em segundos.")
+    parser.add_argument("--hash-method", default=None,
+                        help="PASSWORD_HASH_METHOD usado no benchmark (padrão: o da configuração).")
+    parser.add_argument("--async-mode", action="store_true", help="Usa as views do modo assíncrono.")
+    parser.add_argument("--micro-repeat", type=int, default=10,
+                        help="Repetições de cada micro-benchmark (0 desativa).")
+    parser.add_argument("--json", dest="json_path", help="Grava o resultado neste arquivo.")
+    parser.add_argument("--baseline", help="Resultado anterior (JSON) para comparação.")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    width, height = (int(value) for value in args.image_size.lower().split("x"))
+
+    from benchmarks import image_host, s3_stub, stripe_stub
+
+    _, s3, s3_url = s3_stub.serve(latency=args.s3_latency)
+    _, host, host_url = image_host.serve(latency=args.host_latency)
+    _, stripe, stripe_url = stripe_stub.serve(latency=args.stripe_latency)
+
+    workdir = tempfile.mkdtemp(prefix="ixtampa-e2e-")
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "S3_ENDPOINT_URL": s3_url,
+        "S3_BUCKET": BUCKET,
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "stub",
+        "AWS_SECRET_ACCESS_KEY": "stub",
+        "STRIPE_API_BASE": stripe_url,
+        "STRIPE_SECRET_KEY": "sk_test_stub",
+        "STRIPE_OUTBOX_POLL_INTERVAL": "0.2",
+        "PREVIEW_CACHE_DIR": os.path.join(workdir, "preview-cache"),
+        "FETCH_CACHE_DIR": os.path.join(workdir, "fetch-cache"),
+        # Jobs em threads: o benchmark mede o processo atual
+        "PREVIEW_JOB_BACKEND": "thread",
+        "ASYNC_MODE": "true" if args.async_mode else "false",
+    }
+    if args.hash_method:
+        env["PASSWORD_HASH_METHOD"] = args.hash_method
+    os.environ.update(env)
+
+    import requests
+    from PIL import Image
+    from werkzeug.serving import make_server
+
+    from benchmarks.common import create_benchmark_app
+    from app.extensions import db
+    from app.models import User
+    from app.utils.s3 import get_s3_client
+
+    app = create_benchmark_app()
+    get_s3_client().create_bucket(Bucket=BUCKET)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    template = os.path.join(workdir, "template.png")
+    Image.new("RGBA", (400, 400), (200, 30, 30, 180)).save(template)
+    upload_body = image_host.make_image(width, height, 0)
+    print(f"Preparando {args.requests} imagens base {width}x{height}...")
+    host.prepare(width, height, range(1, args.requests + 1))
+
+    users = [f"bench{i}" for i in range(args.requests)]
+    tokens = {}
+    results = {}
+
+    def register(session, i):
+        return session.post(f"{base_url}/register", json={
+            'username': users[i], 'email': f"{users[i]}@example.com", 'password': 'secret'})
+
+    def login(session, i):
+        response = session.post(f"{base_url}/login", json={'username': users[i], 'password': 'secret'})
+        if response.status_code == 200:
+            tokens[i] = response.json()['access_token']
+        return response
+
+    def ensure_users(need_tokens):
+        # Pré-requisitos dos cenários seguintes, fora da medição
+        session = requests.Session()
+        with app.app_context():
+            existing = {username for (username,) in db.session.query(User.username)}
+        for i, username in enumerate(users):
+            if username not in existing:
+                register(session, i)
+        if need_tokens:
+            for i in range(len(users)):
+                if i not in tokens:
+                    login(session, i)
+
+    def subscription(session, i):
+        return session.post(f"{base_url}/subscription", json={'plan': 'price_monthly'},
+                            headers={'Authorization': f"Bearer {tokens[i]}"})
+
+    def upload(session, i):
+        return session.post(f"{base_url}/upload",
+                            files={'file': (f"bench{i}.jpg", io.BytesIO(upload_body), 'image/jpeg')})
+
+    def preview(session, i):
+        # Cada requisição usa uma imagem base diferente: download e renderização sem cache
+        return session.post(f"{base_url}/preview", json={
+            'image_url': f"{host_url}/images/{width}x{height}/{i + 1}.jpg", 'clothing_template': template})
+
+    def preview_cached(session, i):
+        return session.post(f"{base_url}/preview", json={
+            'image_url': f"{host_url}/images/{width}x{height}/1.jpg", 'clothing_template': template})
+
+    session_ids = []
+
+    def session_drag(session, i):
+        # Arrasto do logo em uma sessão de edição já aberta (só a região alterada é recomposta)
+        step = i // len(session_ids)
+        return session.patch(f"{base_url}/preview/sessions/{session_ids[i % len(session_ids)]}", json={
+            'x': 100 + (step * 7) % (width // 2), 'y': 100 + (step * 5) % (height // 2)})
+
+    rendition_keys = []
+
+    def render(session, i):
+        # Derivados de uma mesma pré-visualização em várias larguras: cada
+        # combinação é renderizada uma vez e as demais vêm do cache
+        width_choice = (320, 640, 960, 1280)[i % 4]
+        return session.get(f"{base_url}/preview/render/{rendition_keys[0]}?w={width_choice}",
+                           headers={'Accept': 'image/avif,image/webp,*/*'})
+
+    requests_by_scenario = {
+        'register': register, 'login': login, 'subscription': subscription,
+        'upload': upload, 'preview': preview, 'preview_cached': preview_cached,
+        'session_drag': session_drag, 'render': render,
+    }
+
+    print(f"\n{args.requests} requisições por cenário, {args.concurrency} clientes"
+          f"{' (modo assíncrono)' if args.async_mode else ''}:")
+    for name in scenarios:
+        if name == 'login':
+            ensure_users(need_tokens=False)
+        elif name == 'subscription':
+            ensure_users(need_tokens=True)
+            from app.utils.outbox import get_outbox_worker
+            with app.app_context():
+                pending = [user.id for user in User.query.filter(User.stripe_customer_id.is_(None))]
+            for user_id in pending:
+                get_outbox_worker().ensure_customer(user_id)
+        elif name == 'preview_cached':
+            requests.post(f"{base_url}/preview", json={
+                'image_url': f"{host_url}/images/{width}x{height}/1.jpg", 'clothing_template': template})
+        elif name == 'session_drag':
+            for i in range(args.concurrency):
+                session_ids.append(requests.post(f"{base_url}/preview/sessions", json={
+                    'image_url': f"{host_url}/images/{width}x{height}/{i + 1}.jpg", 'clothing_template': template,
+                    'scale': 0.15}).json()['session_id'])
+        elif name == 'render':
+            preview_url = requests.post(f"{base_url}/preview", json={
+                'image_url': f"{host_url}/images/{width}x{height}/1.jpg", 'clothing_template': template,
+            }).json()['preview_url']
+            rendition_keys.append(preview_url.rsplit('/', 1)[-1].removeprefix('processed_'))
+        results[name] = run_scenario(name, requests_by_scenario[name], args.requests, args.concurrency)
+
+    micro = {}
+    if args.micro_repeat > 0:
+        print(f"\nMicro-benchmarks de process_image ({args.micro_repeat} repetições):")
+        seed_base = args.requests + 1
+        host.prepare(width, height, range(seed_base, seed_base + 2 * args.micro_repeat + 1))
+        with app.app_context():
+            micro = micro_benchmarks(host_url, (width, height), template, args.micro_repeat,
+                                     seed_base=seed_base)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'scenarios': results,
+        'micro': micro,
+        'stubs': {
+            's3_requests': s3.requests,
+            'image_host_requests': host.requests,
+            'stripe_requests': stripe.requests,
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    server.shutdown()
+
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nResultado gravado em {args.json_path}")
+    if args.baseline:
+        with open(args.baseline) as source:
+            compare(report, json.load(source))
+
+
+if __name__ == "__main__":
+    main()
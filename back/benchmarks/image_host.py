@@ -0,0 +1,147 @@
+# benchmarks/image_host.py
+"""
+Servidor HTTP local de imagens base de exemplo, no papel dos hosts externos
+de onde o backend baixa as imagens das pré-visualizações.
+
+GET /images/<largura>x<altura>/<semente>.jpg devolve um JPEG gerado (e
+guardado em memória) para a combinação informada: sementes diferentes geram
+bytes diferentes, o que evita o cache de pré-visualizações. As respostas
+levam ETag e Last-Modified e respondem 304 a If-None-Match, e a latência pode
+ser injetada.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.image_host --port 12113 --latency 0.05
+"""
+import argparse
+import hashlib
+import io
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+IMAGE_PATH = re.compile(r"^/images/(\d+)x(\d+)/(\d+)\.jpg$")
+
+
+def make_image(width, height, seed, quality=85):
+    """
+    Gera um JPEG determinístico com gradiente e formas (conteúdo parecido com
+    uma foto, para que a decodificação e a compressão tenham custo realista).
+    """
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x = (seed * 37 + i * 131) % max(width, 1)
+        y = (seed * 53 + i * 71) % max(height, 1)
+        radius = max(width, height) // (6 + i)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=((seed * 29 + i * 40) % 256, (i * 90) % 256, (seed * 7) % 256))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+class ImageHost:
+    """
+    Estado do servidor: imagens já geradas e contadores de requisições.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.images = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self.last_modified = formatdate(usegmt=True)
+
+    def image(self, width, height, seed):
+        key = (width, height, seed)
+        with self.lock:
+            cached = self.images.get(key)
+        if cached is None:
+            body = make_image(width, height, seed)
+            cached = (body, '"' + hashlib.md5(body).hexdigest() + '"')
+            with self.lock:
+                self.images[key] = cached
+        return cached
+
+    def prepare(self, width, height, seeds):
+        """
+        Gera antecipadamente as imagens das sementes informadas, para que o
+        custo da geração não entre nas medições.
+        """
+        for seed in seeds:
+            self.image(width, height, seed)
+
+
+def make_handler(host):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _not_found(self):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            with host.lock:
+                host.requests += 1
+            if host.latency:
+                time.sleep(host.latency)
+            match = IMAGE_PATH.match(self.path.split("?")[0])
+            if match is None:
+                return self._not_found()
+            width, height, seed = (int(value) for value in match.groups())
+            if not (0 < width <= 8000 and 0 < height <= 8000):
+                return self._not_found()
+            body, etag = host.image(width, height, seed)
+            if self.headers.get("If-None-Match") == etag:
+                with host.lock:
+                    host.not_modified += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                return self.end_headers()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", host.last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(port=0, latency=0.0):
+    """
+    Inicia o servidor em uma thread e retorna (servidor, estado, url base).
+    """
+    host = ImageHost(latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(host))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, host, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=12113)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso por requisição, em segundos.")
+    args = parser.parse_args()
+    server, _, url = serve(args.port, args.latency)
+    print(f"Servidor de imagens em {url} (ex.: {url}/images/1600x1200/1.jpg)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
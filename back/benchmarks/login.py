@@ -0,0 +1,124 @@
+# benchmarks/login.py
+"""
+Mede a vazão de logins (POST /login) para diferentes custos de hash e a
+latência de uma rota leve (GET /preview/cache) atendida durante a rajada.
+
+Cada custo é medido com um usuário cujo hash já usa o método configurado; um
+segundo usuário, gravado com um custo antigo, confirma o rehash transparente
+no primeiro login.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.login --methods pbkdf2:sha256:100000 pbkdf2:sha256:600000 \
+        --logins 40 --concurrency 8
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(app, method, logins, concurrency):
+    from app.config import Config
+    from app.extensions import db
+    from app.models import User
+    from app.utils.passwords import reset_password_hasher
+
+    Config.PASSWORD_HASH_METHOD = method
+    Config.PASSWORD_HASH_MAX_PENDING = max(Config.PASSWORD_HASH_MAX_PENDING, concurrency)
+    reset_password_hasher()
+
+    with app.app_context():
+        User.query.delete()
+        db.session.add(User(username="bench", email="bench@example.com",
+                            password_hash=generate_password_hash("secret", method=method)))
+        db.session.add(User(username="legacy", email="legacy@example.com",
+                            password_hash=generate_password_hash("secret", method="pbkdf2:sha256:1000")))
+        db.session.commit()
+
+    login_latencies, probe_latencies = [], []
+    lock = threading.Lock()
+    remaining = [logins]
+    done = threading.Event()
+
+    def login_worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            response = client.post("/login", json={"username": "bench", "password": "secret"})
+            elapsed = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, response.get_json()
+            with lock:
+                login_latencies.append(elapsed)
+
+    def probe_worker():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get("/preview/cache")
+            probe_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    probe = threading.Thread(target=probe_worker)
+    workers = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    probe.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe.join()
+
+    client = app.test_client()
+    client.post("/login", json={"username": "legacy", "password": "secret"})
+    with app.app_context():
+        rehashed = User.query.filter_by(username="legacy").first().password_hash.startswith(method + "$")
+
+    return {
+        "logins_per_second": logins / elapsed,
+        "login_p50_ms": percentile(login_latencies, 0.50),
+        "login_p95_ms": percentile(login_latencies, 0.95),
+        "probe_p50_ms": statistics.median(probe_latencies) if probe_latencies else 0.0,
+        "probe_p95_ms": percentile(probe_latencies, 0.95) if probe_latencies else 0.0,
+        "rehashed": rehashed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--methods", nargs="+",
+                        default=["pbkdf2:sha256:100000", "pbkdf2:sha256:600000", "scrypt:32768:8:1"],
+                        help="Métodos/custos de hash a comparar.")
+    parser.add_argument("--logins", type=int, default=40, help="Logins por custo.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultâneos.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ixtampa-login-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    from benchmarks.common import create_benchmark_app
+    app = create_benchmark_app()
+
+    print(f"{'método':<26}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'sonda p50':>11}{'sonda p95':>11}  rehash")
+    for method in args.methods:
+        result = run(app, method, args.logins, args.concurrency)
+        print(f"{method:<26}{result['logins_per_second']:>10.1f}{result['login_p50_ms']:>10.1f}"
+              f"{result['login_p95_ms']:>10.1f}{result['probe_p50_ms']:>11.1f}{result['probe_p95_ms']:>11.1f}"
+              f"  {'ok' if result['rehashed'] else 'não'}")
+
+
+if __name__ == "__main__":
+    main()
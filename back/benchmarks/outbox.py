@@ -0,0 +1,79 @@
+# benchmarks/outbox.py
+"""
+Mede a latência do registro (POST /register) com a criação do cliente no
+Stripe adiada pela outbox, e o tempo até todos os clientes serem criados pelo
+worker, usando o simulador local do Stripe (benchmarks.stripe_stub) com
+latência e falhas injetadas.
+
+Ao final confere que cada usuário tem exatamente um cliente no simulador.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.outbox --users 50 --latency 0.3 --failure-rate 0.2
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stripe_stub import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="Latência simulada do Stripe, em segundos.")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="Fração de respostas 500 simuladas.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Espera máxima pela drenagem, em segundos.")
+    args = parser.parse_args()
+
+    server, stub, url = serve(latency=args.latency, failure_rate=args.failure_rate)
+    workdir = tempfile.mkdtemp(prefix="ixtampa-outbox-bench-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "STRIPE_API_BASE": url,
+        "STRIPE_SECRET_KEY": "sk_test_stub",
+        "STRIPE_OUTBOX_BACKOFF": "0.2",
+        "STRIPE_OUTBOX_POLL_INTERVAL": "0.2",
+        "STRIPE_OUTBOX_WORKER": "true",
+        # Custo baixo para que o hash da senha não domine a medição
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    })
+    from benchmarks.common import create_benchmark_app
+    from app.extensions import db
+    from app.models import StripeOutbox, User
+
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.users):
+        t0 = time.perf_counter()
+        response = client.post("/register", json={
+            "username": f"user{i}", "email": f"user{i}@example.com", "password": "secret",
+        })
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, response.get_json()
+    registered = time.perf_counter() - start
+
+    with app.app_context():
+        while time.perf_counter() - start < args.timeout:
+            pending = StripeOutbox.query.filter(StripeOutbox.status.in_(('pending', 'processing'))).count()
+            db.session.rollback()
+            if pending == 0:
+                break
+            time.sleep(0.05)
+        drained = time.perf_counter() - start
+        missing = User.query.filter(User.stripe_customer_id.is_(None)).count()
+        failed = StripeOutbox.query.filter(StripeOutbox.status == 'failed').count()
+
+    print(f"registro: p50 {statistics.median(latencies):.1f} ms, máx {max(latencies):.1f} ms, "
+          f"{args.users / registered:.1f} registros/s")
+    print(f"clientes criados em {drained:.2f} s; sem cliente: {missing}; falhas definitivas: {failed}")
+    print(f"requisições ao simulador: {stub.requests}; clientes no simulador: {stub.created('cus_')}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/s3_stub.py
+"""
+Emulador local mínimo do S3 (endereçamento por caminho), em memória, para
+exercitar uploads e downloads do backend sem a AWS.
+
+Atende PUT /<bucket> (cria o bucket), PUT/GET/HEAD/DELETE /<bucket>/<chave>
+(incluindo URLs pré-assinadas, cuja assinatura não é conferida) e permite
+injetar latência. Uploads multipart não são suportados: mantenha os arquivos
+abaixo de S3_MULTIPART_THRESHOLD. Aponte o backend para ele com:
+    S3_ENDPOINT_URL=http://127.0.0.1:12112 S3_BUCKET=bench AWS_REGION=us-east-1 \
+    AWS_ACCESS_KEY_ID=stub AWS_SECRET_ACCESS_KEY=stub
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.s3_stub --port 12112 --latency 0.02
+"""
+import argparse
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+class S3Stub:
+    """
+    Estado do emulador: buckets e objetos (corpo, tipo, ETag e data).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.buckets = {}
+        self.requests = 0
+        self.bytes_in = 0
+        self.lock = threading.Lock()
+
+    def objects(self, bucket):
+        with self.lock:
+            return len(self.buckets.get(bucket, {}))
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1: conexões reaproveitadas e resposta ao "Expect: 100-continue" do botocore
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _target(self):
+            with stub.lock:
+                stub.requests += 1
+            if stub.latency:
+                time.sleep(stub.latency)
+            path = unquote(urlsplit(self.path).path).lstrip("/")
+            bucket, _, key = path.partition("/")
+            return bucket, key
+
+        def _reply(self, status, body=b"", headers=None, send_body=True):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if send_body and body:
+                self.wfile.write(body)
+
+        def _error(self, status, code, send_body=True):
+            body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code></Error>".encode()
+            self._reply(status, body, {"Content-Type": "application/xml"}, send_body)
+
+        def do_PUT(self):
+            bucket, key = self._target()
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not key:
+                with stub.lock:
+                    stub.buckets.setdefault(bucket, {})
+                return self._reply(200)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            with stub.lock:
+                objects = stub.buckets.get(bucket)
+                if objects is not None:
+                    objects[key] = {
+                        "body": body,
+                        "content_type": self.headers.get("Content-Type") or "binary/octet-stream",
+                        "etag": etag,
+                        "last_modified": formatdate(usegmt=True),
+                    }
+                    stub.bytes_in += len(body)
+            if objects is None:
+                return self._error(404, "NoSuchBucket")
+            self._reply(200, headers={"ETag": etag})
+
+        def _get(self, send_body):
+            bucket, key = self._target()
+            with stub.lock:
+                entry = stub.buckets.get(bucket, {}).get(key)
+            if entry is None:
+                return self._error(404, "NoSuchKey", send_body)
+            headers = {
+                "Content-Type": entry["content_type"],
+                "ETag": entry["etag"],
+                "Last-Modified": entry["last_modified"],
+            }
+            if self.headers.get("If-None-Match") == entry["etag"]:
+                self.send_response(304)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                return self.end_headers()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(entry["body"])))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(entry["body"])
+
+        def do_GET(self):
+            self._get(send_body=True)
+
+        def do_HEAD(self):
+            self._get(send_body=False)
+
+        def do_DELETE(self):
+            bucket, key = self._target()
+            with stub.lock:
+                stub.buckets.get(bucket, {}).pop(key, None)
+            self._reply(204)
+
+        def do_POST(self):
+            # Multipart (?uploads) e formulários pré-assinados ficam de fora
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._target()
+            self._error(501, "NotImplemented")
+
+    return Handler
+
+
+def serve(port=0, latency=0.0):
+    """
+    Inicia o emulador em uma thread e retorna (servidor, estado, url base).
+    """
+    stub = S3Stub(latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=12112)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso por requisição, em segundos.")
+    args = parser.parse_args()
+    server, _, url = serve(args.port, args.latency)
+    print(f"Emulador do S3 em {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
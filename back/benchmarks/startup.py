@@ -0,0 +1,110 @@
+# benchmarks/startup.py
+"""
+Verifica o orçamento de inicialização do app: mede, em processos novos, o
+tempo de `from app import create_app; create_app()` e falha (código de saída
+1) se a mediana passar de --budget-ms ou se alguma dependência pesada, que
+deve ser importada sob demanda, for carregada durante a inicialização.
+
+Com --top, lista os módulos mais caros segundo `python -X importtime`.
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.startup --budget-ms 1200 --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Dependências que só devem ser carregadas no primeiro uso. O Pillow fica de
+# fora: custa ~20 ms da inicialização e é usado por todas as rotas de imagem
+# (e em valores padrão de argumentos como Image.LANCZOS)
+LAZY_MODULES = ('boto3', 'botocore', 'requests', 'stripe', 'numpy', 'alembic', 'flask_migrate', 'httpx')
+
+DEFAULT_BUDGET_MS = 1200.0
+
+# Pasta back/: o processo novo importa `app` a partir dela
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({'ms': elapsed * 1000, 'loaded': sorted(m for m in %r if m in sys.modules)}))
+""" % (LAZY_MODULES,)
+
+
+def probe_env():
+    workdir = tempfile.mkdtemp(prefix='ixtampa-startup-')
+    return dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        STRIPE_OUTBOX_WORKER='false',
+    )
+
+
+def run_probe(env, *flags):
+    result = subprocess.run([sys.executable, *flags, '-c', PROBE], env=env, cwd=BACK_DIR, check=True,
+                            capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def measure(env, runs):
+    """
+    Inicializa o app em `runs` processos novos e retorna (tempos em ms,
+    dependências de LAZY_MODULES carregadas em algum deles).
+    """
+    samples, loaded = [], set()
+    for _ in range(runs):
+        result, _ = run_probe(env)
+        samples.append(result['ms'])
+        loaded.update(result['loaded'])
+    return samples, loaded
+
+
+def top_imports(env, count):
+    _, stderr = run_probe(env, '-X', 'importtime')
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # Formato: "import time: <próprio> | <cumulativo> | <módulo>"
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='Tempo máximo (mediana) de inicialização.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=0, help='Quantos módulos mais caros listar.')
+    args = parser.parse_args()
+
+    env = probe_env()
+    samples, loaded = measure(env, args.runs)
+    median = statistics.median(samples)
+    print(f"inicialização: mediana {median:.0f} ms, mín {min(samples):.0f} ms, máx {max(samples):.0f} ms "
+          f"(orçamento {args.budget_ms:.0f} ms)")
+
+    if args.top:
+        print("módulos mais caros (cumulativo):")
+        for cumulative, name in top_imports(env, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"FALHA: dependências carregadas na inicialização: {', '.join(sorted(loaded))}")
+        failed = True
+    if median > args.budget_ms:
+        print("FALHA: inicialização acima do orçamento.")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
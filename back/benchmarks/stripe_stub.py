@@ -0,0 +1,148 @@
+# benchmarks/stripe_stub.py
+"""
+Simulador local mínimo da API do Stripe, para exercitar o backend sem rede.
+
+Atende POST /v1/customers, POST /v1/subscriptions e GET /v1/prices (um
+catálogo fixo de preços com produtos expandidos), respeita o cabeçalho
+Idempotency-Key (a mesma chave devolve o mesmo objeto) e permite injetar
+latência e falhas. Aponte o backend para ele com:
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_stub
+
+Uso (a partir da pasta back/):
+    python -m benchmarks.stripe_stub --port 12111 --latency 0.3 --failure-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class StripeStub:
+    """
+    Estado do simulador: objetos criados e respostas por chave de idempotência.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.objects = {}
+        self.idempotent_responses = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        product = {"id": "prod_stub", "object": "product", "active": True,
+                   "name": "Ixtampa Pro", "description": "Plano de testes"}
+        self.prices = [
+            {"id": "price_monthly", "object": "price", "active": True, "product": product, "nickname": None,
+             "unit_amount": 2990, "currency": "brl", "recurring": {"interval": "month", "interval_count": 1}},
+            {"id": "price_yearly", "object": "price", "active": True, "product": product, "nickname": None,
+             "unit_amount": 29900, "currency": "brl", "recurring": {"interval": "year", "interval_count": 1}},
+        ]
+
+    def created(self, prefix):
+        with self.lock:
+            return sum(1 for object_id in self.objects if object_id.startswith(prefix))
+
+    def create(self, path, params):
+        if path == "/v1/customers":
+            return {
+                "id": f"cus_{uuid.uuid4().hex[:14]}", "object": "customer",
+                "email": params.get("email"), "name": params.get("name"),
+                "metadata": {k[9:-1]: v for k, v in params.items() if k.startswith("metadata[")},
+                "created": int(time.time()),
+            }
+        if path == "/v1/subscriptions":
+            return {
+                "id": f"sub_{uuid.uuid4().hex[:14]}", "object": "subscription",
+                "customer": params.get("customer"), "status": "active",
+                "items": {"object": "list", "data": [{"price": {"id": params.get("items[0][price]")}}]},
+                "created": int(time.time()),
+            }
+        return None
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with stub.lock:
+                stub.requests += 1
+            if stub.latency:
+                time.sleep(stub.latency)
+            if self.path.split("?")[0] == "/v1/prices":
+                return self._reply(200, {"object": "list", "url": "/v1/prices", "has_more": False,
+                                         "data": stub.prices})
+            self._reply(404, {"error": {"type": "invalid_request_error", "message": "Rota desconhecida."}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            params = dict(parse_qsl(self.rfile.read(length).decode()))
+            with stub.lock:
+                stub.requests += 1
+            if stub.latency:
+                time.sleep(stub.latency)
+
+            key = self.headers.get("Idempotency-Key")
+            if key:
+                with stub.lock:
+                    cached = stub.idempotent_responses.get(key)
+                if cached is not None:
+                    return self._reply(200, cached, {"Idempotent-Replayed": "true"})
+
+            if random.random() < stub.failure_rate:
+                return self._reply(500, {"error": {"type": "api_error", "message": "Falha simulada."}})
+
+            payload = stub.create(self.path, params)
+            if payload is None:
+                return self._reply(404, {"error": {"type": "invalid_request_error", "message": "Rota desconhecida."}})
+            with stub.lock:
+                stub.objects[payload["id"]] = payload
+                if key:
+                    stub.idempotent_responses[key] = payload
+            self._reply(200, payload)
+
+    return Handler
+
+
+def serve(port=0, latency=0.0, failure_rate=0.0):
+    """
+    Inicia o simulador em uma thread e retorna (servidor, estado, url base).
+    """
+    stub = StripeStub(latency=latency, failure_rate=failure_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso por requisição, em segundos.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fração de respostas 500 simuladas.")
+    args = parser.parse_args()
+    server, _, url = serve(args.port, args.latency, args.failure_rate)
+    print(f"Simulador do Stripe em {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
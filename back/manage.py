@@ -0,0 +1,30 @@
+# manage.py
+"""
+Ponto de entrada das tarefas de administração (migrações do banco e worker
+da outbox do Stripe).
+
+Uso (a partir da pasta back/):
+    flask --app manage db upgrade                    # aplica as migrações pendentes
+    flask --app manage db migrate -m "descrição"     # gera uma nova migração a partir dos modelos
+    flask --app manage outbox-worker                 # drena a outbox do Stripe em primeiro plano
+
+Bancos criados antes das migrações (pelo antigo db.create_all, só com a
+tabela user) devem ser marcados na primeira revisão antes do upgrade:
+    flask --app manage db stamp 0001_initial
+"""
+from app import create_app
+from app.extensions import init_migrations
+from app.utils.outbox import get_outbox_worker
+
+# As tarefas de administração nunca iniciam a drenagem em segundo plano
+app = create_app(outbox_worker=False)
+init_migrations(app)
+
+
+@app.cli.command('outbox-worker')
+def outbox_worker():
+    """Drena a outbox do Stripe até ser interrompido (Ctrl+C)."""
+    try:
+        get_outbox_worker().run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,136 @@
+# tests/conftest.py
+"""
+Configuração compartilhada dos testes: banco SQLite (com as migrações
+aplicadas) e caches em um diretório temporário, e o simulador local do
+Stripe (benchmarks.stripe_stub) e do S3 (benchmarks.s3_stub) no lugar das
+APIs.
+"""
+import os
+import tempfile
+
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix="ixtampa-tests-")
+
+# app.config lê o ambiente na importação: precisa ser definido antes do app
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}",
+    'PREVIEW_CACHE_DIR': os.path.join(_WORKDIR, 'preview-cache'),
+    'FETCH_CACHE_DIR': os.path.join(_WORKDIR, 'fetch-cache'),
+    'STRIPE_OUTBOX_WORKER': 'false',
+    # Jobs no próprio processo: os workers enxergam os simuladores configurados nos testes
+    'PREVIEW_JOB_BACKEND': 'thread',
+    'STRIPE_SECRET_KEY': 'sk_test_stub',
+    # Sem novas tentativas no gateway nem disjuntor: cada falha simulada chega à outbox
+    'STRIPE_MAX_RETRIES': '0',
+    'STRIPE_BREAKER_THRESHOLD': '1000000',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+})
+
+
+@pytest.fixture(scope='session')
+def _app():
+    from benchmarks.common import create_benchmark_app
+    return create_benchmark_app()
+
+
+@pytest.fixture
+def app(_app):
+    """
+    App com as tabelas vazias a cada teste.
+    """
+    from app.extensions import db
+    from app.utils.users import get_user_cache
+
+    with _app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    get_user_cache().clear()
+    return _app
+
+
+@pytest.fixture(scope='session')
+def _stripe_stub():
+    from app.config import Config
+    from app.utils import stripe_gateway
+    from benchmarks.stripe_stub import serve
+
+    server, stub, url = serve()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(Config, 'STRIPE_API_BASE', url)
+        patch.setattr(stripe_gateway, '_stripe_gateway', None)
+        yield stub
+    server.shutdown()
+
+
+@pytest.fixture
+def stripe_stub(_stripe_stub):
+    """
+    Simulador do Stripe sem objetos, latência ou falhas a cada teste.
+    """
+    with _stripe_stub.lock:
+        _stripe_stub.objects.clear()
+        _stripe_stub.idempotent_responses.clear()
+        _stripe_stub.requests = 0
+    _stripe_stub.latency = 0.0
+    _stripe_stub.failure_rate = 0.0
+    return _stripe_stub
+
+
+@pytest.fixture(scope='session')
+def _s3_stub(_app):
+    from app.config import Config
+    from app.utils.s3 import reset_s3_client
+    from benchmarks.s3_stub import serve
+
+    server, stub, url = serve()
+    settings = {
+        'S3_ENDPOINT_URL': url,
+        'S3_BUCKET': 'test',
+        'AWS_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'stub',
+        'AWS_SECRET_ACCESS_KEY': 'stub',
+    }
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in settings.items():
+            patch.setattr(Config, name, value)
+            patch.setitem(_app.config, name, value)
+        reset_s3_client()
+        yield stub
+    reset_s3_client()
+    server.shutdown()
+
+
+@pytest.fixture
+def s3_stub(_s3_stub):
+    """
+    Emulador do S3 com um bucket vazio a cada teste.
+    """
+    with _s3_stub.lock:
+        _s3_stub.buckets.clear()
+        _s3_stub.buckets['test'] = {}
+        _s3_stub.requests = 0
+    _s3_stub.latency = 0.0
+    return _s3_stub
+
+
+@pytest.fixture(scope='session')
+def image_host():
+    """
+    URL base do servidor local de imagens (benchmarks.image_host).
+    """
+    from benchmarks.image_host import serve
+
+    server, _, url = serve()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def template_path(tmp_path_factory):
+    from PIL import Image
+
+    path = tmp_path_factory.mktemp('templates') / 'template.png'
+    Image.new('RGBA', (200, 200), (200, 30, 30, 180)).save(path)
+    return str(path)
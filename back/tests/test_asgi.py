@@ -0,0 +1,124 @@
+# tests/test_asgi.py
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from app import create_app
+from app.config import Config
+from app.utils import aio, image_processing
+from app.utils.aio import AsgiApp
+
+LATENCY = 0.5
+THREADS = 4
+
+
+@pytest.fixture
+def asgi_app(_app, monkeypatch):
+    """
+    App ASGI com poucos threads em todos os pools: o loop de I/O é o loop
+    do teste (anexado na primeira requisição).
+    """
+    monkeypatch.setattr(aio, '_io_loop', None)
+    monkeypatch.setattr(Config, 'ASYNC_BLOCKING_THREADS', THREADS)
+    monkeypatch.setattr(image_processing, '_render_executor', ThreadPoolExecutor(max_workers=THREADS))
+    return AsgiApp(create_app(async_mode=True), threads=THREADS)
+
+
+async def slow_image_host(count):
+    """
+    Servidor de imagens no próprio loop (sem threads) que demora LATENCY
+    segundos para responder cada /<i>.jpg.
+    """
+    images = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), (i * 7 % 256, 90, 160)).save(buffer, 'JPEG')
+        images.append(buffer.getvalue())
+
+    async def handle(reader, writer):
+        request_line = (await reader.readuntil(b'\r\n\r\n')).split(b' ', 2)
+        image = images[int(request_line[1].strip(b'/').split(b'.')[0])]
+        await asyncio.sleep(LATENCY)
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: image/jpeg\r\nConnection: close\r\n'
+                     b'Content-Length: %d\r\n\r\n' % len(image) + image)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+async def call(app, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_concurrent_slow_fetches_need_fewer_threads_than_requests(asgi_app, template_path):
+    requests = 32
+
+    async def main():
+        server, url = await slow_image_host(requests)
+        baseline = peak = threading.active_count()
+        done = asyncio.Event()
+
+        async def watch_threads():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        watcher = asyncio.create_task(watch_threads())
+        start = time.monotonic()
+        results = await asyncio.gather(*(
+            call(asgi_app, 'POST', '/preview', {'image_url': f"{url}/{i}.jpg", 'clothing_template': template_path})
+            for i in range(requests)
+        ))
+        elapsed = time.monotonic() - start
+        done.set()
+        await watcher
+        server.close()
+        return results, elapsed, peak - baseline
+
+    results, elapsed, new_threads = asyncio.run(main())
+
+    assert [status for status, _ in results] == [200] * requests
+    assert all(json.loads(body)['preview_url'] for _, body in results)
+    # As esperas se sobrepõem: com uma thread por requisição e THREADS
+    # threads por pool, seriam pelo menos requests / THREADS * LATENCY segundos
+    assert elapsed < requests / THREADS * LATENCY / 2
+    assert new_threads < requests
+
+
+def test_sync_routes_and_routing_errors_run_through_wsgi(asgi_app):
+    async def main():
+        return (await call(asgi_app, 'GET', '/metrics'),
+                await call(asgi_app, 'GET', '/no-such-route'),
+                await call(asgi_app, 'GET', '/preview'))
+
+    (metrics, _), (missing, _), (wrong_method, _) = asyncio.run(main())
+    assert metrics == 200
+    assert missing == 404
+    assert wrong_method == 405
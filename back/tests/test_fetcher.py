@@ -0,0 +1,56 @@
+# tests/test_fetcher.py
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.aio import get_io_loop
+from app.utils.fetcher import FetchError, ImageFetcher
+
+BODY = b"x" * 1000
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/redirect'):
+            self.send_response(302)
+            self.send_header('Location', self.path.replace('/redirect', '', 1) or '/image')
+            self.send_header('Content-Length', '0')
+            return self.end_headers()
+        body = BODY * 10 if self.path == '/big' else BODY
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope='module')
+def origin():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def fetch_sync(fetcher, url):
+    return fetcher.fetch(url)
+
+
+def fetch_async(fetcher, url):
+    return get_io_loop().run(fetcher.fetch_async(url))
+
+
+@pytest.mark.parametrize('fetch', [fetch_sync, fetch_async])
+def test_redirects_are_followed(origin, fetch):
+    assert fetch(ImageFetcher(), f"{origin}/redirect") == BODY
+
+
+@pytest.mark.parametrize('fetch', [fetch_sync, fetch_async])
+@pytest.mark.parametrize('path', ['/big', '/redirect/big'])
+def test_size_limit_applies_after_redirects(origin, fetch, path):
+    with pytest.raises(FetchError):
+        fetch(ImageFetcher(max_bytes=len(BODY) * 5), f"{origin}{path}")
@@ -0,0 +1,60 @@
+# tests/test_jobs.py
+import time
+
+import pytest
+
+from app.utils import preview_cache
+from app.utils.jobs import JobQueue
+from app.utils.preview_cache import PreviewCache, get_preview_cache
+
+
+def render_into_cache(key, data):
+    # Executado no worker: grava o resultado no cache do processo do worker
+    get_preview_cache().put(key, data)
+    return f"/preview/files/{key}.png"
+
+
+def fail():
+    raise RuntimeError("falhou")
+
+
+def wait_for(queue, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = queue.status(job_id)
+        if status['status'] in ('done', 'error'):
+            return status
+        assert time.monotonic() < deadline, "o job não terminou a tempo"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def memory_only_cache(monkeypatch):
+    # Sem o nível em disco (o worker lê o mesmo ambiente)
+    monkeypatch.setenv('PREVIEW_CACHE_DISK_BYTES', '0')
+    cache = PreviewCache(memory_bytes=1024 * 1024)
+    monkeypatch.setattr(preview_cache, '_preview_cache', cache)
+    return cache
+
+
+@pytest.fixture(params=['process', 'thread'])
+def queue(request):
+    queue = JobQueue(backend=request.param, workers=1)
+    yield queue
+    queue._executor.shutdown()
+
+
+def test_job_result_is_served_by_this_process(memory_only_cache, queue):
+    key = "ab" * 32
+    job_id = queue.submit(render_into_cache, key, b"imagem")
+
+    status = wait_for(queue, job_id)
+
+    assert status == {'status': 'done', 'result': f"/preview/files/{key}.png"}
+    assert memory_only_cache.get(key) == b"imagem"
+
+
+def test_job_exceptions_are_reported(memory_only_cache, queue):
+    status = wait_for(queue, queue.submit(fail))
+    assert status['status'] == 'error'
+    assert "falhou" in status['error']
@@ -0,0 +1,170 @@
+# tests/test_outbox.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import StripeOutbox, User
+from app.utils.outbox import OutboxWorker
+
+
+def make_worker(app, **options):
+    options.setdefault('backoff_base', 0.05)
+    options.setdefault('backoff_max', 0.1)
+    return OutboxWorker(app, **options)
+
+
+def register_users(app, count, outbox=True):
+    with app.app_context():
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password_hash='x') for i in range(count)]
+        db.session.add_all(users)
+        db.session.flush()
+        if outbox:
+            db.session.add_all(StripeOutbox(user_id=user.id, operation='create_customer') for user in users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def outbox_rows(app):
+    with app.app_context():
+        rows = [
+            (row.user_id, row.status, row.attempts, row.last_error)
+            for row in StripeOutbox.query.order_by(StripeOutbox.id)
+        ]
+        db.session.rollback()
+        return rows
+
+
+def customer_ids(app):
+    with app.app_context():
+        ids = {user.id: user.stripe_customer_id for user in User.query}
+        db.session.rollback()
+        return ids
+
+
+def drain_until(worker, condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "a outbox não foi drenada a tempo"
+        worker.drain_once()
+        time.sleep(0.02)
+
+
+def test_concurrent_drainers_create_exactly_one_customer_per_user(app, stripe_stub):
+    # Latência no Stripe deixa os lotes dos drenadores se sobreporem
+    stripe_stub.latency = 0.05
+    user_ids = register_users(app, 30)
+    workers = [make_worker(app, batch_size=10) for _ in range(3)]
+
+    def drain(worker):
+        while worker.drain_once():
+            pass
+
+    threads = [threading.Thread(target=drain, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    customers = customer_ids(app)
+    assert all(customers[user_id] for user_id in user_ids)
+    assert len(set(customers.values())) == len(user_ids)
+    assert stripe_stub.created('cus_') == len(user_ids)
+    # Cada registro foi reivindicado por um único drenador: uma chamada e uma tentativa
+    assert stripe_stub.requests == len(user_ids)
+    assert all(status == 'done' and attempts == 1 for _, status, attempts, _ in outbox_rows(app))
+
+
+def test_failures_are_retried_after_backoff(app, stripe_stub):
+    stripe_stub.failure_rate = 1.0
+    (user_id,) = register_users(app, 1)
+    worker = make_worker(app, max_attempts=5, backoff_base=0.3, backoff_max=0.3)
+
+    assert worker.drain_once() == 1
+    [(_, status, attempts, error)] = outbox_rows(app)
+    assert (status, attempts) == ('pending', 1)
+    assert error
+    # Dentro do backoff o registro não é reprocessado
+    assert worker.drain_once() == 0
+    assert stripe_stub.requests == 1
+
+    stripe_stub.failure_rate = 0.0
+    drain_until(worker, lambda: outbox_rows(app)[0][1] == 'done')
+    [(_, status, attempts, error)] = outbox_rows(app)
+    assert (status, attempts, error) == ('done', 2, None)
+    assert customer_ids(app)[user_id]
+    assert stripe_stub.created('cus_') == 1
+
+
+def test_rows_fail_after_max_attempts_and_ensure_customer_requeues_them(app, stripe_stub):
+    stripe_stub.failure_rate = 1.0
+    (user_id,) = register_users(app, 1)
+    worker = make_worker(app, max_attempts=3)
+
+    drain_until(worker, lambda: outbox_rows(app)[0][1] == 'failed')
+    [(_, status, attempts, _)] = outbox_rows(app)
+    assert (status, attempts) == ('failed', 3)
+    assert customer_ids(app)[user_id] is None
+    # Registros 'failed' ficam fora da drenagem normal
+    assert worker.drain_once() == 0
+
+    stripe_stub.failure_rate = 0.0
+    customer_id = worker.ensure_customer(user_id)
+    assert customer_id and customer_id == customer_ids(app)[user_id]
+    [(_, status, attempts, error)] = outbox_rows(app)
+    assert (status, attempts, error) == ('done', 1, None)
+    assert stripe_stub.created('cus_') == 1
+
+
+def test_ensure_customer_ignores_backoff(app, stripe_stub):
+    stripe_stub.failure_rate = 1.0
+    (user_id,) = register_users(app, 1)
+    worker = make_worker(app, backoff_base=60, backoff_max=60)
+    worker.drain_once()
+
+    stripe_stub.failure_rate = 0.0
+    assert worker.ensure_customer(user_id) == customer_ids(app)[user_id]
+    assert worker.ensure_customer(user_id) == customer_ids(app)[user_id]
+    assert stripe_stub.created('cus_') == 1
+
+
+def test_ensure_customer_backfills_users_without_outbox_row(app, stripe_stub):
+    (user_id,) = register_users(app, 1, outbox=False)
+    worker = make_worker(app)
+
+    customer_id = worker.ensure_customer(user_id)
+    assert customer_id and customer_id == customer_ids(app)[user_id]
+    assert [(row_user, status) for row_user, status, _, _ in outbox_rows(app)] == [(user_id, 'done')]
+
+
+@pytest.mark.parametrize('lease, reclaimed', [(-1, True), (60, False)])
+def test_claimed_rows_are_taken_over_only_after_the_lease(app, stripe_stub, lease, reclaimed):
+    (user_id,) = register_users(app, 1)
+    with app.app_context():
+        row = StripeOutbox.query.one()
+        # Reivindicado por um processo que caiu antes de gravar o resultado
+        row.status, row.next_attempt_at = 'processing', datetime.utcnow() + timedelta(seconds=lease)
+        db.session.commit()
+
+    assert make_worker(app).drain_once() == (1 if reclaimed else 0)
+    assert bool(customer_ids(app)[user_id]) is reclaimed
+
+
+def test_retried_row_reuses_the_idempotency_key(app, stripe_stub):
+    (user_id,) = register_users(app, 1)
+    worker = make_worker(app)
+    worker.drain_once()
+    first = customer_ids(app)[user_id]
+
+    with app.app_context():
+        # Queda entre a chamada ao Stripe e o commit: o registro volta a pendente
+        row = StripeOutbox.query.one()
+        row.status, row.next_attempt_at = 'pending', datetime.utcnow()
+        db.session.get(User, user_id).stripe_customer_id = None
+        db.session.commit()
+    worker.drain_once()
+
+    assert customer_ids(app)[user_id] == first
+    assert stripe_stub.created('cus_') == 1
@@ -0,0 +1,21 @@
+# tests/test_passwords.py
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.utils.passwords import PasswordHasher
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2:sha256', 'pbkdf2:sha256:1000'])
+def test_hashes_made_with_the_configured_method_do_not_need_rehash(method):
+    hasher = PasswordHasher(method)
+    password_hash = hasher.hash('secret')
+
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.needs_rehash(password_hash)
+
+
+def test_hashes_with_other_parameters_need_rehash():
+    hasher = PasswordHasher('pbkdf2:sha256')
+
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='scrypt'))
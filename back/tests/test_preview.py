@@ -0,0 +1,143 @@
+# tests/test_preview.py
+import pytest
+
+from app.utils import preview_cache
+from app.utils.image_processing import process_image
+from app.utils.preview_cache import PreviewCache, get_preview_cache
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def clear_preview_cache(monkeypatch):
+    """
+    Troca o cache de pré-visualizações por um vazio (só em memória);
+    chamar o retorno simula a remoção de tudo o que estava no cache.
+    """
+    def clear():
+        monkeypatch.setattr(preview_cache, '_preview_cache', PreviewCache(memory_bytes=64 * 1024 * 1024))
+    clear()
+    return clear
+
+
+def render(client, image_host, template_path, seed, **options):
+    response = client.post('/preview', json={
+        'image_url': f"{image_host}/images/320x240/{seed}.jpg", 'clothing_template': template_path, **options})
+    assert response.status_code == 200
+    return response.get_json()['preview_url']
+
+
+@pytest.mark.parametrize('output_format, extension, mimetype', [
+    ('png', 'png', 'image/png'), ('webp', 'webp', 'image/webp'), ('jpeg', 'jpg', 'image/jpeg'),
+])
+def test_preview_file_is_served_with_its_own_format(client, image_host, template_path,
+                                                    output_format, extension, mimetype):
+    preview_url = render(client, image_host, template_path, 1, output_format=output_format)
+    assert preview_url.endswith(f".{extension}")
+
+    response = client.get(preview_url)
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+
+
+def test_preview_file_rejects_other_extensions(client, image_host, template_path):
+    preview_url = render(client, image_host, template_path, 2)
+    cache_key = preview_url.rsplit('/', 1)[1].split('.')[0]
+
+    for extension in ('webp', 'jpg', 'url', 'exe'):
+        assert client.get(f"/preview/files/{cache_key}.{extension}").status_code == 404
+
+
+def test_preview_file_does_not_serve_other_cache_entries(client, image_host, template_path):
+    preview_url = render(client, image_host, template_path, 3)
+    file_name = preview_url.rsplit('/', 1)[1]
+    response = client.get(f"/preview/render/{file_name}?w=64&format=webp")
+    assert response.status_code == 200
+
+    # Derivado guardado no cache pela chave do ETag: não é uma pré-visualização
+    rendition = response.get_etag()[0]
+    assert get_preview_cache().get(rendition) is not None
+    for extension in ('webp', 'png'):
+        assert client.get(f"/preview/files/{rendition}.{extension}").status_code == 404
+
+
+def test_renditions_of_cache_only_previews_are_not_immutable(app, client, image_host, template_path,
+                                                              clear_preview_cache):
+    file_name = render(client, image_host, template_path, 4).rsplit('/', 1)[1]
+
+    response = client.get(f"/preview/render/{file_name}?w=64")
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == f"public, max-age={app.config['RENDITION_VOLATILE_MAX_AGE']}"
+
+    clear_preview_cache()
+    assert client.get(f"/preview/render/{file_name}?w=160").status_code == 404
+
+
+def test_renditions_of_stored_previews_are_rebuilt_from_the_bucket(app, client, image_host, template_path,
+                                                                    s3_stub, clear_preview_cache):
+    with app.app_context():
+        url = process_image(f"{image_host}/images/320x240/5.jpg", template_path, upload=True)
+    file_name = url.rsplit('/', 1)[1]
+    assert file_name in s3_stub.buckets['test']
+    file_name = file_name.removeprefix('processed_')
+
+    response = client.get(f"/preview/render/{file_name}?w=64&format=webp")
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    # Fora do cache, o derivado é refeito a partir do objeto no bucket
+    clear_preview_cache()
+    rebuilt = client.get(f"/preview/render/{file_name}?w=64&format=webp")
+    assert rebuilt.status_code == 200
+    assert rebuilt.get_etag() == response.get_etag()
+    assert rebuilt.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+
+def test_renditions_of_unknown_previews_are_not_found(client, s3_stub, clear_preview_cache):
+    assert client.get(f"/preview/render/{'ab' * 32}.png?w=64").status_code == 404
+    assert client.get(f"/preview/render/{'ab' * 32}.txt?w=64").status_code == 404
+
+
+def test_renditions_at_or_above_the_source_width_share_the_original(client, image_host, template_path,
+                                                                   clear_preview_cache):
+    file_name = render(client, image_host, template_path, 7).rsplit('/', 1)[1]
+
+    original = client.get(f"/preview/render/{file_name}?format=webp")
+    etags = {client.get(f"/preview/render/{file_name}?w={width}&format=webp").get_etag()
+             for width in (480, 1920, 100000)}
+    assert etags == {original.get_etag()}
+    assert client.get(f"/preview/render/{file_name}?w=160&format=webp").get_etag() != original.get_etag()
+
+
+def test_revalidation_of_a_removed_preview_is_not_found(client, image_host, template_path, clear_preview_cache):
+    file_name = render(client, image_host, template_path, 8).rsplit('/', 1)[1]
+    etag = client.get(f"/preview/render/{file_name}?w=160").get_etag()[0]
+    headers = {'If-None-Match': f'"{etag}"'}
+    assert client.get(f"/preview/render/{file_name}?w=160", headers=headers).status_code == 304
+
+    clear_preview_cache()
+    assert client.get(f"/preview/render/{file_name}?w=160", headers=headers).status_code == 404
+
+
+def test_rendition_storage_checks_are_not_counted(client, image_host, template_path, clear_preview_cache):
+    file_name = render(client, image_host, template_path, 9).rsplit('/', 1)[1]
+    cache = get_preview_cache()
+    client.get(f"/preview/render/{file_name}?w=160")
+    before = (cache.hits, cache.disk_hits, cache.misses)
+    client.get(f"/preview/render/{file_name}?w=160")
+    # Só a consulta do derivado conta: um acerto
+    assert (cache.hits, cache.disk_hits, cache.misses) == (before[0] + 1, before[1], before[2])
+
+
+@pytest.mark.parametrize('upload', [False, True])
+def test_each_render_counts_one_cache_outcome(app, image_host, template_path, s3_stub, clear_preview_cache, upload):
+    cache = get_preview_cache()
+    url = f"{image_host}/images/320x240/6.jpg"
+    with app.app_context():
+        first = process_image(url, template_path, upload=upload)
+        assert (cache.hits, cache.disk_hits, cache.misses) == (0, 0, 1)
+        assert process_image(url, template_path, upload=upload) == first
+        assert (cache.hits, cache.disk_hits, cache.misses) == (1, 0, 1)
@@ -0,0 +1,178 @@
+# tests/test_s3.py
+import io
+import threading
+import time
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.config import Config
+from app.routes import upload
+from app.utils import s3
+from app.utils.derivatives import derivative_key
+
+
+def jpeg_bytes(size=(640, 480)):
+    output = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 40)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def object_keys(stub):
+    with stub.lock:
+        return set(stub.buckets['test'])
+
+
+def test_client_and_transfer_config_are_shared(s3_stub):
+    clients, configs = [], []
+
+    def worker():
+        clients.append(s3.get_s3_client())
+        configs.append(s3.get_transfer_config())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    assert len({id(config) for config in configs}) == 1
+    assert clients[0].meta.endpoint_url == Config.S3_ENDPOINT_URL
+    assert configs[0].multipart_threshold == Config.S3_MULTIPART_THRESHOLD
+    assert clients[0].meta.config.max_pool_connections == Config.S3_MAX_POOL_CONNECTIONS
+
+
+def test_reset_discards_the_shared_client(s3_stub):
+    client, config = s3.get_s3_client(), s3.get_transfer_config()
+    s3.reset_s3_client()
+    assert s3.get_s3_client() is not client
+    assert s3.get_transfer_config() is not config
+
+
+def test_public_url(s3_stub, monkeypatch):
+    assert s3.public_url('a.jpg') == f"{Config.S3_ENDPOINT_URL}/test/a.jpg"
+    monkeypatch.setattr(Config, 'S3_ENDPOINT_URL', Config.S3_ENDPOINT_URL + '/')
+    assert s3.public_url('a.jpg') == f"{Config.S3_ENDPOINT_URL.rstrip('/')}/test/a.jpg"
+    monkeypatch.setattr(Config, 'S3_ENDPOINT_URL', None)
+    assert s3.public_url('a.jpg') == "https://test.s3.us-east-1.amazonaws.com/a.jpg"
+
+
+def test_upload_stores_original_and_derivatives(app, s3_stub):
+    content = jpeg_bytes()
+    client = app.test_client()
+    shared = s3.get_s3_client()
+
+    response = client.post('/upload', data={'file': (io.BytesIO(content), 'photo.jpg', 'image/jpeg')})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    key = body['url'].rsplit('/', 1)[1]
+    assert key.endswith('_photo.jpg')
+    assert body['url'] == s3.public_url(key)
+    assert body['preview_url'] == s3.public_url(derivative_key(key, 'preview'))
+    assert body['thumbnail_url'] == s3.public_url(derivative_key(key, 'thumbnail'))
+    assert object_keys(s3_stub) == {key, derivative_key(key, 'preview'), derivative_key(key, 'thumbnail')}
+    assert httpx.get(body['url']).content == content
+    # O upload usa o cliente compartilhado em vez de criar outro
+    assert s3.get_s3_client() is shared
+
+
+def test_upload_without_file(app, s3_stub):
+    assert app.test_client().post('/upload', data={}).status_code == 400
+    assert not object_keys(s3_stub)
+
+
+def presign(client, **options):
+    payload = {'filename': 'photo.jpg', 'content_type': 'image/jpeg', 'method': 'PUT'}
+    payload.update(options)
+    response = client.post('/upload/presign', json=payload)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def wait_for_job(client, status_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(status_url).get_json()
+        if status['status'] in ('done', 'error'):
+            return status
+        assert time.monotonic() < deadline, "o job não terminou a tempo"
+        time.sleep(0.02)
+
+
+def test_presigned_put_and_confirm(app, s3_stub):
+    client = app.test_client()
+    content = jpeg_bytes()
+    presigned = presign(client)
+    assert presigned['url'].startswith(f"{Config.S3_ENDPOINT_URL}/test/")
+
+    httpx.put(presigned['url'], content=content, headers=presigned['headers']).raise_for_status()
+    response = client.post('/upload/confirm', json={'key': presigned['key'], 'token': presigned['token']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['url'] == s3.public_url(presigned['key'])
+
+    # As cópias derivadas são geradas na fila de jobs, depois da resposta
+    status = wait_for_job(client, body['status_url'])
+    assert status == {'job_id': body['job_id'], 'status': 'done',
+                      'preview_url': s3.public_url(derivative_key(presigned['key'], 'preview'))}
+    assert object_keys(s3_stub) == {
+        presigned['key'], derivative_key(presigned['key'], 'preview'), derivative_key(presigned['key'], 'thumbnail')
+    }
+
+
+def test_confirm_does_not_wait_for_derivatives(app, s3_stub, monkeypatch):
+    client = app.test_client()
+    presigned = presign(client)
+    httpx.put(presigned['url'], content=jpeg_bytes(), headers=presigned['headers']).raise_for_status()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_derivatives(key):
+        started.set()
+        release.wait(10)
+        return "ok"
+
+    monkeypatch.setattr(upload, 'store_derivatives_from_bucket', slow_derivatives)
+    try:
+        response = client.post('/upload/confirm', json={'key': presigned['key'], 'token': presigned['token']})
+        assert response.status_code == 200
+        assert started.wait(10)
+        assert client.get(response.get_json()['status_url']).get_json()['status'] == 'running'
+    finally:
+        release.set()
+
+
+@pytest.mark.parametrize('token', [None, 'invalid', 'other'])
+def test_confirm_requires_the_token_of_the_key(app, s3_stub, token):
+    client = app.test_client()
+    presigned = presign(client)
+    httpx.put(presigned['url'], content=jpeg_bytes(), headers=presigned['headers']).raise_for_status()
+    if token == 'other':
+        token = presign(client)['token']
+
+    response = client.post('/upload/confirm', json={'key': presigned['key'], 'token': token})
+
+    assert response.status_code == 403
+    assert object_keys(s3_stub) == {presigned['key']}
+
+
+def test_confirm_missing_object(app, s3_stub):
+    client = app.test_client()
+    presigned = presign(client)
+    response = client.post('/upload/confirm', json={'key': presigned['key'], 'token': presigned['token']})
+    assert response.status_code == 404
+
+
+def test_confirm_rejects_and_deletes_invalid_objects(app, s3_stub, monkeypatch):
+    client = app.test_client()
+    presigned = presign(client)
+    httpx.put(presigned['url'], content=jpeg_bytes(), headers=presigned['headers']).raise_for_status()
+    monkeypatch.setitem(app.config, 'UPLOAD_MAX_BYTES', 10)
+
+    response = client.post('/upload/confirm', json={'key': presigned['key'], 'token': presigned['token']})
+
+    assert response.status_code == 400
+    assert not object_keys(s3_stub)
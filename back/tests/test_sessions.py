@@ -0,0 +1,78 @@
+# tests/test_sessions.py
+import pytest
+
+
+@pytest.fixture
+def open_session(app, image_host, template_path):
+    client = app.test_client()
+
+    def open_session(**state):
+        response = client.post('/preview/sessions', json={
+            'image_url': f"{image_host}/images/640x480/1.jpg", 'clothing_template': template_path, **state})
+        assert response.status_code == 201
+        return client, response.get_json()
+    return open_session
+
+
+def default_position(session):
+    # Logo de 1/4 da largura (template quadrado) no canto inferior direito, margem de 10 px
+    side = int(session['width'] * 0.25)
+    return session['width'] - side - 10, session['height'] - side - 10
+
+
+@pytest.mark.parametrize('given', ['x', 'y'])
+def test_creation_keeps_the_given_coordinate(open_session, given):
+    _, session = open_session(**{given: 20})
+    default_x, default_y = default_position(session)
+
+    expected = {'x': default_x, 'y': default_y, given: 20}
+    assert (session['x'], session['y']) == (expected['x'], expected['y'])
+
+
+@pytest.mark.parametrize('changed', ['x', 'y'])
+def test_patch_updates_only_the_given_coordinate(open_session, changed):
+    client, session = open_session()
+    default_x, default_y = default_position(session)
+    assert (session['x'], session['y']) == (default_x, default_y)
+
+    response = client.patch(f"/preview/sessions/{session['session_id']}", json={changed: 30})
+    assert response.status_code == 200
+    updated = response.get_json()
+
+    expected = {'x': default_x, 'y': default_y, changed: 30}
+    assert (updated['x'], updated['y']) == (expected['x'], expected['y'])
+
+
+@pytest.mark.parametrize('state', [
+    {'rotation': float('nan')}, {'rotation': float('inf')}, {'scale': float('nan')}, {'scale': float('-inf')},
+])
+def test_non_finite_scale_and_rotation_are_rejected(open_session, state):
+    client, session = open_session()
+    url = f"/preview/sessions/{session['session_id']}"
+
+    response = client.patch(url, json=state)
+    assert response.status_code == 400
+    assert client.patch(url, json={'x': 0}).status_code == 200
+
+
+@pytest.mark.parametrize('state', [{'x': 10 ** 12}, {'x': -641}, {'y': 481}, {'y': -(10 ** 12)}])
+def test_coordinates_outside_the_image_are_rejected(open_session, image_host, template_path, state):
+    client, session = open_session()
+    assert (session['width'], session['height']) == (640, 480)
+
+    response = client.patch(f"/preview/sessions/{session['session_id']}", json=state)
+    assert response.status_code == 400
+    unchanged = client.patch(f"/preview/sessions/{session['session_id']}", json={}).get_json()
+    assert (unchanged['x'], unchanged['y']) == (session['x'], session['y'])
+
+    response = client.post('/preview/sessions', json={
+        'image_url': f"{image_host}/images/640x480/1.jpg", 'clothing_template': template_path, **state})
+    assert response.status_code == 400
+
+
+def test_coordinates_at_the_image_limits_are_accepted(open_session):
+    client, session = open_session(x=-640, y=480)
+    assert (session['x'], session['y']) == (-640, 480)
+    response = client.patch(f"/preview/sessions/{session['session_id']}", json={'x': 640, 'y': -480})
+    assert response.status_code == 200
+    assert (response.get_json()['x'], response.get_json()['y']) == (640, -480)
@@ -0,0 +1,28 @@
+# tests/test_startup.py
+import os
+import statistics
+
+import pytest
+
+from benchmarks.startup import DEFAULT_BUDGET_MS, LAZY_MODULES, measure, probe_env
+
+BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS))
+
+
+def test_create_app_is_within_budget_and_keeps_heavy_dependencies_lazy():
+    samples, loaded = measure(probe_env(), runs=3)
+
+    assert not loaded, f"dependências carregadas na inicialização: {sorted(loaded)} (de {LAZY_MODULES})"
+    assert statistics.median(samples) <= BUDGET_MS, f"inicialização: {samples} ms"
+
+
+def test_check_schema_points_to_the_migrations_when_tables_are_missing(_app, tmp_path, monkeypatch):
+    from app import create_app
+    from app.config import Config
+    from app.extensions import check_schema
+
+    check_schema(_app)
+
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'empty.db'}")
+    with pytest.raises(RuntimeError, match='flask --app manage db upgrade'):
+        check_schema(create_app(outbox_worker=False))
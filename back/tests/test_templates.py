@@ -0,0 +1,55 @@
+# tests/test_templates.py
+import os
+
+from PIL import Image
+
+from app.utils.templates import TemplateRegistry
+
+
+def make_template(path, color=(200, 30, 30, 180)):
+    Image.new('RGBA', (400, 200), color).save(path)
+    return str(path)
+
+
+def test_variants_are_bounded_by_decoded_bytes(tmp_path):
+    path = make_template(tmp_path / 'logo.png')
+    # Cada versão de 100 px de largura tem 100x50 RGBA = 20.000 bytes
+    registry = TemplateRegistry(max_bytes=50_000)
+
+    for width in (100, 101, 102):
+        registry.resized(path, width)
+    stats = registry.stats()
+    assert stats['variants'] == 2
+    assert stats['variant_bytes'] <= 50_000
+    assert stats['variant_evictions'] == 1
+
+    # A mais antiga saiu; as recentes continuam memorizadas
+    assert registry.resized(path, 102) is registry.resized(path, 102)
+    registry.resized(path, 100)
+    assert registry.stats()['variant_misses'] == 4
+
+
+def test_variant_larger_than_the_budget_is_not_kept(tmp_path):
+    path = make_template(tmp_path / 'logo.png')
+    registry = TemplateRegistry(max_bytes=50_000)
+    registry.resized(path, 100)
+
+    large = registry.resized(path, 400)
+    assert large.size == (400, 200)
+    stats = registry.stats()
+    assert (stats['variants'], stats['variant_bytes'], stats['variant_evictions']) == (1, 20_000, 0)
+
+
+def test_reloaded_template_releases_old_variants(tmp_path):
+    path = make_template(tmp_path / 'logo.png')
+    registry = TemplateRegistry(max_bytes=1_000_000)
+    registry.resized(path, 100)
+    registry.resized(path, 200)
+
+    make_template(path, color=(0, 0, 255, 255))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    registry.resized(path, 100)
+
+    stats = registry.stats()
+    assert (stats['variants'], stats['variant_bytes']) == (1, 20_000)
@@ -3,7 +3,7 @@ import ClothingSelector from './components/ClothingSelector';
 import ImageUploader from './components/ImageUploader';
 import PreviewCanvas from './components/PreviewCanvas';
 import WidgetWrapper from './components/WidgetWrapper';
-import { generatePreview } from './api';
+import { generatePreviewProgressive } from './api';
 
 function App() {
   const [selectedClothing, setSelectedClothing] = useState(null);
@@ -16,9 +16,8 @@ function App() {
       return;
     }
     try {
-      // Chama o backend para gerar o preview
-      const response = await generatePreview(uploadedImage, selectedClothing.template);
-      setPreviewUrl(response.preview_url);
+      // Chama o backend para gerar o preview (rascunho primeiro, depois a versão final)
+      await generatePreviewProgressive(uploadedImage, selectedClothing.template, (url) => setPreviewUrl(url));
     } catch (error) {
       console.error("Erro ao gerar preview:", error);
     }
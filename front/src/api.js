@@ -2,7 +2,11 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://127.0.0.1:5000'; // Altere para a URL do seu backend se necessário
 
-export const uploadImage = async (file) => {
+// Pré-visualizações sem upload são servidas pelo backend (caminhos relativos)
+const absoluteUrl = (url) => (url && url.startsWith('/') ? `${API_BASE_URL}${url}` : url);
+
+// Upload pelo servidor (fallback quando o upload direto ao bucket falha)
+export const uploadImageViaServer = async (file) => {
   const formData = new FormData();
   formData.append('file', file);
   const response = await axios.post(`${API_BASE_URL}/upload`, formData, {
@@ -13,10 +17,89 @@ export const uploadImage = async (file) => {
   return response.data; // espera { url: "..." }
 };
 
+// Upload direto ao bucket com POST pré-assinado, seguido da confirmação
+export const uploadImageDirect = async (file) => {
+  const { data: presigned } = await axios.post(`${API_BASE_URL}/upload/presign`, {
+    filename: file.name,
+    content_type: file.type,
+    size: file.size
+  });
+
+  const formData = new FormData();
+  Object.entries(presigned.fields).forEach(([name, value]) => formData.append(name, value));
+  formData.append('file', file); // o arquivo precisa ser o último campo
+  await axios.post(presigned.url, formData);
+
+  const response = await axios.post(`${API_BASE_URL}/upload/confirm`, {
+    key: presigned.key,
+    token: presigned.token
+  });
+  return response.data; // espera { url: "..." }
+};
+
+export const uploadImage = async (file) => {
+  try {
+    return await uploadImageDirect(file);
+  } catch (error) {
+    console.warn("Upload direto falhou, enviando pelo servidor:", error);
+    return uploadImageViaServer(file);
+  }
+};
+
 export const generatePreview = async (imageUrl, clothingTemplate) => {
   const response = await axios.post(`${API_BASE_URL}/preview`, {
     image_url: imageUrl,
     clothing_template: clothingTemplate
   });
-  return response.data; // espera { preview_url: "..." }
-};
\ No newline at end of file
+  return { ...response.data, preview_url: absoluteUrl(response.data.preview_url) }; // espera { preview_url: "..." }
+};
+
+export const generatePreviewBatch = async (imageUrl, variants) => {
+  // variants: [{ clothing_template, scale }]
+  const response = await axios.post(`${API_BASE_URL}/preview/batch`, {
+    image_url: imageUrl,
+    variants
+  });
+  const previews = response.data.previews.map((preview) => ({
+    ...preview,
+    preview_url: absoluteUrl(preview.preview_url)
+  }));
+  return { ...response.data, previews }; // espera { previews: [{ clothing_template, scale, preview_url }] }
+};
+
+// Modo progressivo: entrega o rascunho imediatamente e, quando a versão final
+// estiver pronta, chama onUpdate novamente com a URL definitiva. Desiste
+// (mantendo o rascunho) após maxAttempts consultas ou se o job não existir mais.
+export const generatePreviewProgressive = async (
+  imageUrl, clothingTemplate, onUpdate, pollInterval = 500, maxAttempts = 120
+) => {
+  const { data } = await axios.post(`${API_BASE_URL}/preview`, {
+    image_url: imageUrl,
+    clothing_template: clothingTemplate,
+    progressive: true
+  });
+  onUpdate(absoluteUrl(data.preview_url), data.final);
+  if (data.final) return;
+
+  for (let attempt = 0; attempt < maxAttempts; attempt++) {
+    await new Promise((resolve) => setTimeout(resolve, pollInterval));
+    let status;
+    try {
+      ({ data: status } = await axios.get(`${API_BASE_URL}${data.status_url}`));
+    } catch (error) {
+      if (error.response?.status === 404) {
+        // Job expirado ou perdido (ex.: reinício do servidor): não adianta insistir
+        throw new Error("Job de pré-visualização não encontrado.");
+      }
+      throw error;
+    }
+    if (status.status === 'done') {
+      onUpdate(absoluteUrl(status.preview_url), true);
+      return;
+    }
+    if (status.status === 'error') {
+      throw new Error(status.error);
+    }
+  }
+  throw new Error("A versão final da pré-visualização não ficou pronta a tempo.");
+};